@@ -1,26 +1,85 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from typing import Dict, Optional
+import asyncio
 import os
-from werkzeug.utils import secure_filename
-# from backend import analyze_image
-# Temporary mock functions for testing
-def analyze_image(path):
-    return 0.2  # 20% risk score
+import time
+import aiofiles
+import metrics
+from model_registry import registry
+from model_host import remote
+from micro_batcher import MicroBatcher
+from result_cache import result_cache, content_hash
+from uploads import RequestSizeLimit, SavedUpload, UploadTooLarge, stream_to_disk, remove_uploads
+from worker_pools import ModalityExecutor, QueueFullError
+from jobs import JobStore
+from cascade import Cascade, CascadeConfig
+from voice_stream import StreamConfig, StreamingVerifier
+# ANALYSIS_BACKEND=real routes analysis to backend.py. It is imported on the first request,
+# not at startup, so worker boot and --reload never wait for torch / EasyOCR / SpeechBrain.
+# The default keeps the mock functions for UI testing.
+ANALYSIS_BACKEND = os.getenv('ANALYSIS_BACKEND', 'mock')
 
-def analyze_text(content):
-    return 0.15  # 15% fraud score
+if ANALYSIS_BACKEND == 'real':
+    def analyze_image(path):
+        import backend
+        return backend.analyze_image(path)
 
-def analyze_voice(path):
-    return True  # voice match
+    def analyze_image_full(path):
+        import backend
+        return backend.analyze_image_full(path)
+
+    def analyze_text(content):
+        import backend
+        return backend.analyze_text(content)
+
+    def analyze_texts(contents):
+        import backend
+        return backend.analyze_texts(contents)
+
+    def analyze_voice(path, speaker_id=None):
+        import backend
+        return backend.analyze_voice(path, speaker_id)
+
+    def prescore_texts(contents):
+        import backend
+        return backend.prescore_texts(contents)
+
+    def image_precheck(path):
+        import backend
+        return backend.image_precheck(path)
+else:
+    # Temporary mock functions for testing
+    def analyze_image(path):
+        return 0.2  # 20% risk score
+
+    def analyze_image_full(path):
+        return {'risk_level': analyze_image(path), 'ocr_text': ''}
+
+    def analyze_text(content):
+        return 0.15  # 15% fraud score
+
+    def analyze_texts(contents):
+        return [analyze_text(c) for c in contents]
+
+    def analyze_voice(path, speaker_id=None):
+        return {'speaker_id': speaker_id, 'score': 0.8, 'match': True}  # voice match
+
+    def prescore_texts(contents):
+        return [{'partial': 0.05, 'low': 0.1, 'high': 0.2} for _ in contents]
+
+    def image_precheck(path):
+        return None  # no hash index
 
 app = FastAPI(
     title="InsureGuard AI",
     description="AI-Powered Insurance Fraud Detection",
     version="1.0.0"
 )
+# Oversized bodies are refused before Starlette spools them; per-file limits apply in save_uploads
+app.add_middleware(RequestSizeLimit)
 
 # Static files and templates configuration
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -36,6 +95,40 @@ ALLOWED_EXTENSIONS = {
     'text': {'txt'}
 }
 
+# Comma-separated registry names to load at startup, e.g. "nlp_analyzer,easyocr"
+MODEL_WARMUP = [m.strip() for m in os.getenv('MODEL_WARMUP', '').split(',') if m.strip()]
+
+@app.on_event("startup")
+async def warm_up_models():
+    """Load models before the first request instead of during it"""
+    if MODEL_WARMUP:
+        # With MODEL_HOST_SOCKET set the models live in the model host, not in this worker
+        (remote() or registry).warm_up(MODEL_WARMUP)
+
+# Blocking analysis runs on bounded per-modality pools (see worker_pools.py)
+pools = ModalityExecutor.from_env()
+
+# Background analysis jobs (POST /jobs); finished jobs are kept for JOB_TTL seconds and at most
+# JOB_MAX_ACTIVE run at once
+jobs = JobStore(max_jobs=int(os.getenv('JOB_STORE_SIZE', '1000')),
+                ttl_seconds=float(os.getenv('JOB_TTL', '3600')),
+                max_active=int(os.getenv('JOB_MAX_ACTIVE', '64')))
+job_tasks = set()  # strong references so running jobs are not garbage collected
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    pools.shutdown()
+
+# Concurrent text requests are grouped into one batched NLP call
+TEXT_BATCH_SIZE = int(os.getenv('TEXT_BATCH_SIZE', '8'))
+TEXT_BATCH_WAIT_MS = float(os.getenv('TEXT_BATCH_WAIT_MS', '10'))
+text_batcher = MicroBatcher(analyze_texts, max_batch_size=TEXT_BATCH_SIZE,
+                            max_wait_ms=TEXT_BATCH_WAIT_MS, executor=pools.executor('text'))
+
+# Cheap-first scoring with early exit (see cascade.py); per request with /analyze?cascade=true
+ANALYSIS_CASCADE = os.getenv('ANALYSIS_CASCADE', '0') == '1'
+cascade_config = CascadeConfig.from_env()
+
 def allowed_file(filename, file_type):
     if not filename:
         return False
@@ -52,96 +145,494 @@ async def favicon():
     """Serve favicon"""
     return FileResponse('static/favicon.ico')
 
+@app.get('/models')
+async def model_stats():
+    """Load time and resident size of every registered model"""
+    host = remote()
+    return host.stats()['models'] if host else registry.stats()
+
+@app.get('/cache')
+async def cache_stats():
+    """Hit/miss counters of the analysis result cache"""
+    return result_cache.stats()
+
+@app.get('/pools')
+async def pool_stats():
+    """Queue depth and rejections per modality worker pool"""
+    return pools.stats()
+
+def collect_metrics():
+    """Copy queue, cache and model state into the Prometheus gauges/counters at scrape time"""
+    for modality, s in pools.stats().items():
+        metrics.queue_pending.set(s['pending'], modality=modality)
+        metrics.queue_rejected.set_total(s['rejected'], modality=modality)
+    metrics.batch_queued.set(text_batcher.stats()['queued'], batcher='text')
+    cache = result_cache.stats()
+    for outcome in ('hits', 'disk_hits', 'misses'):
+        metrics.cache_lookups.set_total(cache[outcome], outcome=outcome)
+    for name, s in registry.stats().items():
+        metrics.model_loaded.set(1 if s['loaded'] else 0, model=name)
+        if s['size_bytes'] is not None:
+            metrics.model_size_bytes.set(s['size_bytes'], model=name)
+
+@app.get('/metrics')
+async def prometheus_metrics():
+    """Per-stage latency histograms, queue depth, cache and model metrics (Prometheus text format)"""
+    collect_metrics()
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+def score_result(score, key):
+    confidence = int((1.0 - float(score)) * 100)
+    return {
+        'confidence': confidence,
+        'status': 'authentic' if confidence >= 70 else 'suspicious',
+        key: float(score)
+    }
+
+async def image_result(upload):
+    if not allowed_file(upload.filename, 'image'):
+        return {'error': 'Invalid file type for image'}
+    analysis = result_cache.get('image', upload.digest)
+    try:
+        if analysis is None:
+            out = await pools.run('image', analyze_image_full, upload.path)
+            if out.get('error'):
+                return {'error': out['error'], 'status': 'error', 'ocr_text': out.get('ocr_text', '')}
+            duplicates = out.get('near_duplicates', [])
+            analysis = {'risk_level': float(out['risk_level']), 'ocr_text': out.get('ocr_text', '')}
+            result_cache.put('image', upload.digest, analysis)
+        else:
+            # Duplicates are per submission: look this one up even when the analysis is reused
+            pre = await pools.run('image', image_precheck, upload.path)
+            duplicates = pre['near_duplicates'] if pre else []
+        result = score_result(analysis['risk_level'], 'risk_score')
+        result['ocr_text'] = analysis['ocr_text']
+        if duplicates:
+            result['near_duplicates'] = duplicates
+        return result
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return {'error': str(e), 'status': 'error'}
+
+async def text_result(upload):
+    if not allowed_file(upload.filename, 'text'):
+        return {'error': 'Invalid file type for text'}
+    try:
+        async with aiofiles.open(upload.path, 'r', encoding='utf-8') as f:
+            text_content = await f.read()
+        return await score_text(text_content, upload.digest)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return {'error': str(e), 'status': 'error'}
+
+async def score_text(text_content, digest=None):
+    digest = digest or content_hash(text_content.encode('utf-8'))
+    fraud_score = result_cache.get('text', digest)
+    if fraud_score is None:
+        async with pools.slot('text'):
+            with metrics.span('text.batch'):
+                fraud_score = await text_batcher.submit(text_content)
+        result_cache.put('text', digest, float(fraud_score))
+    return score_result(fraud_score, 'fraud_score')
+
+async def ocr_text_result(image_task):
+    """Text analysis of the image's OCR output, used when no separate text file was sent"""
+    image = await image_task
+    ocr_text = (image.get('ocr_text') or '').strip()
+    if not ocr_text:
+        return None
+    try:
+        result = await score_text(ocr_text)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return {'error': str(e), 'status': 'error'}
+    result['source'] = 'ocr'
+    return result
+
+async def voice_result(upload, speaker_id=None):
+    if not allowed_file(upload.filename, 'voice'):
+        return {'error': 'Invalid file type for voice'}
+    try:
+        # {'speaker_id', 'score', 'match'} against the enrolled voice; raises without a speaker_id
+        match_result = await pools.run('voice', analyze_voice, upload.path, speaker_id)
+        match = bool(match_result['match'])
+        confidence = 85 if match else 30
+
+        return {
+            'confidence': confidence,
+            'match': match,
+            'similarity': match_result['score'],
+            'status': 'authentic' if confidence >= 70 else 'suspicious'
+        }
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return {'error': str(e), 'status': 'error'}
+
+# Speaker enrollment / verification (voice is imported on first use: it loads ECAPA)
+def enroll_voice(speaker_id, role, path):
+    import voice as voice_module
+    return voice_module.enroll_speaker(speaker_id, path, role=role)
+
+def verify_voice(speaker_id, path):
+    import voice as voice_module
+    return voice_module.verify_speaker(speaker_id, path)
+
+def identify_voice(top_k, role, path):
+    import voice as voice_module
+    return {'matches': voice_module.identify_speaker(path, top_k=top_k, role=role)}
+
+def reference_voice(speaker_id):
+    import voice as voice_module
+    return voice_module.reference_embedding(speaker_id)
+
+def embed_voice_window(wav):
+    import voice as voice_module
+    start = time.perf_counter()
+    return voice_module.embed_waveform(wav), time.perf_counter() - start
+
+stream_config = StreamConfig.from_env()
+
+async def run_voice_job(voice, fn, *args):
+    uploads = await save_uploads(voice=voice)
+    saved = uploads.get('voice')
+    if saved is None or saved.path is None:
+        raise HTTPException(status_code=400, detail='A valid voice file is required')
+    try:
+        return await pools.run('voice', fn, *args, saved.path)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={'Retry-After': str(e.retry_after)})
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    finally:
+        remove_uploads(uploads)
+
+@app.post('/voices/identify')
+async def identify_speaker(voice: UploadFile = File(...), top_k: int = 5, role: Optional[str] = None):
+    """1:N search of a recording against all enrolled voices (role=fraudster to screen callers)"""
+    return await run_voice_job(voice, identify_voice, top_k, role)
+
+@app.post('/voices/{speaker_id}')
+async def enroll_speaker(speaker_id: str, voice: UploadFile = File(...), role: Optional[str] = None):
+    """Enroll (or replace) the reference voice of a policyholder"""
+    return await run_voice_job(voice, enroll_voice, speaker_id, role)
+
+@app.post('/voices/{speaker_id}/verify')
+async def verify_speaker(speaker_id: str, voice: UploadFile = File(...)):
+    """1:1 check of a recording against an enrolled voice"""
+    return await run_voice_job(voice, verify_voice, speaker_id)
+
+@app.websocket('/voices/{speaker_id}/stream')
+async def stream_verify_speaker(websocket: WebSocket, speaker_id: str, sample_rate: int = 16000,
+                                format: str = 'pcm16', channels: int = 1):
+    """
+    Live 1:1 verification of a caller against an enrolled voice (see voice_stream.py).
+    Send binary PCM frames (format pcm16 or f32 at sample_rate Hz, at most 1 s each) and the
+    text message "end" when the call ends. Receives JSON events: "score" per scored window,
+    one "verdict" as soon as the running score is stable, and "final" before the socket closes.
+    """
+    await websocket.accept()
+    try:
+        reference = await pools.run('voice', reference_voice, speaker_id)
+        session = StreamingVerifier(reference, sample_rate, fmt=format, channels=channels,
+                                    config=stream_config)
+    except (KeyError, ValueError) as e:
+        await websocket.send_json({'event': 'error', 'detail': str(e)})
+        await websocket.close(code=1008)
+        return
+
+    async def score(window):
+        if window is None:
+            return
+        embedding, seconds = await pools.run('voice', embed_voice_window, window)
+        for event in session.score(embedding, seconds):
+            await websocket.send_json(event)
+
+    try:
+        while not session.done:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('text') == 'end':
+                break
+            if message.get('bytes'):
+                await score(session.feed(message['bytes']))
+        await score(session.flush())
+        await websocket.send_json(session.final())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except (ValueError, QueueFullError) as e:
+        # Oversized frame, or the voice pool is saturated (1013 = try again later)
+        await websocket.send_json({'event': 'error', 'detail': str(e)})
+        await websocket.close(code=1013 if isinstance(e, QueueFullError) else 1009)
+
 @app.post('/analyze')
 async def analyze(
     image: Optional[UploadFile] = File(None),
     voice: Optional[UploadFile] = File(None),
-    text: Optional[UploadFile] = File(None)
+    text: Optional[UploadFile] = File(None),
+    timings: bool = False,
+    cascade: Optional[bool] = None,
+    speaker_id: Optional[str] = None
 ):
     """
     Accepts multipart form data with:
     - image: image file (optional)
-    - voice: audio file (optional)
+    - voice: audio file (optional), checked against the voice enrolled as ?speaker_id=
     - text: text file or text content (optional)
-    Returns analysis results as JSON
+    Returns analysis results as JSON; ?timings=true adds per-stage seconds,
+    ?cascade=true (default: ANALYSIS_CASCADE) runs cheap stages first and stops early
     """
-    results = {}
-    
+    start = time.perf_counter()
+    use_cascade = ANALYSIS_CASCADE if cascade is None else cascade
+    with metrics.collect_timings() as stage_timings:
+        uploads = await save_uploads(image=image, voice=voice, text=text)
+        try:
+            result = await (run_cascade(uploads, speaker_id) if use_cascade
+                            else run_analysis(uploads, speaker_id=speaker_id))
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e),
+                                headers={'Retry-After': str(e.retry_after)})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            remove_uploads(uploads)
+            metrics.request_seconds.observe(time.perf_counter() - start, endpoint='analyze')
+    if timings:
+        result['timings'] = dict(stage_timings, total=time.perf_counter() - start)
+    return result
+
+@app.post('/jobs', status_code=202)
+async def create_job(
+    image: Optional[UploadFile] = File(None),
+    voice: Optional[UploadFile] = File(None),
+    text: Optional[UploadFile] = File(None),
+    speaker_id: Optional[str] = None
+):
+    """
+    Same inputs as /analyze, but returns a job id immediately.
+    Poll GET /jobs/{id} or follow GET /jobs/{id}/events for progress.
+    Answers 503 + Retry-After up front, instead of failing the job later, when too many jobs
+    are running or a worker pool the job needs is already full.
+    """
+    submitted = [m for m, f in (('image', image), ('voice', voice), ('text', text)) if f and f.filename]
+    busy = 'jobs' if jobs.full() else next((m for m in submitted if pools.saturated(m)), None)
+    if busy is not None:
+        raise HTTPException(status_code=503, detail=f'{busy} queue is full, retry in {pools.retry_after}s',
+                            headers={'Retry-After': str(pools.retry_after)})
+    uploads = await save_uploads(image=image, voice=voice, text=text)
+    if not uploads:
+        raise HTTPException(status_code=400, detail='No files submitted')
+    job = jobs.create(list(uploads))
+    task = asyncio.create_task(run_job(job, uploads, speaker_id))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return {'id': job.id, 'status': job.status, 'stages': job.stages}
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    """Current status, per-stage progress and (when done) results of a job"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Unknown job')
+    return job.to_dict()
+
+@app.get('/jobs/{job_id}/events')
+async def job_events(job_id: str):
+    """Server-sent events stream of per-stage progress for a job"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Unknown job')
+    return StreamingResponse(job.events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
+
+async def save_uploads(**files):
+    """
+    Stream the submitted files to unique temp paths: {modality: SavedUpload}.
+    Files with a disallowed extension are not written; their handler reports the error.
+    """
+    uploads = {}
     try:
-        # Handle image
-        if image and image.filename:
-            if not allowed_file(image.filename, 'image'):
-                results['image'] = {'error': 'Invalid file type for image'}
+        for modality, upload in files.items():
+            if not (upload and upload.filename):
+                continue
+            if allowed_file(upload.filename, modality):
+                with metrics.span(f'upload.{modality}'):
+                    uploads[modality] = await stream_to_disk(upload, UPLOAD_FOLDER, modality)
             else:
-                filename = secure_filename(image.filename)
-                img_path = os.path.join(UPLOAD_FOLDER, filename)
-                content = await image.read()
-                with open(img_path, "wb") as buffer:
-                    buffer.write(content)
-                
-                try:
-                    risk_score = analyze_image(img_path)
-                    confidence = int((1.0 - float(risk_score)) * 100)
-                    results['image'] = {
-                        'confidence': confidence,
-                        'status': 'authentic' if confidence >= 70 else 'suspicious',
-                        'risk_score': float(risk_score)
-                    }
-                except Exception as e:
-                    results['image'] = {'error': str(e), 'status': 'error'}
-        
-        # Handle text
-        if text and text.filename:
-            if not allowed_file(text.filename, 'text'):
-                results['text'] = {'error': 'Invalid file type for text'}
-            else:
-                content = await text.read()
-                text_content = content.decode('utf-8')
-                
-                try:
-                    fraud_score = analyze_text(text_content)
-                    confidence = int((1.0 - float(fraud_score)) * 100)
-                    results['text'] = {
-                        'confidence': confidence,
-                        'status': 'authentic' if confidence >= 70 else 'suspicious',
-                        'fraud_score': float(fraud_score)
-                    }
-                except Exception as e:
-                    results['text'] = {'error': str(e), 'status': 'error'}
-        
-        # Handle voice
-        if voice and voice.filename:
-            if not allowed_file(voice.filename, 'voice'):
-                results['voice'] = {'error': 'Invalid file type for voice'}
-            else:
-                filename = secure_filename(voice.filename)
-                voice_path = os.path.join(UPLOAD_FOLDER, filename)
-                content = await voice.read()
-                with open(voice_path, "wb") as buffer:
-                    buffer.write(content)
-                
-                try:
-                    match_result = analyze_voice(voice_path)
-                    # Convert match_result to boolean if needed
-                    if isinstance(match_result, str):
-                        # Assuming analyze_voice returns string
-                        confidence = 85  # Default confidence for voice match
-                    else:
-                        confidence = 85 if match_result else 30
-                    
-                    results['voice'] = {
-                        'confidence': confidence,
-                        'match': bool(match_result),
-                        'status': 'authentic' if confidence >= 70 else 'suspicious'
-                    }
-                except Exception as e:
-                    results['voice'] = {'error': str(e), 'status': 'error'}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
+                uploads[modality] = SavedUpload(upload.filename)
+    except UploadTooLarge as e:
+        remove_uploads(uploads)
+        raise HTTPException(status_code=413, detail=str(e))
+    return uploads
+
+async def run_analysis(uploads, on_stage=None, speaker_id=None):
+    """Run every submitted modality concurrently; on_stage(modality, result) fires as each finishes"""
+    handlers = {'image': image_result, 'text': text_result,
+                'voice': lambda upload: voice_result(upload, speaker_id)}
+
+    async def run_one(modality, upload):
+        if on_stage:
+            on_stage(modality, 'running', 0.0, None)
+        with metrics.span(f'analyze.{modality}'):
+            result = await handlers[modality](upload)
+        if on_stage:
+            on_stage(modality, 'error' if 'error' in result else 'done', 1.0, result)
+        return result
+
+    # Modalities are independent, so run them side by side
+    tasks = {m: asyncio.ensure_future(run_one(m, u)) for m, u in uploads.items()}
+    if 'image' in tasks and 'text' not in tasks:
+        # No claim text submitted: analyse what OCR read off the image instead
+        tasks['text'] = asyncio.ensure_future(ocr_text_result(tasks['image']))
+    try:
+        outputs = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return {m: out for m, out in zip(tasks.keys(), outputs) if out is not None}
+
+async def run_cascade(uploads, speaker_id=None):
+    """
+    Cheap-first variant of run_analysis: hash lookup, voice, text prescore, then BART-MNLI and
+    Gemini only while the decision is still open. Adds a 'cascade' report (see cascade.py).
+    """
+    results = {}
+    for modality, upload in uploads.items():
+        if not allowed_file(upload.filename, modality):
+            results[modality] = {'error': f'Invalid file type for {modality}'}
+    image, text, voice = (uploads.get(m) if m not in results else None for m in ('image', 'text', 'voice'))
+    state = Cascade(cascade_config, [m for m, up in (('image', image), ('text', text or image)) if up])
+    analysis, duplicates = None, []
+
+    async def run_stage(name, modality, fn, *args):
+        """Run one stage unless decided; failures drop the modality from the decision."""
+        if state.decision is not None:
+            state.skip(name)
+            return None
+        try:
+            with state.stage(name):
+                return await fn(*args)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            results[modality] = {'error': str(e), 'status': 'error'}
+            state.unavailable(modality)
+            return None
+
+    async def text_stages(content, digest=None):
+        digest = digest or content_hash(content.encode('utf-8'))
+        cached = result_cache.get('text', digest)
+        if cached is not None:
+            state.observe('text', cached)
+            return score_result(cached, 'fraud_score')
+
+        async def prescore():
+            bounds = (await pools.run('text', prescore_texts, [content]))[0]
+            if bounds is not None:
+                state.observe('text', bounds['low'], bounds['high'])
+                # Kept as the text result when the cascade stops before the full analysis
+                results['text'] = {'fraud_score_bounds': [bounds['low'], bounds['high']],
+                                   'status': 'estimated'}
+
+        async def full():
+            result = await score_text(content, digest)
+            state.observe('text', result['fraud_score'])
+            return result
+
+        await run_stage('text.prescore', 'text', prescore)
+        return await run_stage('text.fraud', 'text', full)
+
+    # 1. Image: exact-bytes cache, then the perceptual-hash index
+    if image:
+        cached = result_cache.get('image', image.digest)
+        # The hash lookup runs on cache hits too: duplicates belong to this submission
+        async def precheck():
+            pre = await pools.run('image', image_precheck, image.path)
+            if pre:
+                duplicates.extend(pre['near_duplicates'])
+                if duplicates and cascade_config.duplicate_decides:
+                    state.decide('RISK', 'image reused from an earlier claim')
+            return pre and pre['analysis']
+        analysis = await run_stage('image.hash', 'image', precheck)
+        analysis = cached if cached is not None else analysis
+        if analysis is not None:
+            state.observe('image', analysis['risk_level'])
+
+    # 2. Voice gates the claim, as in backend.main and the frontend
+    if voice:
+        async def check_voice():
+            result = results['voice'] = await voice_result(voice, speaker_id)
+            if cascade_config.voice_decides and result.get('match') is False:
+                state.decide('RISK', 'voice does not match')
+        await run_stage('voice', 'voice', check_voice)
+
+    # 3/4. Submitted text before Gemini
+    if text:
+        async with aiofiles.open(text.path, 'r', encoding='utf-8') as f:
+            content = await f.read()
+        text_out = await text_stages(content, text.digest)
+        if text_out is not None:
+            results['text'] = text_out
+
+    # 5. OCR + Gemini, then the OCR text when no text file was sent
+    if image and analysis is None:
+        async def gemini():
+            out = await pools.run('image', analyze_image_full, image.path)
+            if out.get('error'):
+                # No risk to score or cache, but the OCR text can still feed the text stages
+                results['image'] = {'error': out['error'], 'status': 'error'}
+                state.unavailable('image')
+                return {'error': out['error'], 'ocr_text': out.get('ocr_text', '')}
+            out = {'risk_level': float(out['risk_level']), 'ocr_text': out.get('ocr_text', '')}
+            result_cache.put('image', image.digest, out)
+            state.observe('image', out['risk_level'])
+            return out
+        analysis = await run_stage('image.gemini', 'image', gemini)
+    elif image:
+        state.skip('image.gemini')  # risk already known from the cache / hash index
+    if image and not text:
+        ocr_text = ((analysis or {}).get('ocr_text') or '').strip()
+        if ocr_text:
+            text_out = await text_stages(ocr_text)
+            if text_out is not None:
+                results['text'] = dict(text_out, source='ocr')
+        elif analysis is None and 'image.gemini' in state.skipped:
+            state.skip('text.prescore')  # decided before OCR ran, so its text was never scored
+            state.skip('text.fraud')
+        else:
+            state.unavailable('text')
+
+    if analysis is not None and 'error' not in analysis:
+        results['image'] = dict(score_result(analysis['risk_level'], 'risk_score'),
+                                ocr_text=analysis.get('ocr_text', ''))
+    if duplicates:
+        results.setdefault('image', {})['near_duplicates'] = duplicates
+    results['cascade'] = state.report()
     return results
 
+async def run_job(job, uploads, speaker_id=None):
+    loop = asyncio.get_running_loop()
+
+    def on_span(stage, status, seconds):
+        # Spans end on worker threads; the job and its subscribers live on the event loop
+        loop.call_soon_threadsafe(job.update_step, stage, status, seconds)
+
+    try:
+        with metrics.watch_spans(on_span):
+            result = await run_analysis(uploads, on_stage=job.update_stage, speaker_id=speaker_id)
+        job.finish(result)
+    except Exception as e:
+        job.fail(str(e))
+    finally:
+        remove_uploads(uploads)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,23 +1,26 @@
-import subprocess
 import json
 import sys
 import os
-from combined_nlp_fraud_detector_fileinput_v2 import CombinedNLPAnalyzer
-import voice
-import easyocr
-import base64
-import requests
-from dotenv import load_dotenv
+from model_registry import registry
+from model_host import remote
+from gemini_client import client as gemini, GeminiError, image_request, response_text
+from image_preprocess import prepare_image
+from metrics import record, span
 
 def check_voice_match(file1, file2, threshold=0.55):
+    import voice  # audio stack is only needed when a voice pair is checked
     emb1 = voice.get_embedding(file1)
     emb2 = voice.get_embedding(file2)
     sim = voice.cosine_sim(emb1, emb2)
     print(f"[VOICE MATCH] Cosine similarity: {sim:.4f}")
     return sim >= threshold
 
-def analyze_voice(file1):
-    return "voice analyzed"
+def analyze_voice(file1, speaker_id=None):
+    """Verify a claim recording against the claimant's enrolled voice (see voice.verify_speaker)."""
+    if not speaker_id:
+        raise ValueError("Voice check needs the claimant's enrolled speaker_id")
+    import voice
+    return voice.verify_speaker(speaker_id, file1)
 
 '''def analyze_image(image_path):
     """Use the same logic as main.py to get Gemini risk score."""
@@ -71,59 +74,25 @@ def analyze_voice(file1):
     return risk_level
 '''
 import re
-import json
-import requests
-import base64
-import easyocr
-import os
-from dotenv import load_dotenv
+import time
 
-def analyze_image(image_path):
-    """Perform OCR + Gemini analysis and extract a clean risk_level."""
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("❌ Gemini API key missing in .env")
+# Default: the original OCR-then-Gemini prompt. IMAGE_OCR_IN_PROMPT=0 opts in to sending the
+# image to Gemini while OCR runs (the prompt then omits the OCR text)
+OCR_IN_PROMPT = os.getenv("IMAGE_OCR_IN_PROMPT", "1") == "1"
 
-    reader = easyocr.Reader(['en'], gpu=False)
-    results = reader.readtext(image_path)
-    full_text = "\n".join([d[1] for d in results])
-
-    with open(image_path, "rb") as img_file:
-        image_base64 = base64.b64encode(img_file.read()).decode("utf-8")
-
-    prompt = (
-        "You are an AI risk assessment assistant for financial documents. "
-        "Return a JSON with keys 'summary', 'risk_level', and 'explanation'. "
-        "Risk_level should be a number between 0 and 1.\n\n"
-        f"OCR Extracted Text:\n{full_text}"
-    )
+# Perceptual-hash index of every analyzed image (image_hash_index.py); unset = disabled
+IMAGE_HASH_INDEX_DIR = os.getenv("IMAGE_HASH_INDEX_DIR") or None
+IMAGE_HASH_RADIUS = int(os.getenv("IMAGE_HASH_RADIUS", "6"))
+_image_index = None
 
-    endpoint = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
-    headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
-    body = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {"text": prompt},
-                    {"inline_data": {"mime_type": "image/png", "data": image_base64}},
-                ],
-            }
-        ]
-    }
-
-    resp = requests.post(endpoint, headers=headers, data=json.dumps(body))
-    if resp.status_code != 200:
-        print(f"❌ Gemini error: {resp.status_code}")
-        print(resp.text)
-        return 0.0
-
-    # Extract model output
-    raw_output = resp.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-    print("\n[RAW GEMINI OUTPUT]")
-    print(raw_output)
+IMAGE_PROMPT = (
+    "You are an AI risk assessment assistant for financial documents. "
+    "Return a JSON with keys 'summary', 'risk_level', and 'explanation'. "
+    "Risk_level should be a number between 0 and 1."
+)
 
+def parse_gemini_json(raw_output):
+    """Pull the risk JSON out of Gemini's (often Markdown-wrapped) text output."""
     # ---- FIX: Clean Markdown-wrapped JSON ----
     # Example problematic output: ```json {...} ```
     json_pattern = r"\{[\s\S]*\}"
@@ -132,23 +101,171 @@ def analyze_image(image_path):
         json_str = match.group(0)
     else:
         json_str = raw_output.strip()
+    return json.loads(json_str)
+
+def run_ocr(image):
+    with registry.use("easyocr") as reader, span("image.ocr"):
+        results = reader.readtext(image.array)
+    return "\n".join([d[1] for d in results])
+
+def image_index():
+    global _image_index
+    if _image_index is None and IMAGE_HASH_INDEX_DIR:
+        from image_hash_index import ImageHashIndex
+        _image_index = ImageHashIndex(IMAGE_HASH_INDEX_DIR)
+    return _image_index
 
+def check_duplicates(image_path, image):
+    """
+    Look the image up in the hash index, then index it.
+    Returns (near_duplicates, cached analysis of a byte-identical file or None).
+    Equal hashes are not enough to reuse an analysis (an edited amount or date barely moves a
+    64-bit hash), so perceptual repeats are only flagged, with exact=True. A resubmission of
+    the very same file is flagged too (identical=True), whether or not its analysis is reused.
+    """
+    from image_hash_index import image_hashes
+    from result_cache import file_hash, result_cache
+
+    index = image_index()
+    image_id = file_hash(image_path)
+    ph, dh = image_hashes(image.array)
+    duplicates = index.query(ph, dh, IMAGE_HASH_RADIUS)
+    index.add(image_id, ph, dh)
+    for d in duplicates:
+        d["exact"] = d["phash_distance"] == 0 and d["dhash_distance"] == 0
+        d["identical"] = d["image_id"] == image_id
+    # Same bytes as an analysed file: reuse its analysis if it is still cached
+    cached = result_cache.get("image", image_id)
+    return duplicates, None if cached is None else dict(cached)
+
+def analyze_image_full(image_path, ocr_in_prompt=None):
+    """
+    OCR + Gemini analysis of one image.
+    Returns {risk_level, summary, explanation, ocr_text, timings}; ocr_text can be fed
+    straight to analyze_text when no separate claim text was submitted.
+    When Gemini fails or its answer cannot be parsed, "error" is set and risk_level is a
+    0.0 placeholder that must not be cached or scored.
+    With IMAGE_HASH_INDEX_DIR set it also lists near_duplicates (earlier images within
+    IMAGE_HASH_RADIUS bits) and returns the cached analysis of a byte-identical file directly.
+    """
+    host = remote()
+    if host is not None and ocr_in_prompt is None:
+        return host.analyze_image_full(image_path)  # OCR model lives in the model host
+    ocr_in_prompt = OCR_IN_PROMPT if ocr_in_prompt is None else ocr_in_prompt
+    if not gemini.api_key:
+        raise ValueError("❌ Gemini API key missing in .env")
+
+    timings = {}
+    start = time.perf_counter()
+    # Decode once: the same RGB array feeds OCR, a compact re-encode feeds Gemini
+    image = prepare_image(image_path)
+    timings["prepare"] = time.perf_counter() - start
+    record("image.decode", timings["prepare"])
+
+    duplicates = []
+    if image_index() is not None:
+        start = time.perf_counter()
+        duplicates, reused = check_duplicates(image_path, image)
+        timings["hash"] = time.perf_counter() - start
+        record("image.hash", timings["hash"])
+        if duplicates:
+            print(f"[IMAGE HASH] {len(duplicates)} near-duplicate(s) of earlier claim images")
+        if reused is not None:
+            reused.update(near_duplicates=duplicates, timings=timings)
+            return reused
+
+    gemini_future = None
+    if not ocr_in_prompt:
+        # Gemini reads the document itself; its round-trip overlaps with OCR below
+        gemini_future = gemini.submit(image_request(IMAGE_PROMPT, image.base64, image.mime_type))
+
+    start = time.perf_counter()
     try:
-        data = json.loads(json_str)
-        risk_level = float(data.get("risk_level", 0))
-        print(f"[IMAGE RISK] Extracted risk level: {risk_level}")
-        return risk_level
+        full_text = run_ocr(image)
+    except BaseException:
+        if gemini_future is not None:
+            gemini_future.cancel()  # nobody will read the answer; free the connection
+        raise
+    timings["ocr"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = {"risk_level": 0.0, "summary": None, "explanation": None,
+              "ocr_text": full_text, "timings": timings, "near_duplicates": duplicates}
+    try:
+        with span("gemini.wait"):
+            if gemini_future is None:
+                prompt = f"{IMAGE_PROMPT}\n\nOCR Extracted Text:\n{full_text}"
+                resp_json = gemini.generate_sync(image_request(prompt, image.base64, image.mime_type))
+            else:
+                resp_json = gemini_future.result()
+    except GeminiError as e:
+        print(f"❌ {e}")
+        print(e.body)
+        result["error"] = str(e)
+        return result
+    finally:
+        # With overlap this is only the part of the round-trip OCR did not hide
+        timings["gemini_wait"] = time.perf_counter() - start
+
+    # Extract model output
+    raw_output = response_text(resp_json)
+    print("\n[RAW GEMINI OUTPUT]")
+    print(raw_output)
+
+    try:
+        data = parse_gemini_json(raw_output)
+        result.update(risk_level=float(data.get("risk_level", 0)),
+                      summary=data.get("summary"), explanation=data.get("explanation"))
+        print(f"[IMAGE RISK] Extracted risk level: {result['risk_level']}")
     except Exception as e:
         print(f"⚠️ Could not parse Gemini JSON: {e}")
-        print("Returning default risk = 0.0")
-        return 0.0
+        result["error"] = f"Could not parse Gemini output: {e}"
+    return result
+
+def analyze_image(image_path):
+    """Perform OCR + Gemini analysis and extract a clean risk_level."""
+    return analyze_image_full(image_path)["risk_level"]
 
 def analyze_text(text):
-    analyzer = CombinedNLPAnalyzer()
-    result = analyzer.analyze_text(text)
+    host = remote()
+    if host is not None:
+        return host.analyze_texts([text])[0]
+    with registry.use("nlp_analyzer") as analyzer:
+        result = analyzer.analyze_text(text)
     print(f"[TEXT FRAUD SCORE] Combined NLP score: {result['combined_score']}")
     return result["combined_score"]
 
+def analyze_texts(texts, batch_size=8):
+    """Batched variant of analyze_text: one combined score per input text."""
+    host = remote()
+    if host is not None:
+        return host.analyze_texts(texts)
+    with registry.use("nlp_analyzer") as analyzer:
+        results = analyzer.analyze_texts(texts, batch_size=batch_size)
+    return [r["combined_score"] for r in results]
+
+def prescore_texts(texts, batch_size=8):
+    """Cheap text bounds for the cascade: {"partial", "low", "high"} per text (None = needs full run)."""
+    host = remote()
+    if host is not None:
+        return host.prescore_texts(texts)
+    with registry.use("nlp_analyzer") as analyzer:
+        return analyzer.prescore_texts(texts, batch_size=batch_size)
+
+def image_precheck(image_path):
+    """
+    Hash lookup only (no OCR / Gemini) for the cascade.
+    Returns {near_duplicates, analysis}, analysis being the cached result of a byte-identical
+    file or None; returns None when no hash index is configured.
+    """
+    host = remote()
+    if host is not None:
+        return host.image_precheck(image_path)
+    if image_index() is None:
+        return None
+    duplicates, reused = check_duplicates(image_path, prepare_image(image_path))
+    return {"near_duplicates": duplicates, "analysis": reused}
+
 def main():
     if len(sys.argv) != 5:
         print("Usage: python fraud_pipeline.py <voice1.wav> <voice2.wav> <image_path> <text>")
@@ -165,18 +282,22 @@ def main():
     print("✅ Voice matched. Proceeding with image and text analysis...")
 
     # Step 2: Image risk analysis
-    image_risk = analyze_image(image_path)
+    image_result = analyze_image_full(image_path)
+    image_risk = None if image_result.get("error") else image_result["risk_level"]
 
-    # Step 3: Text fraud analysis
-    text_risk = analyze_text(text)
+    # Step 3: Text fraud analysis (falls back to the image's OCR text when text is empty)
+    text_risk = analyze_text(text or image_result["ocr_text"])
 
-    # Step 4: Ensemble risk score
-    final_score = (image_risk + text_risk) / 2
+    # Step 4: Ensemble risk score (text alone when the image could not be scored)
+    final_score = text_risk if image_risk is None else (image_risk + text_risk) / 2
     label = "RISK" if final_score > 0.6 else "NOT RISK"
 
     print("\n========== FINAL REPORT ==========")
     print(f"Voice match: ✅")
-    print(f"Image risk score: {image_risk:.3f}")
+    if image_risk is None:
+        print(f"Image risk score: unavailable ({image_result['error']})")
+    else:
+        print(f"Image risk score: {image_risk:.3f}")
     print(f"Text fraud score: {text_risk:.3f}")
     print(f"Final Ensemble Score: {final_score:.3f}")
     print(f"🧾 Decision: {label}")
@@ -0,0 +1,342 @@
+"""
+Batch Claim Scoring
+-------------------
+Nightly re-scoring of historic claims.
+
+- Input: a JSONL manifest ({"id", "image", "text" | "text_file", "voice", "reference_voice"} per line)
+  or a directory (one sub-directory per claim, or loose files scored one per claim)
+- Fans claims out over a process pool in chunks of --chunk-size; each worker loads its models once
+  (model registry warm-up) and scores a chunk's texts in one batched analyze_texts call
+- A worker crash (BrokenProcessPool) restarts the pool; the claims that were in flight are re-run
+  one at a time and the one that kills the worker again is written with an error
+- Streams one JSON line per claim to the output as soon as it completes
+- Checkpointing: ids already present in the output are skipped, so an interrupted run resumes
+- Prints throughput and mean per-stage timings at the end
+
+Usage:
+    python batch_score.py claims.jsonl -o phase1_outputs/results.jsonl --workers 4
+    python batch_score.py historic_claims/ -o phase1_outputs/results.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+IMAGE_EXT = {".png", ".jpg", ".jpeg", ".webp"}
+VOICE_EXT = {".wav", ".mp3", ".ogg", ".m4a"}
+TEXT_EXT = {".txt"}
+RISK_THRESHOLD = 0.6
+
+
+# ---------- INPUT ----------
+def _claim_from_files(claim_id, paths):
+    claim = {"id": claim_id}
+    voices = []
+    for p in sorted(paths):
+        ext = os.path.splitext(p)[1].lower()
+        if ext in IMAGE_EXT and "image" not in claim:
+            claim["image"] = p
+        elif ext in TEXT_EXT and "text_file" not in claim:
+            claim["text_file"] = p
+        elif ext in VOICE_EXT:
+            voices.append(p)
+    if voices:
+        claim["voice"] = voices[0]
+        if len(voices) > 1:
+            claim["reference_voice"] = voices[1]
+    return claim
+
+
+def iter_claims(source):
+    """Yield claim dicts from a JSONL manifest or a directory."""
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.startswith("."):
+                continue
+            path = os.path.join(source, name)
+            if os.path.isdir(path):
+                files = [os.path.join(path, f) for f in os.listdir(path)]
+                yield _claim_from_files(name, files)
+            else:
+                yield _claim_from_files(name, [path])
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            claim = json.loads(line)
+            claim.setdefault("id", str(n))
+            for key in ("image", "text_file", "voice", "reference_voice"):
+                if claim.get(key) and not os.path.isabs(claim[key]):
+                    claim[key] = os.path.join(base, claim[key])
+            yield claim
+
+
+def completed_ids(output):
+    """Ids already written to the output file (the checkpoint)."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                continue  # partial last line from an interrupted run
+    return done
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+# ---------- WORKER ----------
+def _init_worker(warmup):
+    # Models are loaded once per worker process, then reused for every claim it scores
+    from model_registry import registry
+    if warmup:
+        registry.warm_up(warmup)
+
+
+def _score_media(claim, timings):
+    """Voice and image stages of one claim; returns (partial result, text to score or None)."""
+    import backend
+    import voice
+
+    out = {"id": str(claim["id"])}
+    if claim.get("voice") and claim.get("reference_voice"):
+        t = time.perf_counter()
+        sim = voice.cosine_sim(voice.get_embedding(claim["voice"]),
+                               voice.get_embedding(claim["reference_voice"]))
+        timings["voice"] = time.perf_counter() - t
+        out["voice_similarity"] = sim
+        out["voice_match"] = sim >= 0.55
+    elif claim.get("voice") and claim.get("speaker_id"):
+        t = time.perf_counter()
+        res = voice.verify_speaker(claim["speaker_id"], claim["voice"])
+        timings["voice"] = time.perf_counter() - t
+        out["voice_similarity"] = res["score"]
+        out["voice_match"] = res["match"]
+
+    ocr_text = ""
+    if claim.get("image"):
+        t = time.perf_counter()
+        image = backend.analyze_image_full(claim["image"])
+        timings["image"] = time.perf_counter() - t
+        if image.get("error"):
+            out["image_error"] = image["error"]
+        else:
+            out["image_risk"] = image["risk_level"]
+        ocr_text = image["ocr_text"]
+
+    text = claim.get("text")
+    if text is None and claim.get("text_file"):
+        with open(claim["text_file"], "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    if not text and ocr_text:
+        text = ocr_text
+        out["text_source"] = "ocr"
+    return out, text or None
+
+
+def _decide(out):
+    risks = [out[k] for k in ("image_risk", "text_risk") if k in out]
+    if risks and "error" not in out:
+        out["final_score"] = sum(risks) / len(risks)
+        out["decision"] = "RISK" if out["final_score"] > RISK_THRESHOLD else "NOT RISK"
+
+
+def score_chunk(claims):
+    """
+    Score a chunk of claims in one worker: voice and image per claim, then the texts of the
+    whole chunk in one batched analyze_texts call. Failures only affect their own claim.
+    """
+    import backend
+
+    outs, texts, timings = [], [], []
+    for claim in claims:
+        t = {}
+        try:
+            out, text = _score_media(claim, t)
+        except Exception as e:
+            out, text = {"id": str(claim["id"]), "error": f"{type(e).__name__}: {e}"}, None
+        outs.append(out)
+        texts.append(text)
+        timings.append(t)
+
+    todo = [i for i, text in enumerate(texts) if text]
+    if todo:
+        start = time.perf_counter()
+        try:
+            risks = backend.analyze_texts([texts[i] for i in todo])
+        except Exception:
+            risks = None  # one bad text fails the batch: score the chunk's texts one by one
+        per_text = (time.perf_counter() - start) / len(todo)
+        for i, risk in zip(todo, risks or [None] * len(todo)):
+            if risk is None:
+                start = time.perf_counter()
+                try:
+                    risk = backend.analyze_text(texts[i])
+                except Exception as e:
+                    outs[i]["error"] = f"{type(e).__name__}: {e}"
+                    continue
+                per_text = time.perf_counter() - start
+            outs[i]["text_risk"] = risk
+            timings[i]["text"] = per_text
+
+    for out, t in zip(outs, timings):
+        _decide(out)
+        out["timings"] = t
+    return outs
+
+
+def score_claim(claim):
+    return score_chunk([claim])[0]
+
+
+# ---------- DRIVER ----------
+def _new_pool(workers, warmup):
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(warmup,))
+
+
+def run(source, output, workers, warmup, max_in_flight=None, chunk_size=8):
+    done = completed_ids(output)
+    if done:
+        print(f"↩️  Resuming: {len(done)} claims already in {output}")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    max_in_flight = max_in_flight or workers * 2
+    stage_totals, stage_counts = {}, {}
+    scored = errors = restarts = 0
+    start = time.perf_counter()
+    claims = (c for c in iter_claims(source) if str(c.get("id")) not in done)
+
+    with open(output, "a", encoding="utf-8") as out:
+        if out.tell() and not _ends_with_newline(output):
+            out.write("\n")  # terminate a line cut off by an interrupted run
+
+        def write(res):
+            nonlocal scored, errors
+            out.write(json.dumps(res) + "\n")
+            out.flush()
+            scored += 1
+            errors += "error" in res
+            for stage, secs in res.get("timings", {}).items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + secs
+                stage_counts[stage] = stage_counts.get(stage, 0) + 1
+
+        pool = _new_pool(workers, warmup)
+        pending = {}  # future -> the claims it scores
+        # Claims in flight when a worker died: re-run one at a time to find the one that kills it
+        suspects = []
+        exhausted = False
+
+        def restart():
+            nonlocal pool, pending, restarts
+            for fut, chunk in pending.items():
+                if fut.done() and fut.exception() is None:
+                    for res in fut.result():
+                        write(res)
+                else:
+                    suspects.extend(chunk)
+            pending = {}
+            pool.shutdown(wait=False, cancel_futures=True)
+            restarts += 1
+            print(f"⚠️  Worker process died; restarting the pool ({len(suspects)} claims to re-run)")
+            pool = _new_pool(workers, warmup)
+
+        def submit(chunk):
+            try:
+                pending[pool.submit(score_chunk, chunk)] = chunk
+                return True
+            except BrokenProcessPool:  # a worker died since the last wait()
+                suspects.extend(chunk)
+                restart()
+                return False
+
+        try:
+            while pending or suspects or not exhausted:
+                if suspects:
+                    if not pending:
+                        submit([suspects.pop(0)])
+                else:
+                    # Keep a bounded number of chunks in flight instead of submitting everything
+                    while not exhausted and len(pending) < max_in_flight:
+                        chunk = list(islice(claims, chunk_size))
+                        if not chunk:
+                            exhausted = True
+                        elif not submit(chunk):
+                            break
+                if not pending:
+                    continue
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                solo = len(pending) == 1
+                broken = False
+                for fut in finished:
+                    chunk = pending.pop(fut)
+                    try:
+                        results = fut.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        if solo and len(chunk) == 1:
+                            # Alone in the pool and it still died: this claim crashes the worker
+                            write({"id": str(chunk[0]["id"]), "error": f"BrokenProcessPool: {e}",
+                                   "timings": {}})
+                        else:
+                            suspects.extend(chunk)
+                        continue
+                    except Exception as e:
+                        results = [{"id": str(c["id"]), "error": f"{type(e).__name__}: {e}", "timings": {}}
+                                   for c in chunk]
+                    for res in results:
+                        write(res)
+                if broken:
+                    restart()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "scored": scored,
+        "skipped": len(done),
+        "errors": errors,
+        "pool_restarts": restarts,
+        "elapsed_s": elapsed,
+        "claims_per_sec": scored / elapsed if elapsed else 0.0,
+        "mean_stage_s": {s: stage_totals[s] / stage_counts[s] for s in stage_totals},
+    }
+    print("\n========== BATCH REPORT ==========")
+    print(json.dumps(report, indent=2))
+    print("==================================")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch fraud scoring over a directory or JSONL manifest")
+    parser.add_argument("source", help="Directory of claims or JSONL manifest")
+    parser.add_argument("--output", "-o", default="phase1_outputs/results.jsonl")
+    parser.add_argument("--workers", "-w", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--warmup", default="nlp_analyzer,easyocr",
+                        help="Comma-separated registry models to load when each worker starts")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Chunks submitted at once")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Claims per worker task")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ Not found: {args.source}")
+        sys.exit(1)
+    warmup = [m.strip() for m in args.warmup.split(",") if m.strip()]
+    run(args.source, args.output, args.workers, warmup, args.max_in_flight, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
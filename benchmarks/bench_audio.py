@@ -0,0 +1,123 @@
+"""
+Audio Preprocessing Benchmark
+-----------------------------
+Per-stage timings of the old voice.load_and_clean (float64 soundfile read, librosa resample,
+full noisereduce, librosa RMS VAD) against audio_preprocess.preprocess in each denoise mode.
+
+Usage:
+    python benchmarks/bench_audio.py                       # ayush.wav + kshitijphone.wav
+    python benchmarks/bench_audio.py --files a.wav b.wav --repeat 5 --out audio_bench.json
+    python benchmarks/bench_audio.py --embedding           # also time the ECAPA forward pass
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import audio_preprocess
+
+DEFAULT_FILES = ["ayush.wav", "kshitijphone.wav"]
+
+
+def legacy_preprocess(path, timings):
+    """The original voice.load_and_clean, stage by stage."""
+    import librosa
+    import noisereduce as nr
+    import soundfile as sf
+
+    t = time.perf_counter()
+    wav, sr = sf.read(path)
+    if len(wav.shape) > 1:
+        wav = wav.mean(axis=1)
+    timings["decode"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    if sr != 16000:
+        wav = librosa.resample(wav, orig_sr=sr, target_sr=16000)
+        sr = 16000
+    timings["resample"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    wav = nr.reduce_noise(y=wav, sr=sr)
+    timings["denoise"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    energy = librosa.feature.rms(y=wav)[0]
+    frames = np.nonzero(energy > 0.5 * np.mean(energy))[0]
+    if len(frames) > 0:
+        s = librosa.frames_to_samples(frames, hop_length=512)
+        wav = wav[max(0, s[0]):min(len(wav), s[-1])]
+    timings["vad"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    wav = wav / (np.max(np.abs(wav)) + 1e-6)
+    timings["normalize"] = time.perf_counter() - t
+    return wav, sr
+
+
+def run(fn, path, repeat):
+    runs = []
+    wav = None
+    for _ in range(repeat):
+        timings = {}
+        wav, _ = fn(path, timings)
+        runs.append(timings)
+    stages = {k: float(np.median([r[k] for r in runs]) * 1000) for k in runs[0]}
+    stages["total"] = float(sum(stages.values()))
+    return wav, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark voice preprocessing stages")
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--embedding", action="store_true", help="Also time ECAPA encode_batch")
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    pipelines = {"legacy": legacy_preprocess}
+    for mode in ("off", "stationary", "full"):
+        pipelines[f"new_{mode}"] = (
+            lambda m: lambda p, t: audio_preprocess.preprocess(p, denoise_mode=m, timings=t)
+        )(mode)
+
+    model = None
+    if args.embedding:
+        import torch
+        import voice
+        model = voice.model
+
+    report = {"repeat": args.repeat, "files": {}}
+    for name in args.files:
+        path = name if os.path.isabs(name) else os.path.join(ROOT, name)
+        info = audio_preprocess.sf.info(path)
+        entry = {"duration_s": info.frames / info.samplerate, "samplerate": info.samplerate, "pipelines": {}}
+        for label, fn in pipelines.items():
+            wav, stages = run(fn, path, args.repeat)
+            stages["speech_s"] = len(wav) / audio_preprocess.TARGET_SR
+            if model is not None:
+                x = torch.from_numpy(np.asarray(wav, dtype=np.float32)).unsqueeze(0)
+                t = time.perf_counter()
+                with torch.no_grad():
+                    model.encode_batch(x)
+                stages["ecapa_ms"] = (time.perf_counter() - t) * 1000
+            entry["pipelines"][label] = stages
+            print(f"{name:>18} {label:>15}: " + ", ".join(f"{k}={v:.1f}" for k, v in stages.items()))
+        report["files"][name] = entry
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
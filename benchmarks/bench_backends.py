@@ -0,0 +1,97 @@
+"""
+Inference Backend Benchmark
+---------------------------
+CPU latency, resident size and fp32 agreement of each inference backend (inference_backends.py)
+for the NLP models.
+
+Usage:
+    python benchmarks/bench_backends.py                                   # finbert, all backends
+    python benchmarks/bench_backends.py --models finbert zero_shot --backends eager int8 onnx-int8
+    python benchmarks/bench_backends.py --texts test1.txt test2.txt --repeat 10 --out backends.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import inference_backends
+from model_registry import _rss_bytes
+
+MODELS = {
+    "finbert": ("sequence", "yiyanghkust/finbert-tone"),
+    "ner": ("token", "dslim/bert-base-NER"),
+    "zero_shot": ("sequence", "facebook/bart-large-mnli"),
+}
+
+
+def load(key, backend):
+    os.environ[f"INFERENCE_BACKEND_{key.upper()}"] = backend
+    task, model_id = MODELS[key]
+    loader = (inference_backends.load_sequence_classifier if task == "sequence"
+              else inference_backends.load_token_classifier)
+    return loader(key, model_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare eager / int8 / ONNX backends on CPU")
+    parser.add_argument("--models", nargs="+", default=["finbert"], choices=list(MODELS))
+    parser.add_argument("--backends", nargs="+", default=list(inference_backends.BACKENDS))
+    parser.add_argument("--texts", nargs="+", default=None, help="Text files (default: calibration texts)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    texts = inference_backends.CALIBRATION_TEXTS
+    if args.texts:
+        texts = []
+        for name in args.texts:
+            with open(os.path.join(ROOT, name) if not os.path.isabs(name) else name, encoding="utf-8") as f:
+                texts.append(f.read())
+
+    report = {}
+    for key in args.models:
+        report[key] = {}
+        baseline = None
+        for backend in args.backends:
+            gc.collect()
+            rss_before = _rss_bytes()
+            model, tokenizer = load(key, backend)
+            rss_after = _rss_bytes()
+            run = inference_backends._softmax_fn(model, tokenizer)
+            probs = run(texts)  # warm-up
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                run(texts)
+                times.append(time.perf_counter() - start)
+            entry = {
+                "p50_ms": float(np.median(times) * 1000),
+                "rss_delta_mb": (rss_after - rss_before) / 1e6 if rss_before and rss_after else None,
+            }
+            if baseline is None and backend == "eager":
+                baseline = probs
+            if baseline is not None:
+                entry["max_abs_diff_vs_eager"] = float(np.max(np.abs(probs - baseline)))
+                entry["speedup_vs_eager"] = report[key]["eager"]["p50_ms"] / entry["p50_ms"] \
+                    if "eager" in report[key] else None
+            report[key][backend] = entry
+            print(f"{key:>10} {backend:>10}: " + ", ".join(f"{k}={v}" for k, v in entry.items()))
+            del model, tokenizer, run
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Fraud Classifier Benchmark
+--------------------------
+Compares the HF zero-shot pipeline against the FraudClassifier "nli" and "embedding" modes.
+
+- Latency: mean / p95 per text and texts/sec for each mode
+- Accuracy: against gold labels when --data is a JSONL of {"text": ..., "label": "fraud"|"legal"}
+- Agreement: fraction of decisions matching the pipeline (always reported)
+
+Usage:
+    python benchmarks/bench_fraud.py                      # uses test*.txt
+    python benchmarks/bench_fraud.py --data claims.jsonl --repeat 3 --out fraud_bench.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from combined_nlp_fraud_detector_fileinput_v2 import CombinedNLPAnalyzer, read_text_file
+from fraud_classifier import FraudClassifier
+
+
+def load_samples(path):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [r["text"] for r in rows], [r.get("label") for r in rows]
+    files = sorted(glob.glob(os.path.join(ROOT, "test*.txt")))
+    return [read_text_file(p) for p in files], [None] * len(files)
+
+
+def run_mode(analyzer, texts, repeat, batch_size):
+    latencies, labels = [], []
+    for r in range(repeat):
+        for i in range(0, len(texts), batch_size):
+            chunk = texts[i:i + batch_size]
+            start = time.perf_counter()
+            res = analyzer.analyze_fraud_batch(chunk, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            latencies.extend([elapsed / len(chunk)] * len(chunk))
+            if r == 0:
+                labels.extend(x["chosen_label"] for x in res)
+    lat = np.array(latencies) * 1000
+    return labels, {
+        "mean_ms": float(lat.mean()),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "texts_per_sec": float(1000.0 / lat.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fraud classification modes")
+    parser.add_argument("--data", type=str, help="JSONL with 'text' and optional 'label' (fraud/legal)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    texts, gold = load_samples(args.data)
+    analyzer = CombinedNLPAnalyzer()
+    engines = {
+        "pipeline": None,
+        "nli": FraudClassifier(analyzer.fraud_labels, mode="nli",
+                               nli_model=analyzer.zero_shot.model,
+                               nli_tokenizer=analyzer.zero_shot.tokenizer),
+        "embedding": FraudClassifier(analyzer.fraud_labels, mode="embedding",
+                                     semantic_model=analyzer.semantic_model),
+    }
+
+    report = {"samples": len(texts), "batch_size": args.batch_size, "modes": {}}
+    baseline = None
+    for mode, engine in engines.items():
+        analyzer.fraud_engine = engine
+        analyzer.analyze_fraud_batch(texts[:1])  # warm-up
+        labels, timing = run_mode(analyzer, texts, args.repeat, args.batch_size)
+        if baseline is None:
+            baseline = labels
+        entry = dict(timing)
+        entry["agreement_with_pipeline"] = float(np.mean([a == b for a, b in zip(labels, baseline)]))
+        if all(g is not None for g in gold):
+            entry["accuracy"] = float(np.mean([a == g for a, g in zip(labels, gold)]))
+        report["modes"][mode] = entry
+        print(f"{mode:>10}: {entry}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Gemini Client Benchmark
+-----------------------
+Drives GeminiClient against the local stub (gemini_stub.py) and reports throughput,
+latency percentiles, retries, hedges and failures.
+
+Usage:
+    python benchmarks/bench_gemini.py --requests 200 --concurrency 32
+    python benchmarks/bench_gemini.py --fail-rate 0.1 --throttle-rate 0.05 --hedge-after 0.8
+    python benchmarks/bench_gemini.py --base-url http://127.0.0.1:8001   # use an already running stub
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gemini_stub
+from gemini_client import GeminiClient, GeminiError, image_request
+
+
+def start_stub(port, **config):
+    import uvicorn
+    gemini_stub.CONFIG.update(config)
+    server = uvicorn.Server(uvicorn.Config(gemini_stub.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def drive(client, n_requests, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await client.generate(image_request(f"claim {i}", "AAAA", "image/png"))
+                latencies.append(time.perf_counter() - start)
+            except GeminiError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pooled Gemini client against the stub")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--client-concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=None, help="Client rate limit (req/s)")
+    parser.add_argument("--hedge-after", type=float, default=None)
+    parser.add_argument("--base-url", type=str, default=None)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-ms", type=float, default=2000.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    if base_url is None:
+        start_stub(args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                   tail_rate=args.tail_rate, tail_ms=args.tail_ms,
+                   fail_rate=args.fail_rate, throttle_rate=args.throttle_rate)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    client = GeminiClient(api_key="stub", base_url=base_url, max_concurrency=args.client_concurrency,
+                          rate_per_sec=args.rate, hedge_after=args.hedge_after, backoff_base=0.1)
+    latencies, errors, wall = asyncio.run(drive(client, args.requests, args.concurrency))
+    client.close()
+
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    report = {
+        "requests": args.requests,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "client": client.stats,
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
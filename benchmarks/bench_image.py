@@ -0,0 +1,90 @@
+"""
+Image Preprocessing Benchmark
+-----------------------------
+Bytes sent to Gemini and OCR time, before (raw file, image/png label, OCR from path) and
+after image_preprocess.prepare_image (single decode, capped resolution, compact re-encode).
+
+Usage:
+    python benchmarks/bench_image.py                       # sample*.png/jpg + fake.jpg, no OCR
+    python benchmarks/bench_image.py --ocr --repeat 3      # also time EasyOCR before/after
+    python benchmarks/bench_image.py --files claim.jpg --max-side 1280 --out image_bench.json
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_preprocess import prepare_image
+
+
+def default_files():
+    return sorted(glob.glob(os.path.join(ROOT, "sample*.*"))) + [os.path.join(ROOT, "fake.jpg")]
+
+
+def timed(fn, repeat):
+    times = []
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, float(np.median(times) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing before OCR/Gemini")
+    parser.add_argument("--files", nargs="+", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-side", type=int, default=None)
+    parser.add_argument("--ocr", action="store_true", help="Also time EasyOCR on path vs shared array")
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    reader = None
+    if args.ocr:
+        import easyocr
+        reader = easyocr.Reader(['en'], gpu=False)
+
+    kwargs = {"max_side": args.max_side} if args.max_side else {}
+    report = {"files": {}, "totals": {"bytes_before": 0, "bytes_after": 0}}
+    for path in args.files or default_files():
+        with open(path, "rb") as f:
+            before_b64 = len(base64.b64encode(f.read()))
+        prepared, prep_ms = timed(lambda: prepare_image(path, **kwargs), args.repeat)
+        after_b64 = len(prepared.base64)
+        entry = {
+            "source_mime": prepared.source_mime,
+            "sent_mime": prepared.mime_type,
+            "original_size": prepared.original_size,
+            "size": prepared.size,
+            "base64_bytes_before": before_b64,
+            "base64_bytes_after": after_b64,
+            "bytes_saved_pct": 100.0 * (1 - after_b64 / before_b64),
+            "prepare_ms": prep_ms,
+        }
+        if reader is not None:
+            _, entry["ocr_ms_before"] = timed(lambda: reader.readtext(path), args.repeat)
+            _, entry["ocr_ms_after"] = timed(lambda: reader.readtext(prepared.array), args.repeat)
+        report["files"][os.path.basename(path)] = entry
+        report["totals"]["bytes_before"] += before_b64
+        report["totals"]["bytes_after"] += after_b64
+        print(f"{os.path.basename(path):>14}: " + ", ".join(f"{k}={v}" for k, v in entry.items()))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report["totals"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
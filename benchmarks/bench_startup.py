@@ -0,0 +1,91 @@
+"""
+Startup Time Report
+-------------------
+Cold import time of each entry module in a fresh interpreter, and whether importing it already
+pulled in the heavy stacks (torch, transformers, easyocr, speechbrain).
+
+The web worker (app) must import in under --target seconds without loading torch; models are
+only built by the registry on the first request (or MODEL_WARMUP). Exits non-zero when it does not.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --modules app backend voice --repeat 5 --out startup.json
+    ANALYSIS_BACKEND=real python benchmarks/bench_startup.py --target 1.5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["app", "backend", "voice", "main", "batch_score", "model_registry"]
+HEAVY = ["torch", "transformers", "easyocr", "speechbrain", "sentence_transformers"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    import {module}
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "error": error,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                         cwd=ROOT, capture_output=True, text=True)
+    lines = out.stdout.strip().splitlines()
+    if out.returncode != 0 or not lines:
+        return {"import_s": None, "error": out.stderr.strip().splitlines()[-1:] or "failed", "heavy": []}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold import time of the entry modules")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--target", type=float, default=float(os.getenv("STARTUP_TARGET_S", "1.0")),
+                        help="Max cold import time of app, in seconds")
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    report = {"target_s": args.target, "modules": {}}
+    for module in args.modules:
+        runs = [probe(module) for _ in range(args.repeat)]
+        times = [r["import_s"] for r in runs if r["import_s"] is not None]
+        entry = {
+            "import_s": float(np.median(times)) if times else None,
+            "heavy_imported": runs[-1]["heavy"],
+            "error": runs[-1]["error"],
+        }
+        report["modules"][module] = entry
+        shown = f"{entry['import_s']:.3f}s" if entry["import_s"] is not None else "n/a"
+        print(f"{module:>16}: {shown}  heavy={entry['heavy_imported'] or '-'}"
+              + (f"  error={entry['error']}" if entry["error"] else ""))
+
+    app = report["modules"].get("app")
+    ok = True
+    if app is not None:
+        ok = (app["error"] is None and app["import_s"] is not None
+              and app["import_s"] <= args.target and "torch" not in app["heavy_imported"])
+        print(f"\napp cold import {'within' if ok else 'OVER'} target of {args.target:.2f}s"
+              + ("" if "torch" not in app["heavy_imported"] else " (torch was imported)"))
+    report["ok"] = ok
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Batched Speaker Embedding Benchmark
+-----------------------------------
+Throughput of voice.get_embedding called once per file against voice.get_embeddings (parallel
+cleaning, length buckets, padded encode_batch with wav_lens), and how far the batched embeddings
+drift from the single-file ones (1 - cosine).
+
+Usage:
+    python benchmarks/bench_voice_batch.py                                # ayush.wav + kshitijphone.wav x 16
+    python benchmarks/bench_voice_batch.py --files a.wav b.wav c.wav --copies 50 --batch-size 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import voice
+
+DEFAULT_FILES = ["ayush.wav", "kshitijphone.wav"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-file vs batched ECAPA embedding throughput")
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES)
+    parser.add_argument("--copies", type=int, default=16, help="Times each file is repeated")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    paths = [f if os.path.isabs(f) else os.path.join(ROOT, f) for f in args.files] * args.copies
+    voice.get_embeddings(paths[:2], use_cache=False)  # load ECAPA outside the timings
+
+    start = time.perf_counter()
+    single = np.stack([voice.get_embedding(p, use_cache=False).reshape(-1).cpu().numpy() for p in paths])
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = voice.get_embeddings(paths, batch_size=args.batch_size, workers=args.workers, use_cache=False)
+    batched_s = time.perf_counter() - start
+
+    report = {
+        "recordings": len(paths),
+        "batch_size": args.batch_size,
+        "single_files_per_s": len(paths) / single_s,
+        "batched_files_per_s": len(paths) / batched_s,
+        "speedup": single_s / batched_s,
+        "max_cosine_drift": float(np.nanmax(1.0 - np.sum(single * batched, axis=1))),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Benchmark Suite
+---------------
+One entry point for comparing commits: per-stage micro-benchmarks on the bundled samples
+plus a load-generator scenario against POST /analyze. Gemini is always served by the local
+stub (gemini_stub.py), so runs are offline and repeatable.
+
+- Stages: image.prepare, image.ocr, gemini.request, image.analyze, audio.preprocess,
+  voice.embedding, text.analyze, text.analyze_batch (a stage whose dependencies are not
+  installed is reported as skipped, the rest still run)
+- Each stage reports the first (cold) call separately from the warm p50 / mean / min / max
+- Load: starts the app with uvicorn in a subprocess (ANALYSIS_BACKEND=--backend, real by
+  default; or targets --server-url), drives /analyze at a fixed concurrency and reports
+  throughput, p50/p95/p99 and server peak RSS, tagged with the backend measured
+- Results are written as JSON together with the git commit; --compare prints the deltas
+  against an earlier run
+
+Usage:
+    python benchmarks/run_all.py --out bench_$(git rev-parse --short HEAD).json
+    python benchmarks/run_all.py --stages audio.preprocess,image.prepare --no-load
+    python benchmarks/run_all.py --no-stages --requests 500 --concurrency 32 --unique
+    python benchmarks/run_all.py --compare bench_old.json --out bench_new.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STUB_PORT = 8765
+IMAGES = sorted(glob.glob(os.path.join(ROOT, "sample*.png")))
+VOICES = sorted(glob.glob(os.path.join(ROOT, "*.wav")))
+TEXTS = sorted(glob.glob(os.path.join(ROOT, "test*.txt")))
+
+
+# ---------- ENVIRONMENT ----------
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb(pid="self"):
+    """Peak resident set size (VmHWM) of a process in MB; Linux only."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def start_stub(args):
+    """Serve the Gemini stub in-process and point every client at it (before gemini_client is imported)."""
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}"
+    os.environ["GEMINI_API_KEY"] = "stub"
+    from bench_gemini import start_stub as serve  # imports gemini_client, so env goes first
+    serve(args.stub_port, latency_ms=args.stub_latency_ms, jitter_ms=0.0, tail_rate=0.0,
+          fail_rate=0.0, throttle_rate=0.0)
+
+
+def read_texts():
+    texts = []
+    for path in TEXTS:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            texts.append(f.read())
+    return texts
+
+
+# ---------- STAGES ----------
+def stage_inputs():
+    """name -> (setup, fn); setup() returns the list of inputs fn is called with."""
+    def prepared_images():
+        from image_preprocess import prepare_image
+        return [prepare_image(p) for p in IMAGES]
+
+    def image_prepare(path):
+        from image_preprocess import prepare_image
+        return prepare_image(path)
+
+    def image_ocr(image):
+        import backend
+        return backend.run_ocr(image)
+
+    def gemini_request(image):
+        from gemini_client import client, image_request
+        return client.generate_sync(image_request("benchmark", image.base64, image.mime_type))
+
+    def image_analyze(path):
+        import backend
+        return backend.analyze_image_full(path)
+
+    def audio_preprocess(path):
+        import audio_preprocess
+        return audio_preprocess.preprocess(path)
+
+    def voice_embedding(path):
+        import voice
+        return voice.get_embedding(path, use_cache=False)
+
+    def text_analyze(text):
+        import backend
+        return backend.analyze_text(text)
+
+    def text_analyze_batch(texts):
+        import backend
+        return backend.analyze_texts(texts)
+
+    return {
+        "image.prepare": (lambda: IMAGES, image_prepare),
+        "image.ocr": (prepared_images, image_ocr),
+        "gemini.request": (prepared_images, gemini_request),
+        "image.analyze": (lambda: IMAGES, image_analyze),
+        "audio.preprocess": (lambda: VOICES, audio_preprocess),
+        "voice.embedding": (lambda: VOICES, voice_embedding),
+        "text.analyze": (read_texts, text_analyze),
+        "text.analyze_batch": (lambda: [read_texts()], text_analyze_batch),
+    }
+
+
+def bench_stage(setup, fn, repeat):
+    inputs = setup()
+    if not inputs:
+        return {"skipped": "no sample inputs"}
+    start = time.perf_counter()
+    fn(inputs[0])
+    cold = time.perf_counter() - start  # includes model loading / first-call overheads
+
+    times = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            times.append(time.perf_counter() - start)
+    ms = np.array(times) * 1000
+    return {"inputs": len(inputs), "runs": len(times), "cold_ms": cold * 1000,
+            "p50_ms": float(np.median(ms)), "mean_ms": float(ms.mean()),
+            "min_ms": float(ms.min()), "max_ms": float(ms.max())}
+
+
+def run_stages(names, repeat):
+    results = {}
+    for name, (setup, fn) in stage_inputs().items():
+        if names and name not in names:
+            continue
+        try:
+            results[name] = bench_stage(setup, fn, repeat)
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name or e}"}
+        except Exception as e:
+            results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+        res = results[name]
+        if "skipped" in res:
+            print(f"{name:>20}: skipped ({res['skipped']})")
+        else:
+            print(f"{name:>20}: p50={res['p50_ms']:.1f}ms mean={res['mean_ms']:.1f}ms "
+                  f"cold={res['cold_ms']:.1f}ms ({res['runs']} runs)")
+    return results
+
+
+# ---------- LOAD ----------
+def start_server(port, backend="real"):
+    # Inherits GEMINI_BASE_URL / GEMINI_API_KEY, so the app also talks to the stub; the backend is
+    # set explicitly, since app.py falls back to the mock functions without ANALYSIS_BACKEND
+    env = dict(os.environ, ANALYSIS_BACKEND=backend)
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning"], cwd=ROOT, env=env)
+
+
+async def wait_ready(client, url, proc=None, timeout=120.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            await client.get(url + "/pools")
+            return
+        except Exception:
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {url} did not become ready")
+
+
+def request_files(i, args, payloads):
+    files = {}
+    if payloads["images"]:
+        name, data = payloads["images"][i % len(payloads["images"])]
+        files["image"] = (name, data, "image/png")
+    if payloads["texts"]:
+        name, data = payloads["texts"][i % len(payloads["texts"])]
+        if args.unique:
+            data = data + f"\n[load request {i} {time.time_ns()}]".encode("utf-8")  # defeat the result cache
+        files["text"] = (name, data, "text/plain")
+    if args.with_voice and payloads["voices"]:
+        name, data = payloads["voices"][i % len(payloads["voices"])]
+        files["voice"] = (name, data, "audio/wav")
+    return files
+
+
+async def drive_load(args, url, proc=None):
+    import httpx
+
+    def load(paths):
+        out = []
+        for p in paths:
+            with open(p, "rb") as f:
+                out.append((os.path.basename(p), f.read()))
+        return out
+    payloads = {"images": load(IMAGES), "texts": load(TEXTS), "voices": load(VOICES)}
+
+    latencies, statuses = [], {}
+    sem = asyncio.Semaphore(args.concurrency)
+    async with httpx.AsyncClient(timeout=args.request_timeout) as client:
+        await wait_ready(client, url, proc)
+        for i in range(args.warmup_requests):
+            await client.post(url + "/analyze", files=request_files(i, args, payloads))
+
+        async def one(i):
+            async with sem:
+                start = time.perf_counter()
+                try:
+                    resp = await client.post(url + "/analyze", files=request_files(i, args, payloads))
+                    key = str(resp.status_code)
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                elapsed = time.perf_counter() - start
+                statuses[key] = statuses.get(key, 0) + 1
+                if key == "200":
+                    latencies.append(elapsed)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        wall = time.perf_counter() - start
+        try:
+            pools = (await client.get(url + "/pools")).json()
+        except Exception:
+            pools = None
+
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "succeeded": len(latencies),
+        "statuses": statuses,
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "pools": pools,
+    }
+
+
+def run_load(args):
+    proc = None
+    url = args.server_url
+    if url is None:
+        proc = start_server(args.port, args.backend)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        report = asyncio.run(drive_load(args, url, proc))
+        # An already running app (--server-url) reports whatever backend it was started with
+        report["backend"] = args.backend if proc is not None else "external"
+        report["server_peak_rss_mb"] = peak_rss_mb(proc.pid if proc else args.server_pid) \
+            if (proc or args.server_pid) else None
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+    print(f"{'load /analyze':>20}: [{report['backend']} backend] {report['throughput_rps']:.1f} req/s, p50={report['p50_ms']:.1f}ms "
+          f"p95={report['p95_ms']:.1f}ms p99={report['p99_ms']:.1f}ms, statuses={report['statuses']}, "
+          f"server peak RSS={report['server_peak_rss_mb']} MB")
+    return report
+
+
+# ---------- COMPARISON ----------
+def compare(old, new):
+    def delta(a, b):
+        return f"{b:9.1f} vs {a:9.1f}  ({(b - a) / a * 100:+.1f}%)" if a else f"{b:9.1f}"
+
+    print(f"\n===== {new.get('commit')} vs {old.get('commit')} =====")
+    for name, res in new.get("stages", {}).items():
+        prev = old.get("stages", {}).get(name, {})
+        if "p50_ms" in res and "p50_ms" in prev:
+            print(f"{name:>20} p50_ms: {delta(prev['p50_ms'], res['p50_ms'])}")
+    if new.get("load") and old.get("load"):
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "server_peak_rss_mb"):
+            if new["load"].get(key) is not None and old["load"].get(key) is not None:
+                print(f"{'load ' + key:>20}: {delta(old['load'][key], new['load'][key])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage and end-to-end benchmark suite")
+    parser.add_argument("--stages", type=str, default=None, help="Comma-separated subset of stages")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm passes over the samples per stage")
+    parser.add_argument("--no-stages", action="store_true")
+    parser.add_argument("--no-load", action="store_true")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup-requests", type=int, default=5)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--unique", action="store_true", help="Make every uploaded text unique (no text cache hits)")
+    parser.add_argument("--with-voice", action="store_true", help="Also upload a voice file per request")
+    parser.add_argument("--port", type=int, default=8766, help="Port for the app under load")
+    parser.add_argument("--backend", choices=["real", "mock"], default="real",
+                        help="ANALYSIS_BACKEND of the app started for the load test")
+    parser.add_argument("--server-url", type=str, default=None, help="Target an already running app")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of --server-url, for peak RSS")
+    parser.add_argument("--stub-port", type=int, default=STUB_PORT)
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--compare", type=str, default=None, help="Earlier results JSON to diff against")
+    parser.add_argument("--out", type=str, help="Write results JSON here")
+    args = parser.parse_args()
+
+    start_stub(args)
+    report = {
+        "commit": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+    if not args.no_stages:
+        names = set(args.stages.split(",")) if args.stages else None
+        report["stages"] = run_stages(names, args.repeat)
+        report["bench_peak_rss_mb"] = peak_rss_mb()
+    if not args.no_load:
+        report["load"] = run_load(args)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Results written to {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Cascade Scoring
+---------------
+Cheap-first scoring of one claim with early exit, so BART-MNLI and Gemini only run for claims
+whose outcome is still open.
+
+Stages, cheapest first (app.run_cascade drives them):
+  1. image.hash    perceptual-hash lookup; a byte-identical file with a cached analysis gives the
+                   image risk for free, and a near-duplicate can decide RISK (CASCADE_DUPLICATE_DECIDES=1)
+  2. voice         a voice mismatch decides RISK (CASCADE_VOICE_DECIDES, default on)
+  3. text.prescore FinBERT + NER + narrative reuse without the zero-shot fraud model; the text
+                   score is then known to lie in [partial + w/2, partial + w] (w = fraud weight)
+  4. text.fraud    full text analysis (BART-MNLI)
+  5. image.gemini  OCR + Gemini
+
+After every stage each scored modality (image, text) has a [low, high] risk interval; one that
+has not been scored yet counts as [0, 1]. The claim is decided NOT RISK once the mean of the
+upper ends is below CASCADE_LOW, and RISK once the mean of the lower ends is above CASCADE_HIGH,
+so an early exit only happens when no outcome of the remaining stages could change it; in
+between (the uncertain band) the next stage runs.
+When every stage ran, the usual rule applies: mean risk > RISK_THRESHOLD -> RISK.
+
+The report lists the stages that ran and were skipped, where the cascade exited, and the compute
+saved: the mean observed duration (financeai_stage_seconds{stage="cascade.<name>"}) of every
+skipped stage, or DEFAULT_COSTS until a stage has been observed.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+STAGES = ("image.hash", "voice", "text.prescore", "text.fraud", "image.gemini")
+RISK_THRESHOLD = 0.6
+
+# Rough CPU seconds per stage, used for "saved" until real timings exist
+DEFAULT_COSTS = {"image.hash": 0.02, "voice": 0.5, "text.prescore": 0.2,
+                 "text.fraud": 1.5, "image.gemini": 4.0}
+
+cascade_stages = metrics.Counter("cascade_stages", "Cascade stages by outcome (run / skipped)",
+                                 ["stage", "outcome"])
+cascade_exits = metrics.Counter("cascade_exits", "Claims decided by a cascade stage", ["stage"])
+cascade_saved_seconds = metrics.Counter("cascade_saved_seconds",
+                                        "Estimated compute seconds saved by early exits")
+
+
+@dataclass
+class CascadeConfig:
+    low: float = 0.35
+    high: float = 0.8
+    voice_decides: bool = True
+    duplicate_decides: bool = False
+    risk_threshold: float = RISK_THRESHOLD
+
+    @classmethod
+    def from_env(cls) -> "CascadeConfig":
+        return cls(
+            low=float(os.getenv("CASCADE_LOW", "0.35")),
+            high=float(os.getenv("CASCADE_HIGH", "0.8")),
+            voice_decides=os.getenv("CASCADE_VOICE_DECIDES", "1") == "1",
+            duplicate_decides=os.getenv("CASCADE_DUPLICATE_DECIDES", "0") == "1",
+            risk_threshold=float(os.getenv("RISK_THRESHOLD", str(RISK_THRESHOLD))),
+        )
+
+
+def expected_cost(stage: str) -> float:
+    mean = metrics.stage_seconds.mean(stage=f"cascade.{stage}")
+    return DEFAULT_COSTS.get(stage, 0.0) if mean is None else mean
+
+
+class Cascade:
+    def __init__(self, config: CascadeConfig, modalities):
+        """modalities: the risk-scored modalities this claim has ("image", "text")."""
+        self.config = config
+        self.modalities = list(modalities)
+        self.bounds: Dict[str, Tuple[float, float]] = {}
+        self.ran: Dict[str, float] = {}
+        self.skipped: List[str] = []
+        self.forced: Optional[str] = None
+        self.exit_stage: Optional[str] = None
+        self.reason: Optional[str] = None
+
+    # ---------- STAGES ----------
+    @contextmanager
+    def stage(self, name: str):
+        """Time one stage (recorded as cascade.<name>); callers check .decision first."""
+        start = time.perf_counter()
+        try:
+            with metrics.span(f"cascade.{name}"):
+                yield
+        finally:
+            self.ran[name] = time.perf_counter() - start
+            cascade_stages.inc(stage=name, outcome="run")
+            if self.exit_stage is None and self.decision is not None:
+                self.exit_stage = name
+                cascade_exits.inc(stage=name)
+
+    def skip(self, name: str):
+        if name not in self.ran and name not in self.skipped:
+            self.skipped.append(name)
+            cascade_stages.inc(stage=name, outcome="skipped")
+
+    # ---------- EVIDENCE ----------
+    def observe(self, modality: str, low: float, high: Optional[float] = None):
+        """Risk of a modality is known to lie in [low, high] (a point when high is omitted)."""
+        self.bounds[modality] = (float(low), float(low if high is None else high))
+
+    def unavailable(self, modality: str):
+        """A modality that failed or cannot be scored no longer counts toward the decision."""
+        if modality in self.modalities:
+            self.modalities.remove(modality)
+        self.bounds.pop(modality, None)
+
+    def decide(self, decision: str, reason: str):
+        """Hard decision from a gating signal (voice mismatch, reused image)."""
+        if self.forced is None:
+            self.forced, self.reason = decision, reason
+
+    def interval(self) -> Optional[Tuple[float, float]]:
+        if not any(m in self.bounds for m in self.modalities):
+            return None
+        # Unscored modalities could still come back anywhere in [0, 1]
+        spans = [self.bounds.get(m, (0.0, 1.0)) for m in self.modalities]
+        return (sum(lo for lo, _ in spans) / len(spans), sum(hi for _, hi in spans) / len(spans))
+
+    @property
+    def complete(self) -> bool:
+        return all(m in self.bounds and self.bounds[m][0] == self.bounds[m][1] for m in self.modalities)
+
+    @property
+    def decision(self) -> Optional[str]:
+        if self.forced is not None:
+            return self.forced
+        span = self.interval()
+        if span is None:
+            return None
+        low, high = span
+        if self.complete:
+            return "RISK" if low > self.config.risk_threshold else "NOT RISK"
+        if high < self.config.low:
+            return "NOT RISK"
+        if low > self.config.high:
+            return "RISK"
+        return None
+
+    # ---------- REPORT ----------
+    def report(self) -> dict:
+        saved = sum(expected_cost(s) for s in self.skipped)
+        if saved:
+            cascade_saved_seconds.inc(saved)
+        span = self.interval()
+        return {
+            "decision": self.decision,
+            "final_score": None if span is None else (span[0] + span[1]) / 2,
+            "score_bounds": None if span is None else list(span),
+            "exit_stage": self.exit_stage,
+            "reason": self.reason,
+            "stages_run": {name: round(s, 4) for name, s in self.ran.items()},
+            "stages_skipped": list(self.skipped),
+            "estimated_saved_s": round(saved, 4),
+            "thresholds": {"low": self.config.low, "high": self.config.high,
+                           "risk": self.config.risk_threshold},
+        }
@@ -2,67 +2,222 @@
 run_donut_inference_local_parquet.py
 ------------------------------------
 Runs OCR-free document understanding using Donut (naver-clova-ix/donut-base)
-on a locally downloaded Sujet Finance Vision 10k parquet dataset.
-"""
+on the locally downloaded Sujet Finance Vision 10k parquet shards.
 
-"""
-run_donut_inference_local_parquet_fixed.py
-------------------------------------------
-Handles parquet datasets where images may be:
- - stored as binary bytes
- - Hugging Face Image objects
- - URLs or local paths
-
-Runs Donut OCR-free extraction and saves results.
+- Streams each shard row group by row group (pyarrow iter_batches), reading only the
+  image / id columns, so memory stays flat regardless of shard size
+- Handles images stored as:
+   - raw binary bytes (Hugging Face Image struct {'bytes', 'path'} or a binary column)
+   - base64 strings (decoded only when the value is actually text)
+   - local paths
+- Batches images through the Donut image-to-text pipeline
+- Appends one JSON line per row to phase1_outputs/donut_inference_results.jsonl and resumes
+  from the last written row offset (or --start-offset)
+
+Usage:
+    python check.py C:\\donut\\dataset\\train-00000-of-00003.parquet --batch-size 8
+    python check.py shard0.parquet shard1.parquet --limit 500 --start-offset 2000
 """
 
+import argparse
 import base64
+import binascii
 import io
-from datasets import load_dataset
+import json
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 from PIL import Image
-from transformers import pipeline
 
-# --- Load the local parquet dataset ---
-dataset = load_dataset(
-    "parquet",
-    data_files=r"C:\donut\dataset\train-00000-of-00003.parquet"
-)["train"]
+DEFAULT_PARQUET = os.getenv("DONUT_PARQUET", r"C:\donut\dataset\train-00000-of-00003.parquet")
+DEFAULT_OUTPUT = os.path.join("phase1_outputs", "donut_inference_results.jsonl")
+DONUT_MODEL = os.getenv("DONUT_MODEL", "naver-clova-ix/donut-base")
+ID_COLUMNS = ("doc_id", "id", "image_id")
 
-print("✅ Dataset loaded! Columns:", dataset.column_names)
 
-# --- Select one sample ---
-sample = dataset[0]
-print("Sample keys:", sample.keys())
+# ---------- SCHEMA ----------
+def find_columns(schema):
+    """Pick the image column (binary, or struct with a 'bytes' field) and an optional id column."""
+    image_col = id_col = None
+    for field in schema:
+        t = field.type
+        if image_col is None:
+            if pa.types.is_struct(t) and t.get_field_index("bytes") >= 0:
+                image_col = field.name
+            elif pa.types.is_binary(t) or pa.types.is_large_binary(t):
+                image_col = field.name
+        if id_col is None and field.name in ID_COLUMNS:
+            id_col = field.name
+    if image_col is None:
+        # Fall back to a string column named like an image (base64 or path)
+        for field in schema:
+            if "image" in field.name.lower() or "img" in field.name.lower():
+                image_col = field.name
+                break
+    if image_col is None:
+        raise ValueError(f"❌ Could not locate image column. Columns: {schema.names}")
+    return image_col, id_col
 
-# --- Locate the image field ---
-# Usually it's under something like 'image', 'img', or a dict with {'bytes': base64_string}
-image = None
 
-for key, value in sample.items():
+# ---------- DECODE ----------
+def to_image_bytes(value):
+    """Return raw encoded image bytes, base64-decoding only when the value is text."""
     if isinstance(value, dict):
-        if "bytes" in value:  # e.g., {'bytes': '...base64...'}
-            img_bytes = base64.b64decode(value["bytes"])
-            image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-            print(f"🖼️ Loaded image from key '{key}' (base64 bytes)")
+        if value.get("bytes") is not None:
+            value = value["bytes"]
+        elif value.get("path"):
+            with open(value["path"], "rb") as f:
+                return f.read()
+        else:
+            return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, str):
+        if os.path.exists(value):
+            with open(value, "rb") as f:
+                return f.read()
+        try:
+            return base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def decode_image(value):
+    raw = to_image_bytes(value)
+    if raw is None:
+        return None
+    return Image.open(io.BytesIO(raw)).convert("RGB")
+
+
+# ---------- STREAMING ----------
+def iter_rows(path, start=0, read_rows=64):
+    """Yield (row_index, id, image_value) from a parquet file, skipping whole row groups before start."""
+    pf = pq.ParquetFile(path)
+    image_col, id_col = find_columns(pf.schema_arrow)
+    columns = [image_col] + ([id_col] if id_col else [])
+
+    offset, first = 0, pf.num_row_groups
+    for i in range(pf.num_row_groups):
+        n = pf.metadata.row_group(i).num_rows
+        if offset + n > start:
+            first = i
+            break
+        offset += n
+    groups = list(range(first, pf.num_row_groups))
+    if not groups:
+        return
+
+    row = offset
+    for batch in pf.iter_batches(batch_size=read_rows, row_groups=groups, columns=columns):
+        images = batch.column(image_col).to_pylist()
+        ids = batch.column(id_col).to_pylist() if id_col else [None] * len(images)
+        for doc_id, value in zip(ids, images):
+            if row >= start:
+                yield row, doc_id, value
+            row += 1
+
+
+def resume_offset(output, shard):
+    """Next row to process for a shard, from what is already in the output file."""
+    nxt = 0
+    if not os.path.exists(output):
+        return nxt
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # partial last line from an interrupted run
+            if rec.get("shard") == shard:
+                nxt = max(nxt, rec["row"] + 1)
+    return nxt
+
+
+def run_shard(pipe, path, out, start, batch_size, limit=None, stats=None):
+    shard = os.path.basename(path)
+    if stats is None:
+        stats = {"rows": 0, "errors": 0, "decode_s": 0.0, "infer_s": 0.0}
+    pending = []
+
+    def flush():
+        # Error rows wait in pending too, so records are written in row order: resume_offset
+        # continues after the last row written and must never jump over unwritten good rows
+        images = [img for _, _, img, _ in pending if img is not None]
+        t = time.perf_counter()
+        outputs = iter(pipe(images, batch_size=batch_size) if images else [])
+        stats["infer_s"] += time.perf_counter() - t
+        for row, doc_id, image, error in pending:
+            if image is None:
+                rec = {"shard": shard, "row": row, "id": doc_id, "error": error}
+            else:
+                res = next(outputs)
+                text = res[0]["generated_text"] if isinstance(res, list) else res["generated_text"]
+                rec = {"shard": shard, "row": row, "id": doc_id, "generated_text": text}
+                stats["rows"] += 1
+            out.write(json.dumps(rec) + "\n")
+        out.flush()
+        pending.clear()
+
+    for n, (row, doc_id, value) in enumerate(iter_rows(path, start)):
+        if limit is not None and n >= limit:
             break
-    elif isinstance(value, str) and value.strip().startswith("/9j/"):  # raw base64 JPEG header
-        img_bytes = base64.b64decode(value)
-        image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        print(f"🖼️ Loaded image from key '{key}' (raw base64 string)")
-        break
+        t = time.perf_counter()
+        try:
+            image = decode_image(value)
+        except Exception as e:
+            image, error = None, f"{type(e).__name__}: {e}"
+        else:
+            error = None if image is not None else "no image bytes"
+        stats["decode_s"] += time.perf_counter() - t
+        if image is None:
+            stats["errors"] += 1
+        pending.append((row, doc_id, image, error))
+        if sum(1 for p in pending if p[2] is not None) >= batch_size or len(pending) >= 4 * batch_size:
+            flush()
+    if pending:
+        flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming Donut inference over parquet shards")
+    parser.add_argument("parquet", nargs="*", default=[DEFAULT_PARQUET])
+    parser.add_argument("--output", "-o", default=DEFAULT_OUTPUT)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--start-offset", type=int, default=None,
+                        help="Row to start from (default: resume after the last row in --output)")
+    parser.add_argument("--limit", type=int, default=None, help="Max rows per shard")
+    parser.add_argument("--device", type=int, default=-1, help="-1 = CPU, otherwise CUDA device index")
+    args = parser.parse_args()
+
+    from transformers import pipeline
 
-if image is None:
-    raise ValueError("❌ Could not locate base64 image field. Check printed keys and sample structure.")
+    print("\n🤖 Loading Donut model...")
+    pipe = pipeline("image-to-text", model=DONUT_MODEL, device=args.device)
+    print("✅ Donut loaded!")
 
-# --- Display image ---
-image.show()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    stats = {"rows": 0, "errors": 0, "decode_s": 0.0, "infer_s": 0.0}
+    start_time = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as out:
+        if out.tell():
+            with open(args.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")  # terminate a line cut off by an interrupted run
+        for path in args.parquet:
+            start = args.start_offset if args.start_offset is not None \
+                else resume_offset(args.output, os.path.basename(path))
+            print(f"📄 {path}: starting at row {start}")
+            run_shard(pipe, path, out, start, args.batch_size, args.limit, stats)
 
-# --- Load Donut model ---
-print("\n🤖 Loading Donut model...")
-pipe = pipeline("image-to-text", model="naver-clova-ix/donut-base")
-print("✅ Donut loaded!")
+    elapsed = time.perf_counter() - start_time
+    print(f"\n✅ {stats['rows']} rows ({stats['errors']} undecodable) in {elapsed:.1f}s "
+          f"→ {stats['rows'] / elapsed if elapsed else 0:.2f} rows/s "
+          f"(decode {stats['decode_s']:.1f}s, donut {stats['infer_s']:.1f}s)")
 
-# --- Run inference ---
-result = pipe(image)
-print("\n📄 Donut Output:\n", result[0]["generated_text"])
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""
+Claim Narrative Index
+---------------------
+Persistent, incrementally updated vector index of claim-text embeddings (MPNet, L2-normalised),
+used to score how closely a new claim reuses the narrative of past claims.
+
+- Embeddings live in a float16 .npy matrix opened as a memory map (grown by doubling);
+  claim ids are appended one per line to ids.txt, so an add is O(1) on disk
+- Flat search: exact scan in SCAN_BLOCK-row slices converted into one reused float32 buffer
+  (numpy has no fast float16 matmul), fine up to ~ivf_threshold (10k) claims
+- IVF search: spherical k-means centroids (nlist ~ 4 * sqrt(N)), each claim assigned to its
+  nearest centroid; a query scans only the nprobe closest lists
+- Training starts on a background thread when the index first reaches ivf_threshold claims and
+  again whenever it has grown 4x since (or run it offline with --train); k-means runs without
+  holding the index lock, and new claims are assigned to the existing centroids meanwhile
+- Several processes may share a directory: writes take an exclusive file lock (fcntl, where
+  available) and first re-read ids.txt, reopening the memory maps another process grew or
+  retrained, so rows are never written over; searches pick up other processes' claims the same way
+
+Usage:
+    python claim_index.py --dir claim_index --stats
+    python claim_index.py --dir claim_index --train --nlist 1024
+"""
+
+import argparse
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking is per process only
+    fcntl = None
+
+SCAN_CHUNK = 65536
+SCAN_BLOCK = 8192  # rows per flat-search slice: 24 MB of float32 at dim 768
+
+
+def _normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).reshape(-1)
+    return v / (np.linalg.norm(v) + 1e-12)
+
+
+def _stamp(path: str):
+    """Identity of a file version (os.replace gives a new inode, growth a new size)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class ClaimIndex:
+    def __init__(self, directory: str, dtype=np.float16, ivf_threshold: int = 10000,
+                 nprobe: int = 8, initial_capacity: int = 4096, auto_train: bool = True):
+        self.directory = directory
+        self.matrix_path = os.path.join(directory, "embeddings.npy")
+        self.assign_path = os.path.join(directory, "assign.npy")
+        self.centroids_path = os.path.join(directory, "centroids.npy")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.dtype = np.dtype(dtype)
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.initial_capacity = initial_capacity
+        self.auto_train = auto_train
+        self._lock = threading.RLock()
+        self._training = False
+        os.makedirs(directory, exist_ok=True)
+
+        self.ids: List[str] = []
+        self._rows = {}
+        self._ids_bytes = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._assign: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._stamps = {}
+        self._scan_buf: Optional[np.ndarray] = None
+        self.trained_n = 0
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, claim_id: str):
+        return claim_id in self._rows
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    # ---------- STORAGE ----------
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Serialises writers (and refreshes) across processes sharing the directory."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stale(self) -> bool:
+        return (_stamp(self.ids_path) != self._stamps.get("ids")
+                or _stamp(self.centroids_path) != self._stamps.get("centroids"))
+
+    def _refresh(self):
+        """
+        Catch up with other processes (call holding the file lock): new lines of ids.txt, a
+        matrix or assignment file that was grown (replaced), and a retrained IVF.
+        """
+        if not os.path.exists(self.ids_path) or not os.path.exists(self.matrix_path):
+            return
+        if self._matrix is None or _stamp(self.matrix_path)[0] != self._stamps["matrix"][0]:
+            self._matrix = np.load(self.matrix_path, mmap_mode="r+")
+            self.dtype = self._matrix.dtype
+        self._stamps["matrix"] = _stamp(self.matrix_path)
+
+        first = len(self.ids)
+        with open(self.ids_path, "rb") as f:
+            f.seek(self._ids_bytes)
+            data = f.read()
+        # ids.txt is the commit log: a partial last line and matrix rows past it are ignored
+        end = data.rfind(b"\n") + 1
+        for cid in data[:end].decode("utf-8").splitlines():
+            self._rows[cid] = len(self.ids)
+            self.ids.append(cid)
+        self._ids_bytes += end
+        self._stamps["ids"] = _stamp(self.ids_path)
+
+        centroids = _stamp(self.centroids_path)
+        if centroids != self._stamps.get("centroids") and os.path.exists(self.assign_path):
+            self._centroids = np.load(self.centroids_path)
+            self._assign = np.load(self.assign_path, mmap_mode="r+")
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.trained_n = json.load(f).get("trained_n", 0)
+            self._stamps["centroids"] = centroids
+            self._build_lists()
+        elif self.trained:
+            if _stamp(self.assign_path)[0] != self._stamps["assign"][0]:
+                self._assign = np.load(self.assign_path, mmap_mode="r+")
+            for row in range(first, len(self.ids)):
+                self._lists[int(self._assign[row])].append(row)
+        self._stamps["assign"] = _stamp(self.assign_path)
+
+    def _sync(self):
+        """Cheap check before a search; re-reads only when another process changed the index."""
+        if self._stale():
+            with self._file_lock(shared=True):
+                self._refresh()
+
+    def _grow(self, path: str, current: Optional[np.ndarray], rows: int, shape_tail, dtype):
+        capacity = 0 if current is None else current.shape[0]
+        if rows <= capacity:
+            return current
+        new_capacity = max(self.initial_capacity, capacity * 2, rows)
+        tmp_path = path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype,
+                                          shape=(new_capacity,) + shape_tail)
+        if current is not None:
+            grown[:capacity] = current  # includes rows of the batch being added
+        grown.flush()
+        del grown, current
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        if self._matrix is not None and self._matrix.shape[1] != dim:
+            raise ValueError(f"Embedding dim {dim} does not match index dim {self._matrix.shape[1]}")
+        self._matrix = self._grow(self.matrix_path, self._matrix, rows, (dim,), self.dtype)
+        self._stamps["matrix"] = _stamp(self.matrix_path)
+        if self.trained:
+            self._assign = self._grow(self.assign_path, self._assign, rows, (), np.int32)
+            self._stamps["assign"] = _stamp(self.assign_path)
+
+    def _build_lists(self):
+        n = len(self.ids)
+        assign = np.asarray(self._assign[:n])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]].tolist() for c in range(len(self._centroids))]
+
+    # ---------- UPDATES ----------
+    def add(self, claim_id: str, embedding) -> bool:
+        """Index one claim; returns False when the id is already present."""
+        return self.add_batch([claim_id], [embedding]) == 1
+
+    def add_batch(self, claim_ids: Iterable[str], embeddings) -> int:
+        added = 0
+        with self._lock, self._file_lock():
+            # Another process may have appended since: rows go after its claims, not over them
+            self._refresh()
+            new_ids, rows = [], []
+            for cid, emb in zip(claim_ids, embeddings):
+                if cid in self._rows or cid in new_ids:
+                    continue
+                v = _normalize(emb)
+                row = len(self.ids) + len(new_ids)
+                self._ensure_capacity(row + 1, v.shape[0])
+                self._matrix[row] = v
+                if self.trained:
+                    c = int(np.argmax(self._centroids @ v))
+                    self._assign[row] = c
+                    self._lists[c].append(row)
+                new_ids.append(cid)
+                rows.append(row)
+            if not new_ids:
+                return 0
+            self._matrix.flush()
+            if self.trained:
+                self._assign.flush()
+            with open(self.ids_path, "a", encoding="utf-8") as f:
+                f.write("".join(cid + "\n" for cid in new_ids))
+            self._ids_bytes = os.path.getsize(self.ids_path)
+            self._stamps["ids"] = _stamp(self.ids_path)
+            for cid, row in zip(new_ids, rows):
+                self.ids.append(cid)
+                self._rows[cid] = row
+            added = len(new_ids)
+
+            n = len(self.ids)
+            if (self.auto_train and not self._training and n >= self.ivf_threshold
+                    and (not self.trained or n >= 4 * self.trained_n)):
+                # k-means over the whole index must not stall the request that crossed the threshold
+                self._training = True
+                threading.Thread(target=self._train_in_background, daemon=True).start()
+        return added
+
+    def _train_in_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            print(f"[CLAIM INDEX] Background training failed: {e}")
+        finally:
+            self._training = False
+
+    def train(self, nlist: Optional[int] = None, sample: Optional[int] = None,
+              iters: int = 10, seed: int = 0):
+        """(Re)build the IVF centroids with spherical k-means and reassign every claim."""
+        with self._lock:
+            self._sync()
+            n, matrix = len(self.ids), self._matrix
+        if n == 0:
+            return
+        # Rows below n never change, so k-means runs without the lock; adds and searches continue
+        nlist = nlist or int(min(4096, max(1, 4 * np.sqrt(n))))
+        nlist = min(nlist, n)
+        sample = min(n, sample or max(40 * nlist, 10000))
+        rng = np.random.default_rng(seed)
+        idx = np.sort(rng.choice(n, sample, replace=False))
+        x = np.asarray(matrix[idx], dtype=np.float32)
+
+        centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = self._nearest(x, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            nonempty = counts > 0
+            sums = np.add.reduceat(x[order], starts[nonempty], axis=0)
+            centroids[nonempty] = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+            # Re-seed empty clusters from random sample points
+            empty = np.flatnonzero(~nonempty)
+            if len(empty):
+                centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+        assign = np.concatenate([self._nearest(np.asarray(matrix[start:min(n, start + SCAN_CHUNK)],
+                                                          dtype=np.float32), centroids)
+                                 for start in range(0, n, SCAN_CHUNK)])
+        del matrix
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            total = len(self.ids)  # claims added (by any process) while k-means ran
+            self._assign = None
+            self._assign = self._grow(self.assign_path, None, max(total, self._matrix.shape[0]), (), np.int32)
+            self._assign[:n] = assign
+            for start in range(n, total, SCAN_CHUNK):
+                block = np.asarray(self._matrix[start:min(total, start + SCAN_CHUNK)], dtype=np.float32)
+                self._assign[start:start + len(block)] = self._nearest(block, centroids)
+            self._assign.flush()
+            # Written as a new file so other processes notice the retraining (see _refresh)
+            tmp_path = self.centroids_path + ".tmp.npy"
+            np.save(tmp_path, centroids)
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"trained_n": total, "nlist": nlist}, f)
+            os.replace(tmp_path, self.centroids_path)
+            self._centroids = centroids
+            self.trained_n = total
+            self._stamps["centroids"] = _stamp(self.centroids_path)
+            self._stamps["assign"] = _stamp(self.assign_path)
+            self._build_lists()
+        print(f"[CLAIM INDEX] Trained IVF with {nlist} lists on {sample} of {n} claims")
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        out = np.empty(len(x), dtype=np.int32)
+        for start in range(0, len(x), 8192):
+            out[start:start + 8192] = np.argmax(x[start:start + 8192] @ centroids.T, axis=1)
+        return out
+
+    # ---------- SEARCH ----------
+    def search(self, embedding, top_k: int = 5, exclude: Optional[str] = None,
+               nprobe: Optional[int] = None) -> List[dict]:
+        """Most similar indexed claims, highest cosine similarity first."""
+        q = _normalize(embedding)
+        with self._lock:
+            self._sync()
+            n = len(self.ids)
+            if n == 0:
+                return []
+            k = top_k + (1 if exclude is not None else 0)
+            if self.trained:
+                probe = _top_k(self._centroids @ q, nprobe or self.nprobe)
+                # Sorted rows keep the memmap reads sequential
+                rows = np.sort(np.fromiter((r for c in probe for r in self._lists[c]), dtype=np.int64))
+                scores = np.asarray(self._matrix[rows], dtype=np.float32) @ q
+                top = _top_k(scores, k)
+                hits = [(int(rows[i]), float(scores[i])) for i in top]
+            else:
+                scores = self._flat_scores(q, n)
+                hits = [(int(i), float(scores[i])) for i in _top_k(scores, k)]
+            matches = [{"claim_id": self.ids[row], "score": score}
+                       for row, score in hits if self.ids[row] != exclude]
+        return matches[:top_k]
+
+    def _flat_scores(self, q: np.ndarray, n: int) -> np.ndarray:
+        """Scores of the first n rows (call holding the lock, which also guards the buffer)."""
+        dim = self._matrix.shape[1]
+        if self._scan_buf is None or self._scan_buf.shape[1] != dim:
+            self._scan_buf = np.empty((SCAN_BLOCK, dim), dtype=np.float32)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCAN_BLOCK):
+            end = min(n, start + SCAN_BLOCK)
+            block = self._scan_buf[:end - start]
+            np.copyto(block, self._matrix[start:end])
+            np.matmul(block, q, out=scores[start:end])
+        return scores
+
+    def stats(self) -> dict:
+        sizes = [len(lst) for lst in self._lists]
+        return {
+            "claims": len(self.ids),
+            "dim": self.dim,
+            "dtype": str(self.dtype),
+            "mode": "ivf" if self.trained else "flat",
+            "nlist": len(self._lists),
+            "nprobe": self.nprobe,
+            "trained_n": self.trained_n,
+            "largest_list": max(sizes) if sizes else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or (re)train a claim narrative index")
+    parser.add_argument("--dir", default=os.getenv("CLAIM_INDEX_DIR", "claim_index"))
+    parser.add_argument("--train", action="store_true")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    index = ClaimIndex(args.dir)
+    if args.train:
+        index.train(nlist=args.nlist)
+    print(json.dumps(index.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,28 @@ Combined NLP Analysis Pipeline (Insurance Fraud Detection v2)
 - Accepts .txt file (--file) or direct text (--text)
 - Performs Sentiment, Entity Recognition, Semantic, and Fraud/Legal Classification
 - Uses contextual zero-shot classification between only 'fraud' and 'legal'
+- With a claim index (claim_index.py, CLAIM_INDEX_DIR) the semantic component scores how closely
+  a claim reuses the narrative of previously analyzed claims
 """
 
 import argparse
+import hashlib
 import os
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
-from sentence_transformers import SentenceTransformer, util
+from transformers import pipeline
+from fraud_classifier import FraudClassifier, CONTEXT_PREFIX
+from text_chunking import ChunkAggregator, batched, iter_windows
+from metrics import span
+from inference_backends import (load_sentence_transformer, load_sequence_classifier,
+                                load_token_classifier)
 import numpy as np
 import warnings
 from typing import List, Dict
 
 warnings.filterwarnings("ignore")
 
+SENTIMENT_LABELS = ["neutral", "positive", "negative"]
+
 class CombinedNLPAnalyzer:
     def __init__(self,
                  sentiment_weight=0.35,
@@ -27,9 +36,22 @@ class CombinedNLPAnalyzer:
                  ner_model="dslim/bert-base-NER",
                  zero_shot_model="facebook/bart-large-mnli",
                  sentence_transformer="sentence-transformers/all-mpnet-base-v2",
-                 fraud_labels=None):
+                 fraud_labels=None,
+                 fraud_mode="pipeline",
+                 chunk_tokens=400,
+                 chunk_stride=64,
+                 claim_index=None,
+                 similar_top_k=5,
+                 index_claims=True):
         """
         Initialize the combined NLP analyzer with models and weights.
+        Each model runs on the backend chosen by INFERENCE_BACKEND[_<KEY>] (see inference_backends.py).
+        fraud_mode: "pipeline" (HF zero-shot pipeline), "nli" (cached-hypothesis BART-MNLI)
+                    or "embedding" (single MPNet pass, see fraud_classifier.py)
+        chunk_tokens / chunk_stride: window size and overlap used for texts too long for one pass
+        claim_index: optional ClaimIndex; the semantic score becomes the similarity to the closest
+                     past claim (top similar_top_k are reported) and, with index_claims, every
+                     analyzed text is added to it. Without one the semantic score stays 1.0.
         """
         total = sentiment_weight + entity_weight + semantic_weight + fraud_weight
         if not np.isclose(total, 1.0):
@@ -49,21 +71,44 @@ class CombinedNLPAnalyzer:
         ]
 
         print("Loading models... this may take a few minutes.")
-        self.sentiment_tokenizer = AutoTokenizer.from_pretrained(finbert_model)
-        self.sentiment_model = AutoModelForSequenceClassification.from_pretrained(finbert_model)
-        self.ner_pipeline = pipeline("ner", model=ner_model, aggregation_strategy="simple")
-        self.semantic_model = SentenceTransformer(sentence_transformer)
-        self.zero_shot = pipeline("zero-shot-classification", model=zero_shot_model)
+        self.sentiment_model, self.sentiment_tokenizer = load_sequence_classifier("finbert", finbert_model)
+        ner, ner_tokenizer = load_token_classifier("ner", ner_model)
+        self.ner_pipeline = pipeline("ner", model=ner, tokenizer=ner_tokenizer, aggregation_strategy="simple")
+        self.semantic_model = load_sentence_transformer("mpnet", sentence_transformer)
+        nli, nli_tokenizer = load_sequence_classifier("zero_shot", zero_shot_model)
+        self.zero_shot = pipeline("zero-shot-classification", model=nli, tokenizer=nli_tokenizer)
+        self.chunk_tokens = chunk_tokens
+        self.chunk_stride = chunk_stride
+        self.fraud_mode = fraud_mode
+        self.claim_index = claim_index
+        self.similar_top_k = similar_top_k
+        self.index_claims = index_claims
+        self.fraud_engine = None
+        if fraud_mode != "pipeline":
+            self.fraud_engine = FraudClassifier(
+                self.fraud_labels,
+                mode=fraud_mode,
+                nli_model=self.zero_shot.model,
+                nli_tokenizer=self.zero_shot.tokenizer,
+                semantic_model=self.semantic_model,
+            )
         print("✅ All models loaded successfully!\n")
 
     # ---------- SENTIMENT ----------
     def analyze_sentiment(self, text: str):
-        inputs = self.sentiment_tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-        with torch.no_grad():
-            out = self.sentiment_model(**inputs)
-            probs = torch.nn.functional.softmax(out.logits, dim=-1)[0].tolist()
-        labels = ["neutral", "positive", "negative"]
-        d = dict(zip(labels, probs))
+        return self.analyze_sentiment_batch([text])[0]
+
+    def analyze_sentiment_batch(self, texts: List[str]):
+        with span("nlp.sentiment"):
+            inputs = self.sentiment_tokenizer(texts, return_tensors="pt", truncation=True,
+                                              max_length=512, padding=True)
+            with torch.no_grad():
+                out = self.sentiment_model(**inputs)
+                probs = torch.nn.functional.softmax(out.logits, dim=-1).tolist()
+        return [self._sentiment_result(p) for p in probs]
+
+    def _sentiment_result(self, probs):
+        d = dict(zip(SENTIMENT_LABELS, probs))
         dom = max(d, key=d.get)
         conf = d[dom]
         return {
@@ -75,7 +120,14 @@ class CombinedNLPAnalyzer:
 
     # ---------- ENTITY RECOGNITION ----------
     def extract_entities(self, text: str):
-        ents = self.ner_pipeline(text)
+        return self._entity_result(self.ner_pipeline(text))
+
+    def extract_entities_batch(self, texts: List[str], batch_size: int = 8):
+        with span("nlp.ner"):
+            batch = self.ner_pipeline(texts, batch_size=batch_size)
+        return [self._entity_result(ents) for ents in batch]
+
+    def _entity_result(self, ents):
         ent_dict = {}
         for e in ents:
             ent_dict.setdefault(e["entity_group"], []).append({"text": e["word"], "score": e["score"]})
@@ -92,22 +144,59 @@ class CombinedNLPAnalyzer:
         if len(texts) < 2:
             return {"consistency_score": 1.0,
                     "weighted_score": 1.0 * self.weights["semantic"]}
-        emb = self.semantic_model.encode(texts, convert_to_tensor=True)
-        sims = util.cos_sim(emb, emb).cpu().numpy()
-        mask = ~np.eye(len(texts), dtype=bool)
-        avg = float(sims[mask].mean())
+        with span("nlp.semantic"):
+            emb = self.semantic_model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        # Mean off-diagonal cosine from the embedding sum: |sum|^2 = N + sum of all pairs (no N x N matrix)
+        n = len(texts)
+        total = emb.sum(axis=0, dtype=np.float64)
+        avg = float((total @ total - n) / (n * (n - 1)))
         return {"consistency_score": avg,
                 "weighted_score": avg * self.weights["semantic"]}
 
+    def analyze_reuse_batch(self, texts: List[str]):
+        """
+        Narrative reuse: cosine similarity of each text to the closest earlier claim, searched in
+        the claim index and among the preceding texts of the same batch. Resubmitting the exact
+        same text does not match itself (claims are keyed by the SHA-256 of their text).
+        """
+        if self.claim_index is None:
+            return [{"consistency_score": 1.0, "weighted_score": 1.0 * self.weights["semantic"]}
+                    for _ in texts]
+        with span("nlp.semantic"):
+            emb = self.semantic_model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        ids = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+        in_batch = emb @ emb.T
+
+        results = []
+        for i, (cid, vec) in enumerate(zip(ids, emb)):
+            hits = self.claim_index.search(vec, top_k=self.similar_top_k, exclude=cid)
+            hits += [{"claim_id": ids[j], "score": float(in_batch[i, j])}
+                     for j in range(i) if ids[j] != cid]
+            hits = sorted(hits, key=lambda h: -h["score"])[:self.similar_top_k]
+            reuse = max(0.0, hits[0]["score"]) if hits else 0.0
+            results.append({"consistency_score": reuse,
+                            "weighted_score": reuse * self.weights["semantic"],
+                            "similar_claims": hits})
+        if self.index_claims:
+            self.claim_index.add_batch(ids, emb)
+        return results
+
     # ---------- FRAUD CLASSIFICATION ----------
     def analyze_fraud(self, text: str):
-        # Add contextual prefix for better understanding
-        contextual_text = (
-            "This text is an insurance claim description. "
-            "Determine if it is fraudulent or legitimate:\n" + text
-        )
+        return self.analyze_fraud_batch([text])[0]
+
+    def analyze_fraud_batch(self, texts: List[str], batch_size: int = 8):
+        with span("nlp.fraud"):
+            if self.fraud_engine is not None:
+                res = self.fraud_engine.classify_batch(texts, batch_size=batch_size)
+            else:
+                # Add contextual prefix for better understanding
+                contextual_texts = [CONTEXT_PREFIX + text for text in texts]
+                res = self.zero_shot(contextual_texts, candidate_labels=self.fraud_labels,
+                                     batch_size=batch_size)
+        return [self._fraud_result(r) for r in res]
 
-        res = self.zero_shot(contextual_text, candidate_labels=self.fraud_labels)
+    def _fraud_result(self, res):
         labels, scores = res["labels"], res["scores"]
         d = dict(zip(labels, scores))
 
@@ -130,10 +219,86 @@ class CombinedNLPAnalyzer:
 
     # ---------- COMPLETE TEXT ANALYSIS ----------
     def analyze_text(self, text: str):
-        s = self.analyze_sentiment(text)
-        e = self.extract_entities(text)
-        sem = {"consistency_score": 1.0, "weighted_score": 1.0 * self.weights["semantic"]}
-        f = self.analyze_fraud(text)
+        return self.analyze_texts([text])[0]
+
+    def prescore_texts(self, texts: List[str], batch_size: int = 8):
+        """
+        Cheap first pass for cascaded scoring (cascade.py): sentiment, entities and narrative reuse,
+        without the zero-shot fraud model. Returns {"partial", "low", "high"} per text, where
+        [low, high] bounds the combined score once the fraud term (confidence in [0.5, 1] times
+        its weight) is added. Texts that need chunking return None.
+        """
+        results = [None] * len(texts)
+        short = [i for i, text in enumerate(texts) if not self.needs_chunking(text)]
+        w = self.weights["fraud"]
+        for i in range(0, len(short), batch_size):
+            idxs = short[i:i + batch_size]
+            chunk = [texts[j] for j in idxs]
+            sents = self.analyze_sentiment_batch(chunk)
+            ents = self.extract_entities_batch(chunk, batch_size=batch_size)
+            sems = self.analyze_reuse_batch(chunk)
+            for j, s, e, sem in zip(idxs, sents, ents, sems):
+                partial = s["weighted_score"] + e["weighted_score"] + sem["weighted_score"]
+                results[j] = {"partial": float(partial), "low": float(partial + 0.5 * w),
+                              "high": float(partial + w)}
+        return results
+
+    def needs_chunking(self, text: str) -> bool:
+        n_tokens = len(self.sentiment_tokenizer(text, add_special_tokens=False)["input_ids"])
+        return n_tokens > self.chunk_tokens
+
+    def analyze_texts(self, texts: List[str], batch_size: int = 8):
+        """
+        Analyze many texts, running every stage as a padded batch of up to batch_size.
+        Texts longer than chunk_tokens go through analyze_text_chunked instead of being truncated.
+        """
+        results = [None] * len(texts)
+        short = []
+        for idx, text in enumerate(texts):
+            if self.needs_chunking(text):
+                results[idx] = self.analyze_text_chunked(text, batch_size=batch_size)
+            else:
+                short.append(idx)
+
+        for i in range(0, len(short), batch_size):
+            idxs = short[i:i + batch_size]
+            chunk = [texts[j] for j in idxs]
+            sents = self.analyze_sentiment_batch(chunk)
+            ents = self.extract_entities_batch(chunk, batch_size=batch_size)
+            frauds = self.analyze_fraud_batch(chunk, batch_size=batch_size)
+            sems = self.analyze_reuse_batch(chunk)
+            for j, text, s, e, f, sem in zip(idxs, chunk, sents, ents, frauds, sems):
+                results[j] = self._combine(text, s, e, f, sem)
+        return results
+
+    def analyze_text_chunked(self, text: str, batch_size: int = 8):
+        """
+        Analyze an arbitrarily long text as overlapping token windows.
+        Windows are streamed batch_size at a time, so peak model memory is independent
+        of document length; per-window outputs are merged by ChunkAggregator.
+        """
+        agg = ChunkAggregator()
+        windows = iter_windows(self.sentiment_tokenizer, text,
+                               window_tokens=self.chunk_tokens, stride_tokens=self.chunk_stride)
+        for batch in batched(windows, batch_size):
+            offsets = [off for off, _ in batch]
+            chunks = [chunk for _, chunk in batch]
+            sents = self.analyze_sentiment_batch(chunks)
+            ents = self.ner_pipeline(chunks, batch_size=batch_size)
+            frauds = self.analyze_fraud_batch(chunks, batch_size=batch_size)
+            for off, chunk, s, e, f in zip(offsets, chunks, sents, ents, frauds):
+                agg.add(off, len(chunk), s["scores"], e, f["label_scores"])
+
+        s = self._sentiment_result(agg.sentiment(SENTIMENT_LABELS))
+        e = self._entity_result(agg.entities())
+        f = self._fraud_result(agg.fraud())
+        # MPNet reads the first ~384 tokens: the opening of a templated narrative is what repeats
+        sem = self.analyze_reuse_batch([text])[0]
+        res = self._combine(text, s, e, f, sem)
+        res["chunks"] = agg.chunks
+        return res
+
+    def _combine(self, text, s, e, f, sem):
         combined = s["weighted_score"] + e["weighted_score"] + sem["weighted_score"] + f["weighted_score"]
         return dict(
             text=text,
@@ -160,6 +325,8 @@ def print_summary(res: Dict):
     s = res["sentiment"]
     print(f"Sentiment: {s['dominant']} (confidence: {s['confidence']:.3f})")
     print(f"Entities found: {res['entities']['count']}")
+    for hit in res["semantic"].get("similar_claims", [])[:3]:
+        print(f"Similar past claim: {hit['claim_id'][:12]} (similarity: {hit['score']:.3f})")
     print("====================================\n")
 
 # ---------- MAIN EXECUTION ----------
@@ -0,0 +1,143 @@
+"""
+Fraud Classification Engine
+---------------------------
+Fast path for the fraud-vs-legal decision in CombinedNLPAnalyzer.
+
+- mode="nli": same BART-MNLI scoring as the zero-shot pipeline, but the contextual prefix
+  and label hypotheses are tokenised once and the (text, label) pairs of a batch go through
+  the model as padded forward calls of batch_size pairs each (memory stays bounded)
+- mode="embedding": one MPNet forward pass per text, scored by cosine similarity against
+  cached label-description embeddings (the semantic_model is already loaded anyway)
+
+Both modes return {"labels": [...], "scores": [...]} like the HF zero-shot pipeline.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+CONTEXT_PREFIX = (
+    "This text is an insurance claim description. "
+    "Determine if it is fraudulent or legitimate:\n"
+)
+
+# Longer descriptions give the embedding head something to match against
+DEFAULT_LABEL_DESCRIPTIONS = {
+    "fraudulent insurance claim": (
+        "A fraudulent insurance claim or scam message: urgent pressure, requests for card "
+        "numbers, CVV, OTP or passwords, suspicious links, exaggerated or fabricated losses."
+    ),
+    "legitimate insurance claim": (
+        "A legitimate insurance claim: a factual description of an incident, consistent "
+        "dates, amounts and policy details, supporting documents attached."
+    ),
+}
+
+
+class FraudClassifier:
+    def __init__(self, labels: List[str],
+                 mode: str = "nli",
+                 nli_model=None,
+                 nli_tokenizer=None,
+                 semantic_model=None,
+                 hypothesis_template: str = "This example is {}.",
+                 prefix: str = CONTEXT_PREFIX,
+                 label_descriptions: Optional[Dict[str, str]] = None,
+                 temperature: float = 0.05,
+                 max_length: int = 1024,
+                 batch_size: int = 16):
+        if mode not in ("nli", "embedding"):
+            raise ValueError(f"Unknown fraud classifier mode: {mode}")
+        self.labels = list(labels)
+        self.mode = mode
+        self.temperature = temperature
+        self.batch_size = batch_size
+
+        if mode == "nli":
+            if nli_model is None or nli_tokenizer is None:
+                raise ValueError("mode='nli' needs nli_model and nli_tokenizer")
+            self.model = nli_model
+            self.tokenizer = nli_tokenizer
+            self.max_length = min(max_length, getattr(nli_tokenizer, "model_max_length", max_length))
+            self.entail_id = self._entailment_id(nli_model.config)
+            # Cached token ids (no special tokens) for the constant parts of every input
+            self.prefix_ids = nli_tokenizer(prefix, add_special_tokens=False)["input_ids"]
+            self.hypothesis_ids = [
+                nli_tokenizer(hypothesis_template.format(l), add_special_tokens=False)["input_ids"]
+                for l in self.labels
+            ]
+        else:
+            if semantic_model is None:
+                raise ValueError("mode='embedding' needs semantic_model")
+            self.semantic_model = semantic_model
+            descriptions = label_descriptions or DEFAULT_LABEL_DESCRIPTIONS
+            label_texts = [descriptions.get(l, l) for l in self.labels]
+            self.label_embeddings = semantic_model.encode(label_texts, normalize_embeddings=True,
+                                                          convert_to_numpy=True)
+
+    @staticmethod
+    def _entailment_id(config):
+        for label, idx in config.label2id.items():
+            if label.lower().startswith("entail"):
+                return int(idx)
+        return -1
+
+    # ---------- PUBLIC ----------
+    def classify(self, text: str) -> Dict:
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[Dict]:
+        """batch_size: (text, label) pairs per NLI forward call (default: the constructor's)."""
+        if not texts:
+            return []
+        if self.mode == "nli":
+            probs = self._nli_probs(texts, batch_size or self.batch_size)
+        else:
+            probs = self._embedding_probs(texts)
+        results = []
+        for row in probs:
+            order = np.argsort(-row)
+            results.append({
+                "labels": [self.labels[i] for i in order],
+                "scores": [float(row[i]) for i in order],
+            })
+        return results
+
+    # ---------- NLI ----------
+    def _pair_ids(self, text_ids, hyp_ids):
+        # Room for the hypothesis plus up to four special tokens (<s> A </s></s> B </s>)
+        budget = self.max_length - len(hyp_ids) - 4
+        premise = (self.prefix_ids + text_ids)[:max(budget, 0)]
+        return self.tokenizer.build_inputs_with_special_tokens(premise, hyp_ids)
+
+    def _entail_logits(self, sequences: List[List[int]]) -> torch.Tensor:
+        """Entailment logit of each pair, in one padded forward call."""
+        width = max(len(s) for s in sequences)
+        pad = self.tokenizer.pad_token_id
+        input_ids = torch.full((len(sequences), width), pad, dtype=torch.long)
+        attention = torch.zeros((len(sequences), width), dtype=torch.long)
+        for i, seq in enumerate(sequences):
+            input_ids[i, :len(seq)] = torch.tensor(seq)
+            attention[i, :len(seq)] = 1
+        with torch.no_grad():
+            return self.model(input_ids=input_ids, attention_mask=attention).logits[:, self.entail_id]
+
+    def _nli_probs(self, texts: List[str], batch_size: int) -> np.ndarray:
+        text_ids = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        sequences = [self._pair_ids(t, h) for t in text_ids for h in self.hypothesis_ids]
+        # Slices padded to their own width: a long claim does not pad every pair of the batch
+        entail = torch.cat([self._entail_logits(sequences[i:i + batch_size])
+                            for i in range(0, len(sequences), batch_size)])
+        entail = entail.reshape(len(texts), len(self.labels))
+        # Same normalisation as the zero-shot pipeline with multi_label=False
+        return torch.softmax(entail, dim=-1).cpu().numpy()
+
+    # ---------- EMBEDDING ----------
+    def _embedding_probs(self, texts: List[str]) -> np.ndarray:
+        emb = self.semantic_model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        sims = emb @ self.label_embeddings.T
+        z = sims / self.temperature
+        z = z - z.max(axis=1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=1, keepdims=True)
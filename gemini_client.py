@@ -0,0 +1,257 @@
+"""
+Gemini Client
+-------------
+Shared async client for the Gemini generateContent endpoint.
+
+- One pooled httpx.AsyncClient per process (HTTP keep-alive, bounded connections)
+- Per-process token-bucket rate limiter and a concurrency semaphore
+- Retries on 429 / 5xx / transport errors with full-jitter exponential backoff (honours Retry-After)
+- Optional request hedging: a second identical request is fired if the first is slow,
+  and whichever answers first wins
+- generate_sync() lets blocking code (backend.analyze_image, worker threads) use the same client
+
+Set GEMINI_BASE_URL to point at gemini_stub.py for offline benchmarking.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+DEFAULT_MODEL = "gemini-2.5-flash"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, body: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class TokenBucket:
+    """Async rate limiter: at most `rate` requests per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class GeminiClient:
+    def __init__(self, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 model: str = DEFAULT_MODEL,
+                 max_concurrency: int = 8,
+                 rate_per_sec: Optional[float] = None,
+                 max_retries: int = 4,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0,
+                 timeout: float = 60.0,
+                 hedge_after: Optional[float] = None):
+        """
+        hedge_after: seconds to wait before sending a duplicate request (None disables hedging).
+        """
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.base_url = (base_url or os.getenv("GEMINI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.rate_per_sec = rate_per_sec
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket] = None
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.base_url}/v1beta/models/{self.model}:generateContent"
+
+    def _ensure_client(self):
+        # Created lazily on the background loop, which owns the pool and all asyncio primitives
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.rate_per_sec:
+                self._bucket = TokenBucket(self.rate_per_sec)
+
+    def close(self):
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), _background_loop()).result()
+            self._client = None
+
+    # ---------- REQUESTS ----------
+    async def generate(self, body: dict) -> dict:
+        """
+        POST a generateContent body and return the decoded JSON response.
+        The work always runs on the client's own background loop, so the connection
+        pool and limits are shared by every caller regardless of which loop awaits.
+        """
+        loop = _background_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._generate(body)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._generate(body), loop))
+
+    async def _generate(self, body: dict) -> dict:
+        if not self.api_key:
+            raise ValueError("❌ Gemini API key missing in .env")
+        self._ensure_client()
+        if self.hedge_after is None:
+            return await self._with_retries(body)
+        return await self._hedged(body)
+
+    async def _hedged(self, body: dict) -> dict:
+        primary = asyncio.ensure_future(self._with_retries(body))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+            if done:
+                return primary.result()
+
+            self.stats["hedges"] += 1
+            backup = asyncio.ensure_future(self._with_retries(body))
+            tasks.append(backup)
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Covers the loser of the race and the caller being cancelled (e.g. a future.cancel())
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _with_retries(self, body: dict) -> dict:
+        attempt = 0
+        while True:
+            try:
+                return await self._post(body)
+            except GeminiError as e:
+                retryable = e.status is None or e.status in RETRY_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = getattr(e, "retry_after", None)
+            attempt += 1
+            self.stats["retries"] += 1
+            if delay is None:
+                # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            await asyncio.sleep(delay)
+
+    async def _post(self, body: dict) -> dict:
+        if self._bucket is not None:
+            await self._bucket.acquire()
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            headers = {"Content-Type": "application/json", "x-goog-api-key": self.api_key}
+            start = time.perf_counter()
+            try:
+                resp = await self._client.post(self.endpoint, headers=headers, json=body)
+            except httpx.TransportError as e:
+                metrics.gemini_attempts.inc(outcome="transport_error")
+                raise GeminiError(f"Gemini transport error: {e}") from e
+            finally:
+                metrics.stage_seconds.observe(time.perf_counter() - start, stage="gemini.request")
+        metrics.gemini_attempts.inc(outcome=str(resp.status_code))
+        if resp.status_code != 200:
+            err = GeminiError(f"Gemini error: {resp.status_code}", resp.status_code, resp.text)
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    err.retry_after = min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+            raise err
+        return resp.json()
+
+    # ---------- SYNC BRIDGE ----------
+    def submit(self, body: dict) -> concurrent.futures.Future:
+        """Start a request without blocking; call .result() on the returned future later."""
+        return asyncio.run_coroutine_threadsafe(self._generate(body), _background_loop())
+
+    def generate_sync(self, body: dict, timeout: Optional[float] = None) -> dict:
+        """Blocking wrapper; runs on a shared background event loop so the pool is reused."""
+        return self.submit(body).result(timeout)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gemini-client", daemon=True).start()
+    return _loop
+
+
+# ---------- HELPERS ----------
+def image_request(prompt: str, image_base64: str, mime_type: str = "image/png") -> dict:
+    return {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
+                    {"text": prompt},
+                    {"inline_data": {"mime_type": mime_type, "data": image_base64}},
+                ],
+            }
+        ]
+    }
+
+
+def response_text(resp_json: dict) -> str:
+    return resp_json.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+
+
+_hedge = os.getenv("GEMINI_HEDGE_AFTER")
+_rate = os.getenv("GEMINI_RATE_PER_SEC")
+client = GeminiClient(
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    rate_per_sec=float(_rate) if _rate else None,
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "4")),
+    timeout=float(os.getenv("GEMINI_TIMEOUT", "60")),
+    hedge_after=float(_hedge) if _hedge else None,
+)
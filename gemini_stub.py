@@ -0,0 +1,106 @@
+"""
+Gemini Stub Server
+------------------
+Local stand-in for the Gemini generateContent endpoint, for offline benchmarking and tests.
+
+- Same URL shape and response shape as the real API (candidates[0].content.parts[0].text)
+- Returns a risk-assessment JSON in the text part, wrapped in ```json fences like Gemini often does
+- Configurable latency (base + jitter + long-tail probability) and failure rates (429 / 500)
+
+Usage:
+    python gemini_stub.py --port 8001 --latency-ms 400 --jitter-ms 200 --fail-rate 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8001 GEMINI_API_KEY=stub python backend.py ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CONFIG = {
+    "latency_ms": 300.0,
+    "jitter_ms": 100.0,
+    "tail_rate": 0.02,       # probability of a slow outlier
+    "tail_ms": 3000.0,
+    "fail_rate": 0.0,        # probability of a 500
+    "throttle_rate": 0.0,    # probability of a 429
+}
+
+app = FastAPI(title="Gemini stub")
+stats = {"requests": 0, "failures": 0, "throttled": 0}
+
+
+def _risk_for(body: dict) -> float:
+    # Deterministic per request body, so repeated runs are comparable
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).digest()
+    return round(digest[0] / 255, 2)
+
+
+@app.post("/v1beta/models/{model_action}")
+async def generate_content(model_action: str, request: Request):
+    if not model_action.endswith(":generateContent"):
+        return JSONResponse({"error": {"code": 404, "message": "Unknown method"}}, status_code=404)
+    if not request.headers.get("x-goog-api-key"):
+        return JSONResponse({"error": {"code": 403, "message": "API key missing"}}, status_code=403)
+    body = await request.json()
+    stats["requests"] += 1
+
+    delay = CONFIG["latency_ms"] + random.uniform(-1, 1) * CONFIG["jitter_ms"]
+    if random.random() < CONFIG["tail_rate"]:
+        delay += CONFIG["tail_ms"]
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+    roll = random.random()
+    if roll < CONFIG["throttle_rate"]:
+        stats["throttled"] += 1
+        return JSONResponse({"error": {"code": 429, "message": "Resource exhausted"}},
+                            status_code=429, headers={"Retry-After": "1"})
+    if roll < CONFIG["throttle_rate"] + CONFIG["fail_rate"]:
+        stats["failures"] += 1
+        return JSONResponse({"error": {"code": 500, "message": "Internal error"}}, status_code=500)
+
+    risk = _risk_for(body)
+    text = "```json\n" + json.dumps({
+        "summary": "Stubbed assessment of the submitted document.",
+        "risk_level": risk,
+        "explanation": "Generated locally by gemini_stub.py; no model was called.",
+    }, indent=2) + "\n```"
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "modelVersion": model_action.split(":")[0],
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "config": CONFIG}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini generateContent stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=CONFIG["jitter_ms"])
+    parser.add_argument("--tail-rate", type=float, default=CONFIG["tail_rate"])
+    parser.add_argument("--tail-ms", type=float, default=CONFIG["tail_ms"])
+    parser.add_argument("--fail-rate", type=float, default=CONFIG["fail_rate"])
+    parser.add_argument("--throttle-rate", type=float, default=CONFIG["throttle_rate"])
+    args = parser.parse_args()
+    CONFIG.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate,
+                  tail_ms=args.tail_ms, fail_rate=args.fail_rate, throttle_rate=args.throttle_rate)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Image Hash Index
+----------------
+Perceptual hashes of every analyzed claim image, to catch reused damage photos and invoices
+(re-saved, resized or recompressed copies) before paying for OCR and Gemini.
+
+- pHash (32x32 DCT, 8x8 low frequencies vs. median) and dHash (9x8 gradient), 64 bits each
+- Hashes live in an (N, 2) uint64 .npy memory map grown by doubling; image ids (the file's
+  SHA-256) are appended one per line to ids.txt
+- Multi-index hashing over the pHash: 4 bands of 16 bits, each a sorted array of band values ->
+  rows. Any hash within Hamming radius r shares a band within r // 4 bits of the query, so a
+  lookup probes a handful of band values per band instead of scanning every hash
+- Inserts go to an unsorted tail (scanned directly) that is merged into the band arrays every
+  merge_every inserts
+- A match needs both pHash and dHash within the radius; distance 0 on both is an exact repeat
+
+One process should own a given index directory (the model host when workers share models).
+
+Usage:
+    python image_hash_index.py --dir image_hash_index --query sample.png sample1.png
+    python image_hash_index.py --dir image_hash_index --add sample.png --stats
+"""
+
+import argparse
+import json
+import os
+import threading
+from itertools import combinations
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+
+# ---------- HASHES ----------
+def _gray(image, size) -> np.ndarray:
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.astype(np.uint8)).view(">u8")[0])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)).astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def dhash(image) -> int:
+    """Horizontal gradient hash of a PIL image or RGB array."""
+    px = _gray(image, (9, 8))
+    return _pack((px[:, 1:] > px[:, :-1]).reshape(-1))
+
+
+def phash(image) -> int:
+    """DCT hash: sign of the 8x8 lowest frequencies against their median (DC excluded)."""
+    px = _gray(image, (32, 32))
+    low = (_DCT32 @ px @ _DCT32.T)[:8, :8].reshape(-1)
+    return _pack(low > np.median(low[1:]))
+
+
+def image_hashes(image):
+    return phash(image), dhash(image)
+
+
+def popcount(x: np.ndarray) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(x).astype(np.int64)
+    return _BYTE_BITS[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+_BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+def _band_probes(value: int, radius: int) -> np.ndarray:
+    """Every BAND_BITS-bit value within Hamming `radius` of value."""
+    probes = [value]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            mask = 0
+            for b in bits:
+                mask |= 1 << b
+            probes.append(value ^ mask)
+    return np.asarray(probes, dtype=np.uint16)
+
+
+class ImageHashIndex:
+    def __init__(self, directory: str, merge_every: int = 4096, initial_capacity: int = 4096):
+        self.directory = directory
+        self.hashes_path = os.path.join(directory, "hashes.npy")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self.merge_every = merge_every
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.ids: List[str] = []
+        self._rows = {}
+        self._hashes: Optional[np.ndarray] = None
+        if os.path.exists(self.ids_path) and os.path.exists(self.hashes_path):
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                # ids.txt is the commit log: hash rows past its last line are ignored
+                self.ids = [line.rstrip("\n") for line in f if line.endswith("\n")]
+            self._rows = {iid: i for i, iid in enumerate(self.ids)}
+            self._hashes = np.load(self.hashes_path, mmap_mode="r+")
+        self._merged = 0
+        self._band_values: List[np.ndarray] = []
+        self._band_rows: List[np.ndarray] = []
+        self._merge()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, image_id: str):
+        return image_id in self._rows
+
+    # ---------- STORAGE ----------
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._hashes is None else self._hashes.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, capacity * 2, rows)
+        tmp_path = self.hashes_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint64, shape=(new_capacity, 2))
+        if self._hashes is not None:
+            grown[:len(self.ids)] = self._hashes[:len(self.ids)]
+        grown.flush()
+        del grown
+        self._hashes = None
+        os.replace(tmp_path, self.hashes_path)
+        self._hashes = np.load(self.hashes_path, mmap_mode="r+")
+
+    def _merge(self):
+        """Rebuild the sorted band arrays so they cover every row (the tail becomes empty)."""
+        n = len(self.ids)
+        ph = np.asarray(self._hashes[:n, 0]) if n else np.zeros(0, dtype=np.uint64)
+        self._band_values, self._band_rows = [], []
+        for band in range(BANDS):
+            values = ((ph >> np.uint64(band * BAND_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order = np.argsort(values, kind="stable").astype(np.int64)
+            self._band_values.append(values[order])
+            self._band_rows.append(order)
+        self._merged = n
+
+    # ---------- UPDATES ----------
+    def add(self, image_id: str, phash_value: int, dhash_value: int) -> bool:
+        """Record one image; returns False when the id is already indexed."""
+        with self._lock:
+            if image_id in self._rows:
+                return False
+            row = len(self.ids)
+            self._ensure_capacity(row + 1)
+            self._hashes[row] = (phash_value, dhash_value)
+            self._hashes.flush()
+            with open(self.ids_path, "a", encoding="utf-8") as f:
+                f.write(image_id + "\n")
+            self.ids.append(image_id)
+            self._rows[image_id] = row
+            if row + 1 - self._merged >= self.merge_every:
+                self._merge()
+        return True
+
+    # ---------- SEARCH ----------
+    def query(self, phash_value: int, dhash_value: int, radius: int = 6,
+              exclude: Optional[str] = None, limit: int = 10) -> List[dict]:
+        """Indexed images whose pHash and dHash are both within `radius` bits, closest first."""
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+            band_radius = radius // BANDS
+            candidates = [np.arange(self._merged, n, dtype=np.int64)]  # unsorted tail
+            for band in range(BANDS):
+                value = (phash_value >> (band * BAND_BITS)) & 0xFFFF
+                probes = _band_probes(value, band_radius)
+                lo = np.searchsorted(self._band_values[band], probes, side="left")
+                hi = np.searchsorted(self._band_values[band], probes, side="right")
+                candidates.extend(self._band_rows[band][a:b] for a, b in zip(lo, hi) if b > a)
+            rows = np.unique(np.concatenate(candidates))
+            if len(rows) == 0:
+                return []
+            hashes = np.asarray(self._hashes[rows])
+            query = np.array([phash_value, dhash_value], dtype=np.uint64)
+            dist = popcount(hashes ^ query)
+            keep = np.flatnonzero((dist[:, 0] <= radius) & (dist[:, 1] <= radius))
+            keep = keep[np.lexsort((dist[keep, 1], dist[keep, 0]))]
+            matches = [{"image_id": self.ids[rows[i]],
+                        "phash_distance": int(dist[i, 0]), "dhash_distance": int(dist[i, 1])}
+                       for i in keep if self.ids[rows[i]] != exclude]
+        return matches[:limit]
+
+    def stats(self) -> dict:
+        return {"images": len(self.ids), "merged": self._merged,
+                "tail": len(self.ids) - self._merged, "bytes_per_image": 16 + BANDS * 10}
+
+
+def main():
+    from image_preprocess import prepare_image
+    from result_cache import file_hash
+
+    parser = argparse.ArgumentParser(description="Query or extend a perceptual image hash index")
+    parser.add_argument("--dir", default=os.getenv("IMAGE_HASH_INDEX_DIR", "image_hash_index"))
+    parser.add_argument("--query", nargs="*", default=[], help="Images to look up")
+    parser.add_argument("--add", nargs="*", default=[], help="Images to index")
+    parser.add_argument("--radius", type=int, default=int(os.getenv("IMAGE_HASH_RADIUS", "6")))
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    index = ImageHashIndex(args.dir)
+    for path in args.query + args.add:
+        image_id = file_hash(path)
+        ph, dh = image_hashes(prepare_image(path).array)
+        print(f"{path}: phash={ph:016x} dhash={dh:016x}")
+        for m in index.query(ph, dh, args.radius, exclude=image_id):
+            print(f"    ~ {m['image_id'][:12]} (phash {m['phash_distance']}, dhash {m['dhash_distance']})")
+        if path in args.add:
+            index.add(image_id, ph, dh)
+    if args.stats:
+        print(json.dumps(index.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
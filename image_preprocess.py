@@ -0,0 +1,77 @@
+"""
+Image Preprocessing
+-------------------
+Single decode of a claim image, shared by EasyOCR and the Gemini payload.
+
+- Detects the real format / MIME type from the file contents (not the extension)
+- Applies EXIF orientation, caps the longest side at max_side
+- Exposes the decoded RGB array for EasyOCR (no second decode from disk)
+- Re-encodes a compact payload for Gemini (JPEG), keeping the original bytes when they are
+  already smaller and no resize was needed
+"""
+
+import base64
+import io
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1600"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+# Formats Gemini accepts inline as-is
+PASSTHROUGH_MIME = {"image/png", "image/jpeg", "image/webp"}
+
+
+@dataclass
+class PreparedImage:
+    array: np.ndarray                 # RGB uint8, shared with OCR
+    payload: bytes                    # bytes sent to Gemini
+    mime_type: str                    # MIME type of payload
+    source_mime: Optional[str]        # detected MIME type of the uploaded file
+    source_bytes: int
+    original_size: Tuple[int, int]
+    size: Tuple[int, int]
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def base64(self) -> str:
+        return base64.b64encode(self.payload).decode("utf-8")
+
+
+def prepare_image(path: str, max_side: int = MAX_SIDE, jpeg_quality: int = JPEG_QUALITY) -> PreparedImage:
+    timings = {}
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    img = Image.open(io.BytesIO(raw))
+    source_mime = Image.MIME.get(img.format)
+    original_size = img.size
+    if img.format == "JPEG":
+        # Let libjpeg decode at a reduced scale when the photo is far larger than needed
+        img.draft("RGB", (max_side, max_side))
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    resized = max(img.size) > max_side
+    if resized:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    array = np.asarray(img)
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=jpeg_quality, optimize=True)
+    payload, mime_type = buf.getvalue(), "image/jpeg"
+    if not resized and source_mime in PASSTHROUGH_MIME and len(raw) <= len(payload):
+        payload, mime_type = raw, source_mime
+    timings["encode"] = time.perf_counter() - start
+
+    return PreparedImage(array=array, payload=payload, mime_type=mime_type,
+                         source_mime=source_mime, source_bytes=len(raw),
+                         original_size=original_size, size=img.size, timings=timings)
@@ -0,0 +1,269 @@
+"""
+Inference Backends
+------------------
+Selectable CPU inference backend per model, for the NLP analyzer and the ECAPA speaker model.
+
+- eager:     PyTorch fp32, exactly as before
+- int8:      PyTorch dynamic int8 quantization of every nn.Linear (built in-process, no artifact)
+- onnx:      ONNX Runtime via optimum; the export is cached under INFERENCE_ARTIFACT_DIR
+- onnx-int8: ONNX Runtime with dynamically quantized int8 weights (optimum ORTQuantizer), cached too
+
+Choose with INFERENCE_BACKEND (default for all) or INFERENCE_BACKEND_<KEY> per model, where KEY is
+FINBERT, NER, ZERO_SHOT, MPNET or ECAPA, e.g. INFERENCE_BACKEND=onnx-int8 INFERENCE_BACKEND_NER=eager.
+
+Every non-eager backend is checked once against fp32 on a few calibration inputs; if the largest
+probability difference (1 - cosine for embeddings) exceeds INFERENCE_TOLERANCE the model falls back
+to eager. The measured difference is stored in INFERENCE_ARTIFACT_DIR/verified.json so the check
+runs once; a stored verdict is re-judged against the current INFERENCE_TOLERANCE, and a verified
+ONNX model is loaded without its fp32 reference.
+
+ECAPA-TDNN is mostly Conv1d, which dynamic quantization does not cover, so int8 only speeds up its
+Linear layers; its fbank front-end and attentive pooling do not export cleanly to ONNX, so onnx
+and onnx-int8 use the int8 path for that model.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+
+import numpy as np
+
+BACKENDS = ("eager", "int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+ARTIFACT_DIR = os.getenv("INFERENCE_ARTIFACT_DIR", "model_artifacts")
+TOLERANCE = float(os.getenv("INFERENCE_TOLERANCE", "0.05"))
+
+CALIBRATION_TEXTS = [
+    "I lost my wallet at the station and my card was used for three purchases I did not make.",
+    "URGENT: your policy is suspended, send your CVV and OTP to reactivate it within 24 hours.",
+    "The water damage in the kitchen was reported on 12 March; photos and the repair invoice are attached.",
+    "Revenue grew 8% year over year while operating costs remained flat.",
+]
+
+_verdict_lock = threading.Lock()
+
+
+# ---------- CONFIG ----------
+def backend_for(key: str) -> str:
+    backend = os.getenv(f"INFERENCE_BACKEND_{key.upper()}", DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for {key}. Choose from {BACKENDS}")
+    return backend
+
+
+def describe(keys: Iterable[str]) -> str:
+    """Compact backend signature, e.g. for result-cache versions: 'finbert=int8,ner=eager'."""
+    return ",".join(f"{k}={backend_for(k)}" for k in keys)
+
+
+def _artifact_path(model_id: str, backend: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_id)
+    return os.path.join(ARTIFACT_DIR, f"{slug}-{backend}")
+
+
+# ---------- TOLERANCE CHECK ----------
+def _load_verdicts() -> Dict[str, dict]:
+    try:
+        with open(os.path.join(ARTIFACT_DIR, "verified.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _judge(verdict: dict, tolerance: float) -> dict:
+    """A stored verdict under the current tolerance (max_diff does not depend on it)."""
+    return dict(verdict, tolerance=tolerance, ok=verdict["max_diff"] <= tolerance)
+
+
+def _verified(name: str, tolerance: float = TOLERANCE) -> bool:
+    with _verdict_lock:
+        verdict = _load_verdicts().get(name)
+    return verdict is not None and _judge(verdict, tolerance)["ok"]
+
+
+def check_tolerance(name: str, reference: Callable, candidate: Callable, inputs,
+                    metric: str = "abs", tolerance: float = TOLERANCE) -> dict:
+    """
+    Compare candidate(inputs) to reference(inputs) (both -> 2-D arrays).
+    metric="abs": max absolute difference (probabilities); "cosine": max 1 - cosine (embeddings).
+    """
+    with _verdict_lock:
+        verdicts = _load_verdicts()
+        if name in verdicts and verdicts[name].get("metric") == metric:
+            return _judge(verdicts[name], tolerance)
+
+    ref = np.asarray(reference(inputs), dtype=np.float64)
+    cand = np.asarray(candidate(inputs), dtype=np.float64)
+    if metric == "cosine":
+        ref_n = ref / (np.linalg.norm(ref, axis=-1, keepdims=True) + 1e-12)
+        cand_n = cand / (np.linalg.norm(cand, axis=-1, keepdims=True) + 1e-12)
+        diff = float(np.max(1.0 - np.sum(ref_n * cand_n, axis=-1)))
+    else:
+        diff = float(np.max(np.abs(ref - cand)))
+    verdict = {"max_diff": diff, "metric": metric, "tolerance": tolerance, "ok": diff <= tolerance}
+
+    with _verdict_lock:
+        verdicts = _load_verdicts()
+        verdicts[name] = verdict
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        with open(os.path.join(ARTIFACT_DIR, "verified.json"), "w", encoding="utf-8") as f:
+            json.dump(verdicts, f, indent=2)
+    status = "within" if verdict["ok"] else "OUTSIDE"
+    print(f"[INFERENCE] {name}: max {metric} diff {diff:.4f} {status} tolerance {tolerance}")
+    return verdict
+
+
+def quantize_linear(model):
+    """Dynamic int8 copy of a model: every nn.Linear gets int8 weights, activations quantized on the fly."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+# ---------- TRANSFORMERS ----------
+def _softmax_fn(model, tokenizer):
+    import torch
+
+    def run(texts):
+        enc = tokenizer(texts, return_tensors="pt", truncation=True, padding=True, max_length=512)
+        with torch.no_grad():
+            logits = model(**enc).logits
+        if logits.dim() == 3:  # token classification: compare per-token probabilities
+            logits = logits.reshape(-1, logits.shape[-1])
+        return torch.softmax(logits, dim=-1).numpy()
+    return run
+
+
+def _ort_model(task: str, model_id: str, quantize: bool):
+    """Export (once) and load an ONNX Runtime model for a transformers task."""
+    from optimum.onnxruntime import (ORTModelForSequenceClassification,
+                                     ORTModelForTokenClassification, ORTQuantizer)
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    cls = {"sequence": ORTModelForSequenceClassification,
+           "token": ORTModelForTokenClassification}[task]
+    onnx_dir = _artifact_path(model_id, "onnx")
+    if not os.path.exists(os.path.join(onnx_dir, "model.onnx")):
+        print(f"[INFERENCE] Exporting {model_id} to ONNX -> {onnx_dir}")
+        cls.from_pretrained(model_id, export=True).save_pretrained(onnx_dir)
+    if not quantize:
+        return cls.from_pretrained(onnx_dir)
+
+    int8_dir = _artifact_path(model_id, "onnx-int8")
+    if not os.path.exists(os.path.join(int8_dir, "model_quantized.onnx")):
+        print(f"[INFERENCE] Quantizing {model_id} ONNX export -> {int8_dir}")
+        quantizer = ORTQuantizer.from_pretrained(onnx_dir)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=int8_dir, quantization_config=qconfig)
+    return cls.from_pretrained(int8_dir, file_name="model_quantized.onnx")
+
+
+def _load_transformer(key: str, model_id: str, task: str) -> Tuple[object, object]:
+    from transformers import (AutoModelForSequenceClassification, AutoModelForTokenClassification,
+                              AutoTokenizer)
+
+    auto = {"sequence": AutoModelForSequenceClassification,
+            "token": AutoModelForTokenClassification}[task]
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    backend = backend_for(key)
+    if backend == "eager":
+        return auto.from_pretrained(model_id), tokenizer
+
+    name = f"{key}:{backend}:{model_id}"
+    if backend == "int8":
+        eager = auto.from_pretrained(model_id)
+        model = quantize_linear(eager)
+    else:
+        model = _ort_model(task, model_id, quantize=backend == "onnx-int8")
+        if _verified(name):
+            # Already checked against fp32 on an earlier start: skip loading the fp32 weights
+            print(f"[INFERENCE] {key} ({model_id}) running on {backend}")
+            return model, tokenizer
+        eager = auto.from_pretrained(model_id)
+    verdict = check_tolerance(name, _softmax_fn(eager, tokenizer),
+                              _softmax_fn(model, tokenizer), CALIBRATION_TEXTS)
+    if not verdict["ok"]:
+        print(f"[INFERENCE] Falling back to eager fp32 for {key}")
+        return eager, tokenizer
+    del eager  # only the optimized model stays resident
+    print(f"[INFERENCE] {key} ({model_id}) running on {backend}")
+    return model, tokenizer
+
+
+def load_sequence_classifier(key: str, model_id: str):
+    """(model, tokenizer) for FinBERT / BART-MNLI on the configured backend."""
+    return _load_transformer(key, model_id, "sequence")
+
+
+def load_token_classifier(key: str, model_id: str):
+    """(model, tokenizer) for the NER model on the configured backend."""
+    return _load_transformer(key, model_id, "token")
+
+
+def load_sentence_transformer(key: str, model_id: str):
+    from sentence_transformers import SentenceTransformer
+
+    backend = backend_for(key)
+    if backend == "eager":
+        return SentenceTransformer(model_id)
+
+    name = f"{key}:{backend}:{model_id}"
+    if backend == "int8":
+        eager = SentenceTransformer(model_id)
+        model = quantize_linear(eager)
+    else:
+        try:
+            kwargs = {"file_name": "onnx/model_qint8_avx2.onnx"} if backend == "onnx-int8" else {}
+            model = SentenceTransformer(model_id, backend="onnx", model_kwargs=kwargs,
+                                        cache_folder=ARTIFACT_DIR)
+        except (TypeError, ValueError, OSError) as e:
+            # sentence-transformers < 3.2 has no ONNX backend; some repos ship no int8 export
+            print(f"[INFERENCE] ONNX backend unavailable for {key} ({e}); using eager")
+            return SentenceTransformer(model_id)
+        if _verified(name):
+            # Already checked against fp32 on an earlier start: skip loading the fp32 weights
+            print(f"[INFERENCE] {key} ({model_id}) running on {backend}")
+            return model
+        eager = SentenceTransformer(model_id)
+    verdict = check_tolerance(name, eager.encode, model.encode, CALIBRATION_TEXTS, metric="cosine")
+    if not verdict["ok"]:
+        print(f"[INFERENCE] Falling back to eager fp32 for {key}")
+        return eager
+    del eager
+    print(f"[INFERENCE] {key} ({model_id}) running on {backend}")
+    return model
+
+
+# ---------- SPEECHBRAIN ----------
+def optimize_ecapa(classifier, key: str = "ecapa"):
+    """Apply the configured backend to a speechbrain EncoderClassifier in place."""
+    backend = backend_for(key)
+    if backend == "eager":
+        return classifier
+    if backend.startswith("onnx"):
+        print(f"[INFERENCE] ONNX export is not supported for ECAPA; using int8 Linear layers instead")
+
+    import torch
+
+    original = classifier.mods.embedding_model
+    quantized = quantize_linear(original)
+    rng = np.random.default_rng(0)
+    # Seeded noise bursts as calibration audio (3 s at 16 kHz), enough to compare embeddings
+    wavs = torch.from_numpy(rng.standard_normal((2, 48000)).astype(np.float32) * 0.1)
+
+    def embed(module):
+        def run(batch):
+            classifier.mods.embedding_model = module
+            with torch.no_grad():
+                return classifier.encode_batch(batch).squeeze(1).numpy()
+        return run
+
+    verdict = check_tolerance(f"{key}:int8:ecapa-voxceleb", embed(original), embed(quantized),
+                              wavs, metric="cosine")
+    classifier.mods.embedding_model = quantized if verdict["ok"] else original
+    if verdict["ok"]:
+        print(f"[INFERENCE] {key} running on int8")
+    else:
+        print(f"[INFERENCE] Falling back to eager fp32 for {key}")
+    return classifier
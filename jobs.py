@@ -0,0 +1,164 @@
+"""
+Analysis Jobs
+-------------
+- POST /jobs creates a Job and returns its id immediately; the analysis runs in the background
+- Each modality is a stage whose status/progress is updated as the real work completes
+- Its steps (OCR, Gemini, each NLP model, ECAPA) come from the metric spans of the analysis
+  (metrics.watch_spans): stage["steps"] holds each step's status and seconds, and progress is
+  the share of the modality's STEPS finished. Steps run in a process pool or the model host
+  are not visible, so those stages jump from 0 to 1
+- Subscribers (the SSE stream) receive every update through their own asyncio.Queue
+- JobStore keeps a bounded number of jobs and drops the oldest finished ones first; queued and
+  running jobs are never dropped. Their number is capped separately (max_active): POST /jobs
+  answers 503 + Retry-After when that cap is reached or a needed worker pool queue is full
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+FINISHED = ("done", "error")
+
+# Span names reported as steps of each modality, in pipeline order
+STEPS = {
+    "image": ("image.decode", "image.hash", "image.ocr", "gemini.wait"),
+    "text": ("nlp.sentiment", "nlp.ner", "nlp.semantic", "nlp.fraud"),
+    "voice": ("voice.preprocess", "voice.ecapa"),
+}
+STEP_MODALITY = {step: modality for modality, steps in STEPS.items() for step in steps}
+
+
+class Job:
+    def __init__(self, stages: List[str]):
+        self.id = uuid.uuid4().hex
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.status = "queued"
+        self.stages: Dict[str, dict] = {
+            name: {"status": "waiting", "progress": 0.0} for name in stages
+        }
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self._subscribers: List[asyncio.Queue] = []
+
+    # ---------- UPDATES ----------
+    def update_stage(self, stage: str, status: str, progress: float, result=None):
+        entry = self.stages.setdefault(stage, {})
+        entry.update(status=status, progress=progress)
+        if result is not None:
+            entry["result"] = result
+        if self.status == "queued":
+            self.status = "running"
+        self._publish("stage", {"stage": stage, **entry})
+
+    def update_step(self, step: str, status: str, seconds: Optional[float] = None):
+        """Span event from the analysis; spans that are not a modality step are ignored."""
+        modality = STEP_MODALITY.get(step)
+        if modality is None or self.status in FINISHED:
+            return
+        entry = self.stages.setdefault(modality, {"status": "running", "progress": 0.0})
+        if entry.get("status") in FINISHED:
+            return
+        steps = entry.setdefault("steps", {})
+        steps[step] = {"status": status, "seconds": seconds}
+        finished = sum(1 for name in STEPS[modality] if steps.get(name, {}).get("status") in FINISHED)
+        # 1.0 is left for update_stage once the modality's result is in
+        entry["progress"] = min(0.99, finished / len(STEPS[modality]))
+        if entry["status"] == "waiting":
+            entry["status"] = "running"
+        if self.status == "queued":
+            self.status = "running"
+        self._publish("step", {"stage": modality, "step": step, "status": status,
+                               "seconds": seconds, "progress": entry["progress"]})
+
+    def finish(self, result: dict):
+        self.result = result
+        self.status = "done"
+        self.finished = time.time()
+        self._publish("done", self.to_dict())
+
+    def fail(self, error: str):
+        self.error = error
+        self.status = "error"
+        self.finished = time.time()
+        self._publish("error", self.to_dict())
+
+    # ---------- STREAMING ----------
+    def _publish(self, event: str, data: dict):
+        for q in self._subscribers:
+            q.put_nowait((event, data))
+
+    async def events(self):
+        """Yield server-sent-event frames until the job finishes."""
+        q: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(q)
+        try:
+            # Current snapshot first so late subscribers are not left blank
+            yield self._sse("snapshot", self.to_dict())
+            if self.status in FINISHED:
+                return
+            while True:
+                event, data = await q.get()
+                yield self._sse(event, data)
+                if event in FINISHED:
+                    return
+        finally:
+            self._subscribers.remove(q)
+
+    @staticmethod
+    def _sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "stages": self.stages,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    def __init__(self, max_jobs: int = 1000, ttl_seconds: float = 3600, max_active: int = 64):
+        self.max_jobs = max_jobs
+        self.ttl = ttl_seconds
+        self.max_active = max_active
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def create(self, stages: List[str]) -> Job:
+        self._prune()
+        job = Job(stages)
+        self._jobs[job.id] = job
+        return job
+
+    def active(self) -> int:
+        """Queued and running jobs."""
+        return sum(1 for job in self._jobs.values() if job.status not in FINISHED)
+
+    def full(self) -> bool:
+        return self.active() >= self.max_active
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+        # Still over the bound: drop the oldest finished jobs. Queued and running jobs stay, or
+        # their clients would get 404 for work that is still going on
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) < self.max_jobs:
+                return
+            if job.status in FINISHED:
+                del self._jobs[job_id]
+
+    def __len__(self):
+        return len(self._jobs)
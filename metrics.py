@@ -0,0 +1,248 @@
+"""
+Metrics
+-------
+Per-stage latency spans and counters, exposed in the Prometheus text format.
+
+- span("image.ocr") times a block into the financeai_stage_seconds histogram
+- Spans also land in the current request's timings dict when one is active
+  (collect_timings(), used by /analyze?timings=true); the dict lives in a contextvar,
+  so thread pool work must run under contextvars.copy_context() to contribute
+- watch_spans(callback) reports every span of the current context as it starts and ends
+  (callback(stage, "running" | "done" | "error", seconds)), e.g. for job progress
+- Counter / Gauge / Histogram are minimal thread-safe implementations (no client library needed)
+- render() returns everything in the exposition format served at /metrics
+
+Stage names are "<area>.<step>": upload.<modality>, image.decode, image.hash, image.ocr, gemini.request,
+nlp.sentiment, nlp.ner, nlp.fraud, nlp.semantic, voice.preprocess, voice.ecapa, analyze.<modality>.
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+PREFIX = "financeai_"
+
+# Seconds; spans range from sub-millisecond tokenization to multi-second Gemini tails
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None)
+_listeners: contextvars.ContextVar[Tuple[Callable, ...]] = contextvars.ContextVar(
+    "span_listeners", default=())
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY[self.name] = self
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """For totals counted elsewhere (e.g. ResultCache.hits), copied in at scrape time."""
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def mean(self, **labels) -> Optional[float]:
+        """Average observed value of one series, None before the first observation."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+        return series[-2] / series[-1] if series else None
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}"
+
+
+_REGISTRY: Dict[str, _Metric] = {}
+
+# ---------- METRICS ----------
+stage_seconds = Histogram("stage_seconds", "Latency of one pipeline stage", ["stage"])
+request_seconds = Histogram("request_seconds", "End-to-end latency of an HTTP endpoint", ["endpoint"])
+model_load_seconds = Histogram("model_load_seconds", "Time to load a model into memory", ["model"],
+                               buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300))
+stage_errors = Counter("stage_errors", "Stages that raised an exception", ["stage"])
+cache_lookups = Counter("cache_lookups", "Result cache lookups by outcome", ["outcome"])
+gemini_attempts = Counter("gemini_attempts", "Gemini HTTP attempts by outcome", ["outcome"])
+queue_pending = Gauge("queue_pending", "Requests running or waiting per modality pool", ["modality"])
+batch_queued = Gauge("batch_queued", "Items waiting in a micro-batcher", ["batcher"])
+queue_rejected = Counter("queue_rejected", "Requests rejected with 503 per modality pool", ["modality"])
+model_loaded = Gauge("model_loaded", "1 if the model is resident", ["model"])
+model_size_bytes = Gauge("model_size_bytes", "Parameter + buffer bytes of a loaded model", ["model"])
+
+
+# ---------- SPANS ----------
+def _observe(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def _notify(stage: str, status: str, seconds: Optional[float]):
+    for callback in _listeners.get():
+        try:
+            callback(stage, status, seconds)
+        except Exception as e:  # progress reporting must never fail the analysis
+            print(f"[METRICS] Span listener failed: {e}")
+
+
+def record(stage: str, seconds: float):
+    _observe(stage, seconds)
+    _notify(stage, "done", seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one pipeline stage."""
+    _notify(stage, "running", None)
+    start = time.perf_counter()
+    status = "done"
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _observe(stage, seconds)
+        _notify(stage, status, seconds)
+
+
+@contextmanager
+def watch_spans(callback: Callable[[str, str, Optional[float]], None]):
+    """Call callback(stage, status, seconds) for the spans of this context (and copies of it)."""
+    token = _listeners.set(_listeners.get() + (callback,))
+    try:
+        yield
+    finally:
+        _listeners.reset(token)
+
+
+def span_listeners() -> Tuple[Callable, ...]:
+    return _listeners.get()
+
+
+def run_with_listeners(listeners: Tuple[Callable, ...], fn: Callable, *args):
+    """Run fn with span events going to listeners, e.g. those of every request in a micro-batch."""
+    token = _listeners.set(tuple(listeners))
+    try:
+        return fn(*args)
+    finally:
+        _listeners.reset(token)
+
+
+@contextmanager
+def collect_timings():
+    """Gather the spans of the current request (and work run under a copy of its context)."""
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+# ---------- EXPOSITION ----------
+def render() -> str:
+    lines = []
+    for metric in list(_REGISTRY.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
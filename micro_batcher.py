@@ -0,0 +1,94 @@
+"""
+Micro-Batcher
+-------------
+- Collects concurrent requests for a few milliseconds (or until max_batch_size items)
+- Runs them through a batch function in one call, off the event loop
+- Resolves each caller's future with its own result
+- Span events of the batch reach the span listeners of every caller in it (metrics.watch_spans)
+"""
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, List, Optional
+
+import metrics
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn: Callable[[List], List],
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0,
+                 executor: Optional[Executor] = None):
+        """
+        batch_fn: blocking function mapping a list of items to a list of results (same order).
+        max_wait_ms: longest time the first item of a batch waits for company.
+        executor: where batch_fn runs (default: the loop's default thread pool).
+        """
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches_run = 0
+        self.items_run = 0
+
+    async def submit(self, item):
+        """Queue one item and wait for its result."""
+        loop = asyncio.get_running_loop()
+        # The worker and queue belong to one event loop; start fresh if called from another
+        # (e.g. the app restarted in the same process, or a benchmark creating new loops)
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = loop.create_future()
+        await self._queue.put((item, future, metrics.span_listeners()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _, _ in batch]
+            listeners = tuple({cb: None for _, _, cbs in batch for cb in cbs})
+            call = partial(self.batch_fn, items)
+            if listeners and not isinstance(self.executor, ProcessPoolExecutor):
+                call = partial(metrics.run_with_listeners, listeners, self.batch_fn, items)
+            try:
+                results = await loop.run_in_executor(self.executor, call)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.items_run += len(items)
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "avg_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
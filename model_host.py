@@ -0,0 +1,344 @@
+"""
+Model Host
+----------
+One process owns the model weights (NLP analyzer, EasyOCR, ECAPA); any number of uvicorn /
+batch workers send it requests over local IPC instead of loading their own copies.
+
+- Transport: multiprocessing.connection (Unix socket, Windows named pipe or tcp://host:port),
+  HMAC-authenticated. With MODEL_HOST_AUTHKEY unset the host generates a random key per start and
+  writes it next to the Unix socket (<socket>.key, mode 0600) for the workers to read; tcp:// and
+  named-pipe addresses require MODEL_HOST_AUTHKEY
+- Text requests from all connections are merged into one batched analyze_texts call
+  (up to --max-batch texts, waiting at most --max-wait-ms for company)
+- Image OCR+Gemini and voice embeddings run on the connection's thread, bounded by --max-concurrency
+- Workers opt in with MODEL_HOST_SOCKET=<address>: backend.py and voice.py then call remote()
+  instead of the local registry, so an HTTP worker never imports torch or loads weights
+
+Usage:
+    python model_host.py --socket /tmp/financeai-models.sock --warmup nlp_analyzer,easyocr,ecapa
+    MODEL_HOST_SOCKET=/tmp/financeai-models.sock ANALYSIS_BACKEND=real uvicorn app:app --workers 4
+"""
+
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional
+
+MODEL_HOST_SOCKET = os.getenv("MODEL_HOST_SOCKET") or None
+MODEL_HOST_AUTHKEY = os.getenv("MODEL_HOST_AUTHKEY") or None
+# The key older releases used as a default; it is public, so it is refused
+PUBLIC_AUTHKEY = "financeai-model-host"
+
+# Set in the host process itself, so backend.py runs locally there instead of calling itself
+SERVING = False
+
+
+class ModelHostError(Exception):
+    pass
+
+
+def parse_address(address: str):
+    """'tcp://host:port' -> (host, port); anything else is a socket path / pipe name."""
+    if address.startswith("tcp://"):
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+# ---------- AUTH ----------
+def authkey_path(address) -> Optional[str]:
+    """Key file shared with workers next to a Unix socket; None for tcp:// and named pipes."""
+    if not isinstance(address, str) or address.startswith("\\\\"):
+        return None
+    return address + ".key"
+
+
+def _configured_authkey() -> Optional[bytes]:
+    if MODEL_HOST_AUTHKEY is None:
+        return None
+    if MODEL_HOST_AUTHKEY == PUBLIC_AUTHKEY:
+        raise ModelHostError("MODEL_HOST_AUTHKEY is the public default; set a secret key")
+    return MODEL_HOST_AUTHKEY.encode("utf-8")
+
+
+def host_authkey(address) -> bytes:
+    """MODEL_HOST_AUTHKEY, or a fresh random key written to authkey_path(address)."""
+    key = _configured_authkey()
+    if key is not None:
+        return key
+    path = authkey_path(address)
+    if path is None:
+        raise ModelHostError("MODEL_HOST_AUTHKEY must be set for tcp:// and named-pipe addresses")
+    key = secrets.token_hex(32).encode("utf-8")
+    if os.path.exists(path):
+        os.remove(path)  # O_CREAT keeps the mode of an existing file
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def client_authkey(address) -> bytes:
+    """MODEL_HOST_AUTHKEY, or the key the running host wrote next to its socket."""
+    key = _configured_authkey()
+    if key is not None:
+        return key
+    path = authkey_path(address)
+    if path is None or not os.path.exists(path):
+        raise ModelHostError(f"No key for model host {address}: set MODEL_HOST_AUTHKEY")
+    with open(path, "rb") as f:
+        return f.read().strip()
+
+
+# ---------- SERVER ----------
+class _TextBatcher:
+    """Thread-side micro-batcher: concatenates texts from concurrent requests into one call."""
+
+    def __init__(self, batch_fn, max_batch: int, max_wait: float):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self.batches_run = 0
+        self.texts_run = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, texts: List[str]) -> Future:
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            size = len(items[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                size += len(items[-1][0])
+
+            flat = [t for texts, _ in items for t in texts]
+            try:
+                results = self.batch_fn(flat)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.texts_run += len(flat)
+            start = 0
+            for texts, future in items:
+                future.set_result(results[start:start + len(texts)])
+                start += len(texts)
+
+
+class ModelHost:
+    def __init__(self, address, max_batch: int = 16, max_wait_ms: float = 10.0, max_concurrency: int = 4):
+        import backend
+        import voice
+
+        self.address = address
+        self.backend = backend
+        self.voice = voice
+        self.texts = _TextBatcher(backend.analyze_texts, max_batch, max_wait_ms / 1000.0)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.connections = 0
+        self.requests = 0
+
+    # ---------- METHODS ----------
+    def analyze_texts(self, texts):
+        return self.texts.submit(texts).result()
+
+    def analyze_image_full(self, path):
+        with self.slots:
+            return self.backend.analyze_image_full(path)
+
+    def voice_embedding(self, path, use_cache=True):
+        with self.slots:
+            return self.voice.get_embedding(path, use_cache=use_cache).reshape(-1).cpu().numpy()
+
+    def voice_embeddings(self, paths, batch_size=16, workers=None, chunk_size=256, use_cache=True):
+        with self.slots:
+            return self.voice.get_embeddings(paths, batch_size=batch_size, workers=workers,
+                                             chunk_size=chunk_size, use_cache=use_cache,
+                                             return_errors=True)
+
+    def embed_waveform(self, wav):
+        with self.slots:
+            return self.voice.embed_waveform(wav)
+
+    def prescore_texts(self, texts):
+        with self.slots:
+            return self.backend.prescore_texts(texts)
+
+    def image_precheck(self, path):
+        with self.slots:
+            return self.backend.image_precheck(path)
+
+    def warm_up(self, names=None):
+        from model_registry import registry
+        return registry.warm_up(names)
+
+    def stats(self):
+        from model_registry import registry
+        return {"models": registry.stats(), "connections": self.connections, "requests": self.requests,
+                "text_batches": self.texts.batches_run, "texts": self.texts.texts_run}
+
+    METHODS = ("analyze_texts", "analyze_image_full", "voice_embedding", "voice_embeddings",
+               "embed_waveform", "prescore_texts", "image_precheck", "warm_up", "stats")
+
+    # ---------- SERVING ----------
+    def _serve_connection(self, conn):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self.requests += 1
+                try:
+                    if method not in self.METHODS:
+                        raise ModelHostError(f"Unknown method '{method}'")
+                    reply = ("ok", getattr(self, method)(*args))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                conn.send(reply)
+        finally:
+            self.connections -= 1
+            conn.close()
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+        with Listener(self.address, authkey=host_authkey(self.address)) as listener:
+            print(f"[MODEL HOST] Listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # failed handshake (wrong authkey) etc.
+                    print(f"[MODEL HOST] Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+# ---------- CLIENT ----------
+class ModelHostClient:
+    """Thread-safe client: one connection per concurrent caller, reused across calls."""
+
+    def __init__(self, address, timeout: Optional[float] = None):
+        self.address = address
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+
+    def _connect(self):
+        # Read on every connect: a restarted host has a new key
+        return Client(self.address, authkey=client_authkey(self.address))
+
+    def call(self, method: str, *args):
+        for attempt in range(2):
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+            try:
+                conn.send((method, args))
+                if self.timeout is not None and not conn.poll(self.timeout):
+                    raise ModelHostError(f"Model host did not answer '{method}' within {self.timeout}s")
+                status, value = conn.recv()
+            except (EOFError, OSError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue  # idle connection to a host that has since restarted: reconnect once
+                raise
+            except ModelHostError:
+                conn.close()  # a half-used connection cannot be reused
+                raise
+            break
+        self._idle.put(conn)
+        if status == "error":
+            raise ModelHostError(value)
+        return value
+
+    def analyze_texts(self, texts):
+        return self.call("analyze_texts", list(texts))
+
+    def analyze_image_full(self, path):
+        return self.call("analyze_image_full", os.path.abspath(path))
+
+    def voice_embedding(self, path, use_cache=True):
+        return self.call("voice_embedding", os.path.abspath(path), use_cache)
+
+    def voice_embeddings(self, paths, batch_size=16, workers=None, chunk_size=256, use_cache=True):
+        """(matrix, {index: error}) as voice.get_embeddings(..., return_errors=True)."""
+        return self.call("voice_embeddings", [os.path.abspath(p) for p in paths], batch_size,
+                         workers, chunk_size, use_cache)
+
+    def embed_waveform(self, wav):
+        return self.call("embed_waveform", wav)
+
+    def prescore_texts(self, texts):
+        return self.call("prescore_texts", list(texts))
+
+    def image_precheck(self, path):
+        return self.call("image_precheck", os.path.abspath(path))
+
+    def stats(self):
+        return self.call("stats")
+
+    def warm_up(self, names=None):
+        return self.call("warm_up", names)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def remote() -> Optional[ModelHostClient]:
+    """The shared client when MODEL_HOST_SOCKET is set (and this is not the host), else None."""
+    global _client
+    if SERVING or not MODEL_HOST_SOCKET:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                timeout = os.getenv("MODEL_HOST_TIMEOUT")
+                _client = ModelHostClient(parse_address(MODEL_HOST_SOCKET),
+                                          timeout=float(timeout) if timeout else None)
+    return _client
+
+
+def main():
+    global SERVING
+    parser = argparse.ArgumentParser(description="Serve the analysis models to local workers")
+    parser.add_argument("--socket", default=MODEL_HOST_SOCKET or "/tmp/financeai-models.sock",
+                        help="Unix socket path, Windows pipe (\\\\.\\pipe\\name) or tcp://host:port")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--warmup", default="", help="Comma-separated registry models to load at start")
+    args = parser.parse_args()
+
+    SERVING = True
+    import model_host  # run as __main__, so flag the module backend.py imports as well
+    model_host.SERVING = True
+    host = ModelHost(parse_address(args.socket), args.max_batch, args.max_wait_ms, args.max_concurrency)
+    warmup = [m.strip() for m in args.warmup.split(",") if m.strip()]
+    if warmup:
+        host.warm_up(warmup)
+    host.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Model Registry
+--------------
+- Process-wide, lazily initialised store for the heavy models (NLP analyzer, EasyOCR, ...)
+- Each model is loaded once per worker on first use and then shared
+- Records load time and resident size for every loaded model
+- Optional memory cap: least recently used models that nobody holds are evicted
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from metrics import model_load_seconds
+
+
+def _rss_bytes():
+    """Current resident set size of this process (Linux /proc, None elsewhere)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _tensor_bytes(obj, seen=None, depth=0):
+    """Sum parameter + buffer bytes of every torch module reachable from obj."""
+    if seen is None:
+        seen = set()
+    if obj is None or id(obj) in seen or depth > 3:
+        return 0
+    seen.add(id(obj))
+
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        try:
+            total = 0
+            for t in list(obj.parameters()) + list(obj.buffers()):
+                if id(t) not in seen:
+                    seen.add(id(t))
+                    total += t.numel() * t.element_size()
+            return total
+        except Exception:
+            return 0
+
+    if isinstance(obj, (str, bytes, int, float, bool)):
+        return 0
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif hasattr(obj, "__dict__"):
+        children = vars(obj).values()
+    else:
+        return 0
+    return sum(_tensor_bytes(c, seen, depth + 1) for c in children)
+
+
+class _Entry:
+    def __init__(self, loader: Callable):
+        self.loader = loader
+        self.model = None
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.load_seconds = None
+        self.size_bytes = None
+        self.rss_delta_bytes = None
+        self.loads = 0
+        self.last_used = None
+
+
+class ModelRegistry:
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        max_bytes: soft memory cap for all loaded models together (None = unlimited).
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------- REGISTRATION ----------
+    def register(self, name: str, loader: Callable):
+        with self._lock:
+            if name in self._entries and self._entries[name].model is not None:
+                raise ValueError(f"Model '{name}' is already loaded")
+            self._entries[name] = _Entry(loader)
+
+    def _entry(self, name: str) -> _Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Unknown model '{name}'. Registered: {list(self._entries)}")
+
+    # ---------- ACCESS ----------
+    def get(self, name: str):
+        """Return the shared model, loading it on first use."""
+        entry = self._entry(name)
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    self._load(name, entry)
+        entry.last_used = time.time()
+        with self._lock:
+            self._entries.move_to_end(name)
+        return entry.model
+
+    @contextmanager
+    def use(self, name: str):
+        """Hold a model for the duration of a block so it cannot be evicted."""
+        entry = self._entry(name)
+        with self._lock:
+            entry.in_use += 1
+        try:
+            yield self.get(name)
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+
+    def warm_up(self, names=None):
+        """Load the given models (default: all registered) ahead of the first request."""
+        for name in names or list(self._entries):
+            self.get(name)
+        return self.stats()
+
+    def _load(self, name: str, entry: _Entry):
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = entry.loader()
+        entry.load_seconds = time.perf_counter() - start
+        rss_after = _rss_bytes()
+
+        entry.model = model
+        entry.loads += 1
+        entry.size_bytes = _tensor_bytes(model)
+        if rss_before is not None and rss_after is not None:
+            entry.rss_delta_bytes = max(0, rss_after - rss_before)
+        model_load_seconds.observe(entry.load_seconds, model=name)
+        print(f"[MODEL REGISTRY] Loaded '{name}' in {entry.load_seconds:.2f}s "
+              f"({(entry.size_bytes or 0) / 1e6:.1f} MB)")
+        self._enforce_cap(keep=name)
+
+    # ---------- EVICTION ----------
+    def _resident_bytes(self) -> int:
+        return sum(e.size_bytes or e.rss_delta_bytes or 0
+                   for e in self._entries.values() if e.model is not None)
+
+    def _enforce_cap(self, keep: str):
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            # OrderedDict order is least -> most recently used
+            for name, entry in list(self._entries.items()):
+                if self._resident_bytes() <= self.max_bytes:
+                    break
+                if name == keep or entry.model is None or entry.in_use > 0:
+                    continue
+                self._unload(name, entry)
+
+    def evict(self, name: str) -> bool:
+        """Drop a loaded model unless someone is currently using it."""
+        entry = self._entry(name)
+        with self._lock:
+            if entry.model is None or entry.in_use > 0:
+                return False
+            self._unload(name, entry)
+            return True
+
+    def _unload(self, name: str, entry: _Entry):
+        entry.model = None
+        gc.collect()
+        print(f"[MODEL REGISTRY] Evicted '{name}'")
+
+    # ---------- REPORTING ----------
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "loaded": e.model is not None,
+                "load_seconds": e.load_seconds,
+                "size_bytes": e.size_bytes,
+                "rss_delta_bytes": e.rss_delta_bytes,
+                "loads": e.loads,
+                "in_use": e.in_use,
+                "last_used": e.last_used,
+            }
+            for name, e in self._entries.items()
+        }
+
+
+# ---------- DEFAULT MODELS ----------
+def _load_nlp_analyzer():
+    from combined_nlp_fraud_detector_fileinput_v2 import CombinedNLPAnalyzer
+    claim_index = None
+    if os.getenv("CLAIM_INDEX_DIR"):
+        from claim_index import ClaimIndex
+        claim_index = ClaimIndex(os.environ["CLAIM_INDEX_DIR"],
+                                 nprobe=int(os.getenv("CLAIM_INDEX_NPROBE", "8")),
+                                 auto_train=os.getenv("CLAIM_INDEX_AUTO_TRAIN", "1") == "1")
+    return CombinedNLPAnalyzer(fraud_mode=os.getenv("FRAUD_MODE", "pipeline"), claim_index=claim_index,
+                               index_claims=os.getenv("CLAIM_INDEX_ADD", "1") == "1")
+
+
+def _load_easyocr_reader():
+    import easyocr
+    return easyocr.Reader(['en'], gpu=False)
+
+
+def _load_ecapa():
+    from speechbrain.pretrained import EncoderClassifier
+    from inference_backends import optimize_ecapa
+    model = EncoderClassifier.from_hparams(source="speechbrain/spkrec-ecapa-voxceleb")
+    return optimize_ecapa(model)  # INFERENCE_BACKEND[_ECAPA]=int8 quantizes its Linear layers
+
+
+_cap_mb = os.getenv("MODEL_MEMORY_CAP_MB")
+registry = ModelRegistry(max_bytes=int(float(_cap_mb) * 1024 * 1024) if _cap_mb else None)
+registry.register("nlp_analyzer", _load_nlp_analyzer)
+registry.register("easyocr", _load_easyocr_reader)
+registry.register("ecapa", _load_ecapa)
@@ -0,0 +1,173 @@
+"""
+Result Cache
+------------
+Content-addressed cache for per-modality analysis results.
+
+- Key = sha256(modality, model/prompt version, content bytes), so identical resubmissions hit
+  and a model or prompt change invalidates old entries automatically
+- In-memory LRU tier, optional SQLite tier shared across restarts and workers
+- TTL-based expiry and hit/miss counters
+- Values must be JSON-serialisable
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from inference_backends import describe
+
+# Bump an entry whenever the model, prompt or scoring for that modality changes
+MODEL_VERSIONS = {
+    "image": "easyocr-en|gemini-2.5-flash|prep-v1|prompt-v2-"
+             + ("ocr" if os.getenv("IMAGE_OCR_IN_PROMPT", "1") == "1" else "parallel"),
+    "text": "finbert-tone|bert-ner|mpnet|bart-mnli|" + os.getenv("FRAUD_MODE", "pipeline")
+            + "|" + describe(["finbert", "ner", "mpnet", "zero_shot"])
+            + ("|claim-index" if os.getenv("CLAIM_INDEX_DIR") else ""),
+    # Denoising and resampling change the waveform ECAPA sees (defaults as in audio_preprocess)
+    "voice": "ecapa-voxceleb|clean-v2|denoise-" + os.getenv("VOICE_DENOISE", "stationary")
+             + "|resample-" + os.getenv("VOICE_RESAMPLE_QUALITY", "MQ") + "|" + describe(["ecapa"]),
+}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024,
+                 ttl_seconds: Optional[float] = 24 * 3600,
+                 db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.db_path = db_path
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            with self._db() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS results ("
+                           "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+
+    @contextmanager
+    def _db(self):
+        # One short-lived connection per call keeps the cache safe to use from worker threads
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(modality: str, digest: str, version: Optional[str] = None) -> str:
+        version = version if version is not None else MODEL_VERSIONS.get(modality, "")
+        return hashlib.sha256(f"{modality}|{version}|{digest}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    # ---------- LOOKUP ----------
+    def get(self, modality: str, digest: str, version: Optional[str] = None):
+        """Return the cached value or None. digest is content_hash()/file_hash() of the input."""
+        k = self.key(modality, digest, version)
+        with self._lock:
+            item = self._mem.get(k)
+            if item is not None:
+                created, value = item
+                if not self._expired(created):
+                    self._mem.move_to_end(k)
+                    self.hits += 1
+                    return value
+                del self._mem[k]
+
+        if self.db_path:
+            with self._db() as db:
+                row = db.execute("SELECT value, created FROM results WHERE key = ?", (k,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1]):
+                        value = json.loads(row[0])
+                        self._remember(k, value, row[1])
+                        with self._lock:
+                            self.disk_hits += 1
+                        return value
+                    db.execute("DELETE FROM results WHERE key = ?", (k,))
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, modality: str, digest: str, value, version: Optional[str] = None):
+        k = self.key(modality, digest, version)
+        created = time.time()
+        self._remember(k, value, created)
+        if self.db_path:
+            with self._db() as db:
+                db.execute("INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                           (k, json.dumps(value), created))
+
+    def get_or_compute(self, modality: str, digest: str, compute: Callable, version: Optional[str] = None):
+        value = self.get(modality, digest, version)
+        if value is None:
+            value = compute()
+            self.put(modality, digest, value, version)
+        return value
+
+    def _remember(self, k: str, value, created: float):
+        with self._lock:
+            self._mem[k] = (created, value)
+            self._mem.move_to_end(k)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                self.evictions += 1
+
+    # ---------- MAINTENANCE ----------
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers; returns how many were removed."""
+        if self.ttl is None:
+            return 0
+        removed = 0
+        with self._lock:
+            for k in [k for k, (created, _) in self._mem.items() if self._expired(created)]:
+                del self._mem[k]
+                removed += 1
+        if self.db_path:
+            with self._db() as db:
+                removed += db.execute("DELETE FROM results WHERE created < ?",
+                                      (time.time() - self.ttl,)).rowcount
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._mem),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+_ttl = os.getenv("RESULT_CACHE_TTL", str(24 * 3600))
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1024")),
+    ttl_seconds=float(_ttl) if _ttl else None,
+    db_path=os.getenv("RESULT_CACHE_DB") or None,
+)
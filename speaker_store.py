@@ -0,0 +1,236 @@
+"""
+Speaker Embedding Store
+-----------------------
+- Keeps one L2-normalised ECAPA embedding per enrolled speaker (policyholder, known fraudster, ...)
+- Embeddings live in a float32 .npy matrix opened as a memory map; ids/metadata in index.json
+- verify(): 1:1 score against one enrolled voice
+- identify(): 1:N scores against every enrolled voice in a single matrix-vector product
+- Reads and writes share one lock, so a score never sees a half-enrolled row or the matrix
+  mid-swap while it grows
+- Several processes may share a directory: enroll/remove take an exclusive file lock (fcntl,
+  where available) and scores a shared one; each first re-reads index.json and reopens the
+  matrix when another process rewrote or grew them, so no worker overwrites another's rows or
+  misses its enrollments
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking is per process only
+    fcntl = None
+
+
+def _normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).reshape(-1)
+    return v / (np.linalg.norm(v) + 1e-12)
+
+
+def _stamp(path: str):
+    """Identity of a file version (os.replace gives a new inode, growth a new size)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class SpeakerStore:
+    def __init__(self, directory: str, initial_capacity: int = 1024):
+        self.directory = directory
+        self.matrix_path = os.path.join(directory, "embeddings.npy")
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.ids: List[str] = []
+        self.meta: Dict[str, dict] = {}
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._stamps = {}
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+
+    def __len__(self):
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return len(self.ids)
+
+    def __contains__(self, speaker_id: str):
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return speaker_id in self._rows
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def embeddings(self) -> np.ndarray:
+        """Copy of the enrolled rows."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            if self._matrix is None:
+                return np.zeros((0, 0), dtype=np.float32)
+            return np.array(self._matrix[:len(self.ids)])
+
+    # ---------- STORAGE ----------
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Serialises writers (and refreshes) across processes sharing the directory."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """
+        Catch up with other processes (call holding the file lock): a rewritten index.json and
+        a matrix that was grown (replaced). Two stat calls when nothing changed.
+        """
+        index = _stamp(self.index_path)
+        matrix = _stamp(self.matrix_path)
+        if index is None or matrix is None:
+            return
+        if self._matrix is None or matrix[0] != self._stamps["matrix"][0]:
+            self._matrix = np.load(self.matrix_path, mmap_mode="r+")
+        self._stamps["matrix"] = matrix
+        if index != self._stamps.get("index"):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.ids = data["ids"]
+            self.meta = data.get("meta", {})
+            self._rows = {sid: i for i, sid in enumerate(self.ids)}
+            self._stamps["index"] = index
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        if self._matrix is not None and self._matrix.shape[1] != dim:
+            raise ValueError(f"Embedding dim {dim} does not match store dim {self._matrix.shape[1]}")
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, capacity * 2, rows)
+        tmp_path = self.matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                          shape=(new_capacity, dim))
+        if self._matrix is not None:
+            grown[:len(self.ids)] = self._matrix[:len(self.ids)]
+        grown.flush()
+        del grown
+        self._matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode="r+")
+        self._stamps["matrix"] = _stamp(self.matrix_path)
+
+    def _save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "meta": self.meta}, f)
+        os.replace(tmp, self.index_path)
+        self._stamps["index"] = _stamp(self.index_path)
+
+    # ---------- ENROLLMENT ----------
+    def enroll(self, speaker_id: str, embedding, meta: Optional[dict] = None, update: bool = False):
+        """
+        Store a speaker's embedding. Re-enrolling replaces it, or with update=True
+        averages the new embedding into the existing one (multi-sample enrollment).
+        """
+        v = _normalize(embedding)
+        with self._lock, self._file_lock():
+            self._refresh()
+            row = self._rows.get(speaker_id)
+            new = row is None
+            if new:
+                row = len(self.ids)
+                self._ensure_capacity(row + 1, v.shape[0])
+            elif update:
+                v = _normalize(self._matrix[row] + v)
+            self._matrix[row] = v
+            self._matrix.flush()
+            if new:
+                # The id only becomes visible once its row is written
+                self.ids.append(speaker_id)
+                self._rows[speaker_id] = row
+            if meta is not None:
+                self.meta[speaker_id] = meta
+            self._save_index()
+
+    def remove(self, speaker_id: str) -> bool:
+        with self._lock, self._file_lock():
+            self._refresh()
+            row = self._rows.pop(speaker_id, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix dense
+                moved = self.ids[last]
+                self._matrix[row] = self._matrix[last]
+                self.ids[row] = moved
+                self._rows[moved] = row
+            self.ids.pop()
+            self.meta.pop(speaker_id, None)
+            self._matrix.flush()
+            self._save_index()
+            return True
+
+    # ---------- SCORING ----------
+    def embedding(self, speaker_id: str) -> np.ndarray:
+        """Copy of one enrolled (L2-normalised) embedding."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            row = self._rows.get(speaker_id)
+            if row is None:
+                raise KeyError(f"Speaker '{speaker_id}' is not enrolled")
+            return np.array(self._matrix[row])
+
+    def verify(self, speaker_id: str, embedding) -> float:
+        """Cosine similarity between an embedding and one enrolled speaker."""
+        v = _normalize(embedding)
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            row = self._rows.get(speaker_id)
+            if row is None:
+                raise KeyError(f"Speaker '{speaker_id}' is not enrolled")
+            return float(self._matrix[row] @ v)
+
+    def identify(self, embedding, top_k: int = 5, threshold: Optional[float] = None,
+                 role: Optional[str] = None) -> List[dict]:
+        """
+        Best-matching enrolled speakers for an embedding, highest score first.
+        role filters on meta["role"], e.g. "fraudster".
+        """
+        v = _normalize(embedding)
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            ids = list(self.ids)
+            if not ids:
+                return []
+            scores = self._matrix[:len(ids)] @ v
+            meta = dict(self.meta)
+            if role is not None:
+                mask = np.array([meta.get(sid, {}).get("role") == role for sid in ids])
+                scores = np.where(mask, scores, -np.inf)
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for i in top:
+            score = float(scores[i])
+            if not np.isfinite(score) or (threshold is not None and score < threshold):
+                continue
+            sid = ids[i]
+            matches.append({"speaker_id": sid, "score": score, "meta": meta.get(sid, {})})
+        return matches
@@ -14,9 +14,12 @@ const APP_CONFIG = {
         endpoints: {
             submitClaim: '/api/analyze-claim',
             getResults: '/api/results',
+            jobs: '/jobs',
         },
         // Set to false when you have a real API
         useMockAPI: true,
+        // Submit all files as one background job and follow real progress over SSE
+        useJobsAPI: false,
     },
     
     // File Upload Configuration
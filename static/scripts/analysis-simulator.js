@@ -27,8 +27,12 @@ class AnalysisSimulator {
         // Reset all stages
         this.resetStages();
         
-        // Start sequential analysis
-        this.analyzeSequentially();
+        // Start analysis: real server-side progress when the jobs API is enabled
+        if (!APP_CONFIG.api.useMockAPI && APP_CONFIG.api.useJobsAPI) {
+            this.analyzeWithJob();
+        } else {
+            this.analyzeSequentially();
+        }
     }
     
     resetStages() {
@@ -68,6 +72,98 @@ class AnalysisSimulator {
         this.completeAnalysis();
     }
     
+    async analyzeWithJob() {
+        const { baseUrl, endpoints } = APP_CONFIG.api;
+        const formData = new FormData();
+        Object.keys(this.stages).forEach(type => {
+            if (this.uploadedFiles && this.uploadedFiles[type]) {
+                formData.append(type, this.uploadedFiles[type]);
+            }
+        });
+        
+        try {
+            const response = await fetch(`${baseUrl}${endpoints.jobs}`, {
+                method: 'POST',
+                body: formData,
+            });
+            if (!response.ok) {
+                throw new Error(`Job submission failed (${response.status})`);
+            }
+            const job = await response.json();
+            this.followJob(`${baseUrl}${endpoints.jobs}/${job.id}/events`);
+        } catch (error) {
+            console.error('Job submission failed:', error);
+            this.analyzeSequentially();
+        }
+    }
+    
+    followJob(url) {
+        const source = new EventSource(url);
+        
+        source.addEventListener('stage', event => {
+            const update = JSON.parse(event.data);
+            this.applyStageUpdate(update.stage, update);
+        });
+        
+        const finish = event => {
+            source.close();
+            const job = JSON.parse(event.data);
+            Object.entries(job.stages || {}).forEach(([type, update]) => {
+                this.applyStageUpdate(type, update);
+            });
+            this.completeAnalysis();
+        };
+        source.addEventListener('done', finish);
+        source.addEventListener('error', event => {
+            // Server-sent 'error' events carry data; connection errors do not
+            if (event.data) {
+                finish(event);
+            } else {
+                source.close();
+                this.completeAnalysis();
+            }
+        });
+    }
+    
+    applyStageUpdate(type, update) {
+        const stage = this.stages[type];
+        if (!stage) return;
+        
+        if (update.status === 'running') {
+            stage.className = 'analysis-stage processing';
+            this.updateStageStatus(type, APP_CONFIG.analysis.messages[type][0], 'autorenew');
+            this.updateProgress(type, Math.max(10, update.progress * 100));
+            return;
+        }
+        if (!update.result) return;
+        
+        const result = update.result;
+        const thresholds = APP_CONFIG.analysis.thresholds;
+        const confidence = result.confidence || 0;
+        let status = result.status;
+        if (status !== 'authentic' && status !== 'suspicious') {
+            status = confidence >= thresholds.suspicious ? 'suspicious' : 'fraudulent';
+        }
+        const isAuthentic = status === 'authentic' || status === 'suspicious';
+        
+        this.results[type] = {
+            type,
+            confidence,
+            status,
+            isAuthentic,
+            indicators: this.generateIndicators(type, status),
+            timestamp: new Date().toISOString(),
+        };
+        
+        stage.className = isAuthentic ? 'analysis-stage completed' : 'analysis-stage failed';
+        this.updateStageStatus(
+            type,
+            isAuthentic ? 'Analysis complete - Authentic' : 'Analysis complete - Issues detected',
+            isAuthentic ? 'check_circle' : 'error'
+        );
+        this.updateProgress(type, 100);
+    }
+    
     async analyzeStage(type) {
         const stage = this.stages[type];
         const config = APP_CONFIG.analysis;
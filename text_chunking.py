@@ -0,0 +1,98 @@
+"""
+Long-Document Chunking
+----------------------
+- Splits a claim narrative into overlapping token windows (character spans of the original text)
+- Streams the windows in fixed-size batches so model memory does not grow with the document
+- Merges per-window sentiment, entities and fraud scores into one document-level result
+"""
+
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+def iter_windows(tokenizer, text: str, window_tokens: int = 400,
+                 stride_tokens: int = 64) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (char_offset, chunk_text) windows of at most window_tokens tokens,
+    consecutive windows overlapping by stride_tokens tokens.
+    """
+    if stride_tokens >= window_tokens:
+        raise ValueError("stride_tokens must be smaller than window_tokens")
+    offsets = tokenizer(text, add_special_tokens=False,
+                        return_offsets_mapping=True)["offset_mapping"]
+    if not offsets:
+        yield 0, text
+        return
+
+    step = window_tokens - stride_tokens
+    start = 0
+    while True:
+        end = min(start + window_tokens, len(offsets))
+        char_start, char_end = offsets[start][0], offsets[end - 1][1]
+        yield char_start, text[char_start:char_end]
+        if end >= len(offsets):
+            break
+        start += step
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ChunkAggregator:
+    """Running, length-weighted merge of per-window model outputs."""
+
+    def __init__(self):
+        self.chunks = 0
+        self._sent_sum: Dict[str, float] = {}
+        self._sent_weight = 0.0
+        self._fraud_sum: Dict[str, float] = {}
+        self._fraud_weight = 0.0
+        # (entity_group, global start, global end) -> entity; overlaps collapse onto one key
+        self._entities: Dict[Tuple, dict] = {}
+
+    def add(self, char_offset: int, weight: float, sentiment_scores: Dict[str, float],
+            ents: List[dict], fraud_scores: Dict[str, float]):
+        """Fold one window's outputs in; weight is usually the window length."""
+        self.add_sentiment(sentiment_scores, weight)
+        self.add_entities(ents, char_offset)
+        self.add_fraud(fraud_scores, weight)
+        self.chunks += 1
+
+    def add_sentiment(self, scores: Dict[str, float], weight: float):
+        for label, p in scores.items():
+            self._sent_sum[label] = self._sent_sum.get(label, 0.0) + p * weight
+        self._sent_weight += weight
+
+    def add_fraud(self, label_scores: Dict[str, float], weight: float):
+        for label, p in label_scores.items():
+            self._fraud_sum[label] = self._fraud_sum.get(label, 0.0) + p * weight
+        self._fraud_weight += weight
+
+    def add_entities(self, ents: List[dict], char_offset: int):
+        for e in ents:
+            start = e.get("start")
+            end = e.get("end")
+            if start is None or end is None:
+                key = (e["entity_group"], e["word"], self.chunks)
+            else:
+                key = (e["entity_group"], start + char_offset, end + char_offset)
+            if key not in self._entities or e["score"] > self._entities[key]["score"]:
+                self._entities[key] = e
+
+    def sentiment(self, labels: List[str]) -> List[float]:
+        w = self._sent_weight or 1.0
+        return [self._sent_sum.get(l, 0.0) / w for l in labels]
+
+    def fraud(self) -> Dict[str, list]:
+        w = self._fraud_weight or 1.0
+        ranked = sorted(self._fraud_sum.items(), key=lambda kv: -kv[1])
+        return {"labels": [l for l, _ in ranked], "scores": [p / w for _, p in ranked]}
+
+    def entities(self) -> List[dict]:
+        return list(self._entities.values())
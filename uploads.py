@@ -0,0 +1,135 @@
+"""
+Upload Handling
+---------------
+- Streams UploadFile contents to disk in fixed-size chunks with async file I/O
+- Enforces a per-modality size limit while streaming (nothing past the limit is written)
+- RequestSizeLimit caps the whole request body before Starlette spools it to a temp file:
+  a Content-Length over MAX_REQUEST_BYTES is refused outright, and a body that turns out
+  longer (chunked / lying clients) is cut off with 413 as soon as it passes the limit
+- Every upload gets a unique path, so two users sending "claim.png" never collide
+- The sha256 digest is computed on the fly for the result cache (no second read)
+- remove_uploads() deletes the temp files once analysis is finished
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import aiofiles
+from starlette.exceptions import HTTPException
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1024 * 1024
+
+# Server-side limits (match the frontend's fileUpload.maxSize)
+MAX_UPLOAD_BYTES = {
+    'image': int(os.getenv('MAX_IMAGE_BYTES', str(5 * 1024 * 1024))),
+    'voice': int(os.getenv('MAX_VOICE_BYTES', str(10 * 1024 * 1024))),
+    'text': int(os.getenv('MAX_TEXT_BYTES', str(2 * 1024 * 1024))),
+}
+# Whole multipart body: every file at its limit plus room for the form framing
+MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', str(sum(MAX_UPLOAD_BYTES.values()) + 1024 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, modality: str, limit: int):
+        super().__init__(f"{modality} upload exceeds {limit // (1024 * 1024)} MB limit")
+        self.modality = modality
+        self.limit = limit
+
+
+class RequestTooLarge(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Request body exceeds {limit // (1024 * 1024)} MB limit")
+
+
+class RequestSizeLimit:
+    """ASGI middleware: 413 for HTTP request bodies over max_bytes, checked before they are parsed."""
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Surfaces through FastAPI's body parsing as a 413 response
+                    raise RequestTooLarge(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": RequestTooLarge(self.max_bytes).detail}).encode("utf-8")
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+@dataclass
+class SavedUpload:
+    filename: str
+    path: Optional[str] = None
+    digest: Optional[str] = None
+    size: int = 0
+
+
+def unique_path(dest_dir: str, filename: str) -> str:
+    name = secure_filename(filename) or "upload"
+    return os.path.join(dest_dir, f"{uuid.uuid4().hex}_{name}")
+
+
+async def stream_to_disk(upload, dest_dir: str, modality: str,
+                         chunk_size: int = CHUNK_SIZE) -> SavedUpload:
+    """Copy an UploadFile to a unique file under dest_dir, hashing it as it goes."""
+    limit = MAX_UPLOAD_BYTES.get(modality)
+    path = unique_path(dest_dir, upload.filename)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    raise UploadTooLarge(modality, limit)
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        remove_file(path)
+        raise
+    finally:
+        await upload.close()
+    return SavedUpload(upload.filename, path, digest.hexdigest(), size)
+
+
+def remove_file(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_uploads(uploads: Dict[str, SavedUpload]):
+    for saved in uploads.values():
+        remove_file(saved.path)
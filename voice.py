@@ -1,62 +1,251 @@
-import torch
-import noisereduce as nr
 import numpy as np
-import soundfile as sf
-import librosa
+import os
 import sys
-from speechbrain.pretrained import EncoderClassifier
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from model_registry import registry
+from model_host import remote
+from result_cache import result_cache, file_hash
+from speaker_store import SpeakerStore
+import audio_preprocess
+from metrics import span
 
 # -----------------------------------------------------
 # MODEL: Robust speaker embedding (ECAPA-TDNN)
+# Loaded by the model registry ("ecapa") on first use, so importing this module
+# does not pull in torch / speechbrain
 # -----------------------------------------------------
-model = EncoderClassifier.from_hparams(source="speechbrain/spkrec-ecapa-voxceleb")
+EMBEDDING_DIM = 192  # spkrec-ecapa-voxceleb
+
+def get_model():
+    return registry.get("ecapa")
+
+def __getattr__(name):
+    # voice.model keeps working for callers that used the old module-level model
+    if name == "model":
+        return get_model()
+    raise AttributeError(f"module 'voice' has no attribute '{name}'")
 
 # -----------------------------------------------------
 # Step 1: Load + clean audio
 # -----------------------------------------------------
-def load_and_clean(path):
-    # Load WAV safely using soundfile (no torchaudio dependency)
-    wav, sr = sf.read(path)
-    if len(wav.shape) > 1:
-        wav = wav.mean(axis=1)  # Convert to mono
-
-    # Resample to 16 kHz
-    if sr != 16000:
-        wav = librosa.resample(wav, orig_sr=sr, target_sr=16000)
-        sr = 16000
-
-    # Denoise audio
-    wav = nr.reduce_noise(y=wav, sr=sr)
-
-    # --- Simple VAD: Remove silence based on RMS energy ---
-    energy = librosa.feature.rms(y=wav)[0]
-    threshold = 0.5 * np.mean(energy)
-    frames = np.nonzero(energy > threshold)[0]
-    if len(frames) > 0:
-        t = librosa.frames_to_samples(frames, hop_length=512)
-        start, end = max(0, t[0]), min(len(wav), t[-1])
-        wav = wav[start:end]
-
-    # Normalize loudness
-    wav = wav / (np.max(np.abs(wav)) + 1e-6)
+def load_and_clean(path, denoise_mode=audio_preprocess.DENOISE_MODE, timings=None):
+    # Block-wise float32 decode, polyphase resample to 16 kHz, optional denoise,
+    # energy VAD over all speech regions, peak normalisation (see audio_preprocess.py)
+    with span("voice.preprocess"):
+        wav, sr = audio_preprocess.preprocess(path, denoise_mode=denoise_mode, timings=timings)
 
     # Convert to tensor
-    return torch.tensor(wav).unsqueeze(0), sr
+    import torch
+    return torch.from_numpy(wav).unsqueeze(0), sr
 
 # -----------------------------------------------------
 # Step 2: Extract embedding
 # -----------------------------------------------------
-def get_embedding(path):
+def get_embedding(path, use_cache=True):
+    """
+    L2-normalised ECAPA embedding of one recording, shape (1, EMBEDDING_DIM): a torch tensor,
+    or a numpy array when the model host computed it (this worker then never imports torch).
+    """
+    host = remote()
+    if host is not None:
+        return host.voice_embedding(path, use_cache).reshape(1, -1)
+    import torch
+    digest = file_hash(path) if use_cache else None
+    if digest is not None:
+        cached = result_cache.get("voice", digest)
+        if cached is not None:
+            return torch.tensor(cached)
+
     speech, sr = load_and_clean(path)
-    emb = model.encode_batch(speech)
+    with registry.use("ecapa") as model, span("voice.ecapa"):
+        emb = model.encode_batch(speech)
     emb = torch.nn.functional.normalize(emb, dim=-1)  # L2 normalize
-    return emb.squeeze(0)
+    emb = emb.squeeze(0)
+
+    if digest is not None:
+        result_cache.put("voice", digest, emb.tolist())
+    return emb
+
+# -----------------------------------------------------
+# Step 2b: Many recordings at once (bulk enrollment, offline re-verification)
+# -----------------------------------------------------
+def length_buckets(lengths, batch_size=16, max_ratio=1.25):
+    """
+    Group indices into batches of similar length: sorted by length, a batch closes when it is full
+    or the next recording is more than max_ratio times its shortest, which caps padding waste.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches, current = [], []
+    for i in order:
+        if current and (len(current) == batch_size or lengths[i] > max_ratio * lengths[current[0]]):
+            batches.append(current)
+            current = []
+        current.append(int(i))
+    if current:
+        batches.append(current)
+    return batches
+
+def _clean_waveform(path):
+    with span("voice.preprocess"):
+        wav, _ = audio_preprocess.preprocess(path)
+    if len(wav) == 0:
+        raise ValueError(f"No audio in {path}")
+    return wav
+
+def _embed_padded(wavs):
+    """One padded encode_batch call; wav_lens (relative lengths) keep the padding out of pooling."""
+    import torch
+    lengths = np.array([len(w) for w in wavs])
+    batch = np.zeros((len(wavs), lengths.max()), dtype=np.float32)
+    for row, w in zip(batch, wavs):
+        row[:len(w)] = w
+    wav_lens = torch.from_numpy(lengths / lengths.max()).float()
+    with registry.use("ecapa") as model, span("voice.ecapa"):
+        emb = model.encode_batch(torch.from_numpy(batch), wav_lens)
+    return torch.nn.functional.normalize(emb, dim=-1).reshape(len(wavs), -1).cpu().numpy()
+
+def get_embeddings(paths, batch_size=16, workers=None, chunk_size=256, use_cache=True,
+                   return_errors=False):
+    """
+    L2-normalised embeddings of many recordings as an (N, 192) float32 numpy matrix, rows in
+    the order of paths. Files are cleaned on a thread pool, grouped into length buckets and
+    embedded as padded batches; chunk_size files are held in memory at a time and the next
+    chunk is preprocessed while the current one is embedded.
+    A file that cannot be read or embedded gets a row of NaN instead of failing the whole job;
+    with return_errors=True the result is (matrix, {index: error message}).
+    """
+    host = remote()
+    if host is not None:
+        out, errors = host.voice_embeddings(list(paths), batch_size, workers, chunk_size, use_cache)
+        return (out, errors) if return_errors else out
+    paths = list(paths)
+    out = [None] * len(paths)
+    errors = {}
+    digests = [None] * len(paths)
+    todo = []
+    for i, path in enumerate(paths):
+        try:
+            digests[i] = file_hash(path) if use_cache else None
+        except OSError as e:
+            errors[i] = str(e)
+            continue
+        cached = result_cache.get("voice", digests[i]) if digests[i] is not None else None
+        if cached is not None:
+            out[i] = np.asarray(cached, dtype=np.float32).reshape(-1)
+        else:
+            todo.append(i)
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        pending = [pool.submit(_clean_waveform, paths[i]) for i in chunks[0]] if chunks else []
+        for n, chunk in enumerate(chunks):
+            cleaned = []
+            for i, f in zip(chunk, pending):
+                try:
+                    cleaned.append((i, f.result()))
+                except Exception as e:
+                    errors[i] = str(e)
+            if n + 1 < len(chunks):
+                pending = [pool.submit(_clean_waveform, paths[i]) for i in chunks[n + 1]]
+            for bucket in length_buckets([len(w) for _, w in cleaned], batch_size):
+                try:
+                    embs = _embed_padded([cleaned[j][1] for j in bucket])
+                except Exception as e:
+                    for j in bucket:
+                        errors[cleaned[j][0]] = str(e)
+                    continue
+                for j, emb in zip(bucket, embs):
+                    i = cleaned[j][0]
+                    out[i] = emb
+                    if digests[i] is not None:
+                        result_cache.put("voice", digests[i], emb.reshape(1, -1).tolist())
+    if errors:
+        print(f"[VOICE] {len(errors)} of {len(paths)} recordings could not be embedded")
+    matrix = np.full((len(paths), EMBEDDING_DIM), np.nan, dtype=np.float32)
+    for i, emb in enumerate(out):
+        if emb is not None:
+            matrix[i] = emb
+    return (matrix, errors) if return_errors else matrix
+
+def embed_waveform(wav):
+    """L2-normalised ECAPA embedding (numpy) of an already cleaned 16 kHz mono float32 waveform."""
+    host = remote()
+    if host is not None:
+        return host.embed_waveform(wav)
+    import torch
+    speech = torch.from_numpy(np.ascontiguousarray(wav, dtype=np.float32)).unsqueeze(0)
+    with registry.use("ecapa") as model, span("voice.ecapa"):
+        emb = model.encode_batch(speech)
+    return torch.nn.functional.normalize(emb, dim=-1).reshape(-1).cpu().numpy()
 
 # -----------------------------------------------------
 # Step 3: Cosine similarity
 # -----------------------------------------------------
+def _as_numpy(emb):
+    """Flat float32 copy of an embedding given as a torch tensor or a numpy array."""
+    if hasattr(emb, "detach"):
+        emb = emb.detach().cpu().numpy()
+    return np.asarray(emb, dtype=np.float32).reshape(-1)
+
 def cosine_sim(a, b):
-    return torch.nn.functional.cosine_similarity(a, b).item()
+    a, b = _as_numpy(a), _as_numpy(b)
+    return float(a @ b / max(np.linalg.norm(a) * np.linalg.norm(b), 1e-8))
+
+# -----------------------------------------------------
+# Enrollment + verification against stored speakers
+# -----------------------------------------------------
+SPEAKER_STORE_DIR = os.getenv("SPEAKER_STORE_DIR", "speaker_store")
+_speaker_store = None
+_speaker_store_lock = threading.Lock()
+
+def get_speaker_store():
+    global _speaker_store
+    if _speaker_store is None:
+        with _speaker_store_lock:
+            # Two first requests must not each open (and later write) their own store
+            if _speaker_store is None:
+                _speaker_store = SpeakerStore(SPEAKER_STORE_DIR)
+    return _speaker_store
+
+def _embedding_array(path):
+    host = remote()
+    if host is not None:
+        return host.voice_embedding(path)  # numpy straight from the host; no torch in this worker
+    return _as_numpy(get_embedding(path))
+
+def enroll_speaker(speaker_id, path, role=None, update=False):
+    """Embed a recording once and store it as the reference voice for speaker_id."""
+    meta = {"role": role} if role else None
+    get_speaker_store().enroll(speaker_id, _embedding_array(path), meta=meta, update=update)
+    return {"speaker_id": speaker_id, "enrolled": len(get_speaker_store())}
+
+def reference_embedding(speaker_id):
+    """Enrolled embedding of speaker_id (KeyError when not enrolled), e.g. for voice_stream.py."""
+    return get_speaker_store().embedding(speaker_id)
+
+def enroll_speakers(items, role=None, update=False, batch_size=16):
+    """Bulk enrollment: items are (speaker_id, path) pairs, embedded with get_embeddings."""
+    items = list(items)
+    embeddings, errors = get_embeddings([path for _, path in items], batch_size=batch_size,
+                                        return_errors=True)
+    meta = {"role": role} if role else None
+    store = get_speaker_store()
+    for i, ((speaker_id, _), emb) in enumerate(zip(items, embeddings)):
+        if i not in errors:
+            store.enroll(speaker_id, emb, meta=meta, update=update)
+    return {"enrolled": len(items) - len(errors), "total": len(store),
+            "failed": {items[i][0]: error for i, error in errors.items()}}
+
+def verify_speaker(speaker_id, path, threshold=0.55):
+    """1:1 check of a new recording against an enrolled speaker (only the new file is embedded)."""
+    score = get_speaker_store().verify(speaker_id, _embedding_array(path))
+    return {"speaker_id": speaker_id, "score": score, "match": score >= threshold}
+
+def identify_speaker(path, top_k=5, threshold=None, role=None):
+    """1:N lookup of a recording against every enrolled speaker."""
+    return get_speaker_store().identify(_embedding_array(path), top_k=top_k,
+                                        threshold=threshold, role=role)
 
 # -----------------------------------------------------
 # Step 4: Main check
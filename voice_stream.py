@@ -0,0 +1,273 @@
+"""
+Streaming Voice Verification
+----------------------------
+Incremental front end + scoring for live calls: PCM frames in, running similarity against an
+enrolled reference voice out (served by the /voices/{speaker_id}/stream WebSocket in app.py).
+
+- Frames are decoded (pcm16 / f32, interleaved channels downmixed) and resampled to 16 kHz
+  chunk by chunk (soxr.ResampleStream; stateful linear interpolation when soxr is missing)
+- Streaming energy VAD on 20 ms frames: speech when RMS > ratio * running mean RMS (the
+  streaming form of audio_preprocess.vad_keep_speech), with a short hangover
+- Speech goes into a fixed-size ring buffer holding the last window_s seconds; every hop_s of new
+  speech the window is peak-normalised and embedded with ECAPA
+- Scores: window_score (this window vs. reference) and running_score (mean of all window
+  embeddings vs. reference)
+- Early verdict once the last stable_windows running scores lie within stable_eps and the score
+  is at least margin away from the threshold
+- Bounded per connection: ring buffer + resampler state only, input frames capped at max_chunk_s,
+  whole call capped at max_seconds, and the hop widens when embedding takes more than
+  cpu_budget of the audio it covers
+
+Denoising is not applied to the stream (the spectral gate needs a noise profile of the whole file).
+"""
+
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from audio_preprocess import TARGET_SR
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+VAD_FRAME = TARGET_SR // 50  # 20 ms
+
+
+@dataclass
+class StreamConfig:
+    window_s: float = 3.0
+    hop_s: float = 1.0
+    min_speech_s: float = 1.5
+    threshold: float = 0.55
+    margin: float = 0.05
+    stable_windows: int = 3
+    stable_eps: float = 0.03
+    vad_ratio: float = 0.5
+    hangover_frames: int = 10
+    max_chunk_s: float = 1.0
+    max_seconds: float = 300.0
+    cpu_budget: float = 0.5
+
+    @classmethod
+    def from_env(cls) -> "StreamConfig":
+        return cls(
+            window_s=float(os.getenv("VOICE_STREAM_WINDOW_S", "3.0")),
+            hop_s=float(os.getenv("VOICE_STREAM_HOP_S", "1.0")),
+            threshold=float(os.getenv("VOICE_STREAM_THRESHOLD", "0.55")),
+            max_seconds=float(os.getenv("VOICE_STREAM_MAX_S", "300")),
+            cpu_budget=float(os.getenv("VOICE_STREAM_CPU_BUDGET", "0.5")),
+        )
+
+
+# ---------- FRONT END ----------
+class StreamResampler:
+    """Chunk-wise resampling to TARGET_SR with state carried across chunks."""
+
+    def __init__(self, in_sr: int, out_sr: int = TARGET_SR):
+        self.in_sr, self.out_sr = in_sr, out_sr
+        self._soxr = None
+        if in_sr != out_sr and soxr is not None:
+            self._soxr = soxr.ResampleStream(in_sr, out_sr, 1, dtype="float32")
+        self._step = in_sr / out_sr
+        self._pos = 0.0
+        self._prev = np.zeros(0, dtype=np.float32)
+
+    def process(self, x: np.ndarray, last: bool = False) -> np.ndarray:
+        if self.in_sr == self.out_sr:
+            return x
+        if self._soxr is not None:
+            return self._soxr.resample_chunk(x, last=last)
+        buf = np.concatenate([self._prev, x])
+        if len(buf) < 2:
+            self._prev = buf
+            return np.zeros(0, dtype=np.float32)
+        t = np.arange(self._pos, len(buf) - 1, self._step)
+        out = np.interp(t, np.arange(len(buf)), buf).astype(np.float32)
+        self._pos += len(t) * self._step - (len(buf) - 1)
+        self._prev = buf[-1:]
+        return out
+
+
+class StreamingVAD:
+    """20 ms energy VAD against a running mean RMS; returns only the speech samples."""
+
+    def __init__(self, ratio: float = 0.5, hangover_frames: int = 10, alpha: float = 0.01):
+        self.ratio = ratio
+        self.hangover_frames = hangover_frames
+        self.alpha = alpha
+        self.mean_rms: Optional[float] = None
+        self._hang = 0
+        self._rest = np.zeros(0, dtype=np.float32)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        buf = np.concatenate([self._rest, x])
+        n = len(buf) // VAD_FRAME
+        self._rest = buf[n * VAD_FRAME:]
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = buf[:n * VAD_FRAME].reshape(n, VAD_FRAME)
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        keep = np.zeros(n, dtype=bool)
+        for i, r in enumerate(rms):
+            self.mean_rms = r if self.mean_rms is None else (1 - self.alpha) * self.mean_rms + self.alpha * r
+            if r > self.ratio * self.mean_rms and r > 1e-4:
+                self._hang = self.hangover_frames
+                keep[i] = True
+            elif self._hang > 0:
+                self._hang -= 1
+                keep[i] = True
+        return frames[keep].reshape(-1)
+
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self.total = 0
+
+    def extend(self, x: np.ndarray):
+        cap = len(self._buf)
+        if len(x) >= cap:
+            self._buf[:] = x[-cap:]
+            self.total += len(x)
+            self._buf = np.roll(self._buf, self.total % cap)
+            return
+        start = self.total % cap
+        end = start + len(x)
+        if end <= cap:
+            self._buf[start:end] = x
+        else:
+            split = cap - start
+            self._buf[start:] = x[:split]
+            self._buf[:end - cap] = x[split:]
+        self.total += len(x)
+
+    def latest(self) -> np.ndarray:
+        cap = len(self._buf)
+        if self.total < cap:
+            return self._buf[:self.total].copy()
+        start = self.total % cap
+        return np.concatenate([self._buf[start:], self._buf[:start]])
+
+
+# ---------- SESSION ----------
+class StreamingVerifier:
+    """
+    State of one live verification. feed() returns a waveform window to embed (or None);
+    score() takes that window's embedding and returns the events to send.
+    """
+
+    def __init__(self, reference, sample_rate: int = TARGET_SR, fmt: str = "pcm16",
+                 channels: int = 1, config: Optional[StreamConfig] = None):
+        if fmt not in ("pcm16", "f32"):
+            raise ValueError("format must be 'pcm16' or 'f32'")
+        self.config = config or StreamConfig()
+        self.reference = np.asarray(reference, dtype=np.float32).reshape(-1)
+        self.reference /= np.linalg.norm(self.reference) + 1e-12
+        self.sample_rate = sample_rate
+        self.fmt = fmt
+        self.channels = channels
+        self.max_chunk_bytes = int(self.config.max_chunk_s * sample_rate) * channels * (2 if fmt == "pcm16" else 4)
+
+        self.resampler = StreamResampler(sample_rate)
+        self.vad = StreamingVAD(self.config.vad_ratio, self.config.hangover_frames)
+        self.speech = RingBuffer(int(self.config.window_s * TARGET_SR))
+        self.hop = int(self.config.hop_s * TARGET_SR)
+        self.audio_samples = 0
+        self._next_window = int(self.config.min_speech_s * TARGET_SR)
+        self._scored_at = 0
+        self._embedding_sum = np.zeros_like(self.reference)
+        self._recent = deque(maxlen=self.config.stable_windows)
+        self.windows = 0
+        self.embed_seconds = 0.0
+        self.running_score: Optional[float] = None
+        self.verdict: Optional[dict] = None
+
+    @property
+    def audio_s(self) -> float:
+        return self.audio_samples / self.sample_rate
+
+    @property
+    def done(self) -> bool:
+        return self.audio_s >= self.config.max_seconds
+
+    def _decode(self, data: bytes) -> np.ndarray:
+        if len(data) > self.max_chunk_bytes:
+            raise ValueError(f"Frame of {len(data)} bytes exceeds {self.max_chunk_bytes} "
+                             f"({self.config.max_chunk_s}s of audio)")
+        if self.fmt == "pcm16":
+            x = np.frombuffer(data[:len(data) - len(data) % 2], dtype="<i2").astype(np.float32) / 32768.0
+        else:
+            x = np.frombuffer(data[:len(data) - len(data) % 4], dtype="<f4").astype(np.float32)
+        if self.channels > 1:
+            x = x[:len(x) - len(x) % self.channels].reshape(-1, self.channels).mean(axis=1)
+        return x
+
+    def _window(self) -> Optional[np.ndarray]:
+        if self.speech.total < self._next_window:
+            return None
+        self._scored_at = self.speech.total
+        self._next_window = self.speech.total + self.hop
+        wav = self.speech.latest()
+        return wav / (np.max(np.abs(wav)) + 1e-6)
+
+    def feed(self, data: bytes) -> Optional[np.ndarray]:
+        x = self._decode(data)
+        self.audio_samples += len(x)
+        self.speech.extend(self.vad.process(self.resampler.process(x)))
+        return self._window()
+
+    def flush(self) -> Optional[np.ndarray]:
+        """End of stream: one last window over speech not yet scored (if there is enough of it)."""
+        self.speech.extend(self.vad.process(self.resampler.process(np.zeros(0, dtype=np.float32), last=True)))
+        if self.windows and self.speech.total - self._scored_at < self.hop // 2:
+            return None
+        if self.speech.total < int(self.config.min_speech_s * TARGET_SR):
+            return None
+        self._next_window = self.speech.total
+        return self._window()
+
+    def score(self, embedding, embed_seconds: float = 0.0) -> List[dict]:
+        cfg = self.config
+        emb = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        emb /= np.linalg.norm(emb) + 1e-12
+        self.windows += 1
+        self.embed_seconds += embed_seconds
+        if embed_seconds > cfg.cpu_budget * self.hop / TARGET_SR:
+            # Embedding is eating more than its share of real time: score less often
+            self.hop = int(embed_seconds / cfg.cpu_budget * TARGET_SR)
+
+        self._embedding_sum += emb
+        window_score = float(emb @ self.reference)
+        running = self._embedding_sum / (np.linalg.norm(self._embedding_sum) + 1e-12)
+        self.running_score = float(running @ self.reference)
+        self._recent.append(self.running_score)
+        events = [{"event": "score", "audio_s": round(self.audio_s, 3),
+                   "speech_s": round(self.speech.total / TARGET_SR, 3), "windows": self.windows,
+                   "window_score": window_score, "running_score": self.running_score}]
+
+        if (self.verdict is None and len(self._recent) == cfg.stable_windows
+                and max(self._recent) - min(self._recent) <= cfg.stable_eps
+                and abs(self.running_score - cfg.threshold) >= cfg.margin):
+            self.verdict = {"event": "verdict", "match": self.running_score >= cfg.threshold,
+                            "score": self.running_score, "audio_s": round(self.audio_s, 3), "early": True}
+            events.append(self.verdict)
+        return events
+
+    def final(self) -> dict:
+        score = self.running_score
+        return {
+            "event": "final",
+            "match": None if score is None else score >= self.config.threshold,
+            "score": score,
+            "windows": self.windows,
+            "audio_s": round(self.audio_s, 3),
+            "speech_s": round(self.speech.total / TARGET_SR, 3),
+            "early_verdict_at": self.verdict["audio_s"] if self.verdict else None,
+            "embed_s": round(self.embed_seconds, 4),
+            **({"reason": "not enough speech"} if score is None else {}),
+        }
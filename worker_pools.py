@@ -0,0 +1,127 @@
+"""
+Worker Pools
+------------
+Bounded execution layer that keeps blocking model work off the FastAPI event loop.
+
+- One thread or process pool per modality (image, voice, text)
+- Each modality admits at most max_pending requests (running + waiting)
+- When full, QueueFullError is raised so the endpoint can answer 503 with Retry-After
+
+Configure per modality with POOL_<MODALITY>="<thread|process>:<workers>:<max_pending>",
+e.g. POOL_IMAGE="process:2:8".
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from metrics import record
+
+DEFAULT_POOLS = {
+    "image": ("thread", 2, 8),
+    "voice": ("thread", 2, 8),
+    "text": ("thread", 1, 32),
+}
+
+
+class QueueFullError(Exception):
+    def __init__(self, modality: str, retry_after: int):
+        super().__init__(f"{modality} queue is full, retry in {retry_after}s")
+        self.modality = modality
+        self.retry_after = retry_after
+
+
+class _Pool:
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.executor: Optional[Executor] = None
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+
+class ModalityExecutor:
+    def __init__(self, config: Optional[Dict[str, tuple]] = None, retry_after: int = 5):
+        """
+        config: {modality: (kind, workers, max_pending)}; defaults to DEFAULT_POOLS.
+        retry_after: seconds suggested to clients when a queue is full.
+        """
+        self.retry_after = retry_after
+        self._pools = {m: _Pool(*cfg) for m, cfg in (config or DEFAULT_POOLS).items()}
+
+    @classmethod
+    def from_env(cls):
+        config = {}
+        for modality, default in DEFAULT_POOLS.items():
+            raw = os.getenv(f"POOL_{modality.upper()}")
+            if raw:
+                kind, workers, max_pending = raw.split(":")
+                config[modality] = (kind, int(workers), int(max_pending))
+            else:
+                config[modality] = default
+        return cls(config, retry_after=int(os.getenv("POOL_RETRY_AFTER", "5")))
+
+    def executor(self, modality: str) -> Executor:
+        return self._pools[modality].get_executor()
+
+    @asynccontextmanager
+    async def slot(self, modality: str):
+        """Admit one request for a modality or raise QueueFullError."""
+        pool = self._pools[modality]
+        if pool.pending >= pool.max_pending:
+            pool.rejected += 1
+            raise QueueFullError(modality, self.retry_after)
+        pool.pending += 1
+        try:
+            yield pool
+        finally:
+            pool.pending -= 1
+
+    def saturated(self, modality: str) -> bool:
+        """True when a request for the modality would be rejected right now."""
+        pool = self._pools[modality]
+        return pool.pending >= pool.max_pending
+
+    async def run(self, modality: str, fn: Callable, *args):
+        """Run a blocking fn(*args) on the modality's pool, subject to its queue bound."""
+        async with self.slot(modality) as pool:
+            loop = asyncio.get_running_loop()
+            if pool.kind == "process":
+                return await loop.run_in_executor(pool.get_executor(), fn, *args)
+            # Threads run under a copy of the request context, so their metric spans
+            # reach the request's timings; the time spent waiting for a worker is recorded too
+            ctx = contextvars.copy_context()
+            submitted = time.perf_counter()
+
+            def call():
+                record(f"queue.{modality}", time.perf_counter() - submitted)
+                return fn(*args)
+            return await loop.run_in_executor(pool.get_executor(), ctx.run, call)
+
+    def stats(self) -> dict:
+        return {
+            m: {"kind": p.kind, "workers": p.workers, "max_pending": p.max_pending,
+                "pending": p.pending, "rejected": p.rejected}
+            for m, p in self._pools.items()
+        }
+
+    def shutdown(self):
+        for p in self._pools.values():
+            if p.executor is not None:
+                p.executor.shutdown(wait=False)
+                p.executor = None